@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+解码流水线基准测试：分阶段计时 + 端到端，记录吞吐、耗时、内存分配峰值和进程峰值 RSS
+每个输入文件在独立子进程中运行，RSS 互不影响；结果可与保存的基线对比，变慢即失败
+
+用法:
+  python3 bench/bench_decoder.py                       # 默认语料（样例 + 合成日志），和 bench/baseline.json 对比
+  python3 bench/bench_decoder.py a.BBL b.BBL --repeat 5
+  python3 bench/bench_decoder.py --save-baseline       # 更新基线（请在固定的参考机器上执行）
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCH_DIR, '..', 'src')
+REPO_ROOT = os.path.abspath(os.path.join(BENCH_DIR, '..', '..'))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+SAMPLE_LOG = os.path.join(REPO_ROOT, 'test-blackbox.bbl')
+
+# 超过基线 (1 + TOLERANCE) 倍且绝对差超过 MIN_SLACK_S 才算回退，避免小阶段的抖动误报
+DEFAULT_TOLERANCE = 0.30
+MIN_SLACK_S = 0.005
+
+STAGES = ['find_all_logs', 'decode', 'columns', 'segmentation', 'stats', 'build_frames', 'serialize', 'end_to_end']
+
+
+def _import_entry():
+    sys.path.insert(0, os.path.abspath(SRC_DIR))
+    with contextlib.redirect_stdout(io.StringIO()):
+        import entry
+    return entry
+
+
+def _peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为 bytes
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+class StageProbe:
+    """分阶段计时；trace_alloc=True 时同时用 tracemalloc 记录每阶段的分配峰值"""
+
+    def __init__(self, trace_alloc=False):
+        self.trace_alloc = trace_alloc
+        self.wall = {}
+        self.alloc_mb = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        if self.trace_alloc:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.wall[name] = time.perf_counter() - t
+            if self.trace_alloc:
+                peak = tracemalloc.get_traced_memory()[1]
+                self.alloc_mb[name] = round(max(0, peak - base) / (1024 * 1024), 2)
+
+
+def run_stages(entry, bbl_bytes, probe):
+    """按流水线顺序执行所有阶段，每个阶段只计入它自己新增的计算，返回帧数"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        with probe.stage('find_all_logs'):
+            entry.find_all_logs(bbl_bytes)
+
+        with probe.stage('decode'):
+            log_bytes, _, _ = entry.select_log(bbl_bytes)
+            headers, field_names, frames_list, events, corruption = entry.parse_single_log(log_bytes)
+
+        graph = entry.feature_graph.FeatureGraph(
+            entry.PIPELINE, headers=headers, field_names=field_names, frames_list=frames_list,
+            log_events=events, corruption=corruption)
+        with probe.stage('columns'):
+            graph.get('time_full')
+
+        with probe.stage('segmentation'):
+            graph.get('segment')
+            graph.get('time')
+
+        with probe.stage('stats'):
+            blocks = graph.collect([n for n in entry.PIPELINE.public() if n != 'frames'])
+
+        with probe.stage('build_frames'):
+            frames, _, _ = graph.get('frames')(entry.TARGET_HZ_LIST[0])
+
+        with probe.stage('serialize'):
+            json.dumps(dict(blocks, frames=frames), ensure_ascii=False, separators=(',', ':'))
+
+        with probe.stage('end_to_end'):
+            result = entry.parse_bbl_to_json(bbl_bytes)
+            json.dumps(result, ensure_ascii=False, separators=(',', ':'))
+    return len(frames_list)
+
+
+def measure_allocations(entry, bbl_bytes):
+    """tracemalloc 单独跑一遍（开销大，不参与计时）"""
+    probe = StageProbe(trace_alloc=True)
+    tracemalloc.start()
+    try:
+        run_stages(entry, bbl_bytes, probe)
+    finally:
+        tracemalloc.stop()
+    return probe.alloc_mb
+
+
+def bench_file(path, repeat, allocations=True):
+    """子进程内执行：对单个文件完整跑 repeat 次，每阶段取最快一次"""
+    entry = _import_entry()
+    with open(path, 'rb') as f:
+        bbl_bytes = f.read()
+
+    runs = []
+    frames = 0
+    for _ in range(repeat):
+        probe = StageProbe()
+        frames = run_stages(entry, bbl_bytes, probe)
+        runs.append(probe.wall)
+
+    stages = {}
+    for stage in STAGES:
+        values = [r[stage] for r in runs]
+        best = min(values)
+        stages[stage] = {
+            'wall_s': round(best, 4),
+            'median_s': round(statistics.median(values), 4),
+            'frames_per_s': round(frames / best) if best > 0 and stage != 'find_all_logs' else None,
+        }
+    # RSS 在 tracemalloc 之前取，避免把追踪开销算进去
+    peak_rss = _peak_rss_mb()
+    if allocations:
+        for stage, mb in measure_allocations(entry, bbl_bytes).items():
+            stages[stage]['alloc_peak_mb'] = mb
+
+    return {
+        'file': os.path.basename(path),
+        'bytes': len(bbl_bytes),
+        'frames': frames,
+        'repeat': repeat,
+        'peak_rss_mb': round(peak_rss, 1),
+        'stages': stages,
+    }
+
+
+# 合成语料：(文件名, synth_bbl 参数)，覆盖不同记录频率、时长和多 log 文件
+SYNTH_CORPUS = [
+    ('synth-1k-60s.bbl', dict(rate_hz=1000, duration_s=60, seed=1)),
+    ('synth-4k-20s.bbl', dict(rate_hz=4000, duration_s=20, seed=2)),
+    ('synth-2k-3logs.bbl', dict(rate_hz=2000, duration_s=10, logs=3, seed=3)),
+]
+
+
+def default_corpus(workdir):
+    """默认语料：仓库自带的 test-blackbox.bbl、它拼接 3 次得到的多 log 文件，以及合成日志"""
+    corpus = []
+    if os.path.exists(SAMPLE_LOG):
+        corpus.append(SAMPLE_LOG)
+        with open(SAMPLE_LOG, 'rb') as f:
+            data = f.read()
+        multi = os.path.join(workdir, 'multi-log-x3.bbl')
+        with open(multi, 'wb') as f:
+            f.write(data * 3)
+        corpus.append(multi)
+
+    sys.path.insert(0, BENCH_DIR)
+    import synth_bbl
+    for name, options in SYNTH_CORPUS:
+        path = os.path.join(workdir, name)
+        synth_bbl.generate_file(path, **options)
+        corpus.append(path)
+    return corpus
+
+
+def run_child(path, repeat, allocations):
+    cmd = [sys.executable, os.path.abspath(__file__), '--child', path, '--repeat', str(repeat)]
+    if not allocations:
+        cmd.append('--no-alloc')
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Benchmark failed for {path}:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def print_report(results):
+    print(f"{'file':<28} {'stage':<14} {'wall_s':>9} {'frames/s':>12} {'alloc_mb':>9}")
+    for res in results:
+        for stage in STAGES:
+            s = res['stages'][stage]
+            fps = f"{s['frames_per_s']:,}" if s['frames_per_s'] else '-'
+            print(f"{res['file'][:28]:<28} {stage:<14} {s['wall_s']:>9.4f} {fps:>12} {s.get('alloc_peak_mb', '-'):>9}")
+        print(f"{res['file'][:28]:<28} {'peak_rss_mb':<14} {res['peak_rss_mb']:>9}")
+
+
+def compare(results, baseline, tolerance):
+    """和基线对比，返回回退列表"""
+    base = {r['file']: r for r in baseline.get('results', [])}
+    regressions = []
+    for res in results:
+        ref = base.get(res['file'])
+        if not ref:
+            continue
+        for stage in STAGES:
+            new = res['stages'][stage]['wall_s']
+            old = ref['stages'].get(stage, {}).get('wall_s')
+            if old is None:
+                continue
+            if new > old * (1 + tolerance) and new - old > MIN_SLACK_S:
+                regressions.append((res['file'], stage, old, new))
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('files', nargs='*', help='BBL 文件（默认使用仓库自带样例）')
+    ap.add_argument('--repeat', type=int, default=3, help='每个文件的重复次数，取最快一次')
+    ap.add_argument('--baseline', default=DEFAULT_BASELINE)
+    ap.add_argument('--save-baseline', action='store_true', help='把本次结果写为基线')
+    ap.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='允许的相对变慢比例')
+    ap.add_argument('--output', help='结果另存为 JSON')
+    ap.add_argument('--no-alloc', action='store_true', help='跳过 tracemalloc 分配统计')
+    ap.add_argument('--child', help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        print(json.dumps(bench_file(args.child, args.repeat, allocations=not args.no_alloc)))
+        return 0
+
+    with tempfile.TemporaryDirectory() as workdir:
+        files = args.files or default_corpus(workdir)
+        if not files:
+            print("No input files", file=sys.stderr)
+            return 2
+        results = [run_child(path, args.repeat, not args.no_alloc) for path in files]
+
+    print_report(results)
+    report = {
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'cpu_count': os.cpu_count()},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline saved: {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nREGRESSION (> {args.tolerance:.0%} slower than baseline):")
+            for name, stage, old, new in regressions:
+                print(f"  {name} {stage}: {old:.4f}s -> {new:.4f}s ({new / old - 1:+.0%})")
+            return 1
+        print(f"\nOK: no stage slower than baseline by > {args.tolerance:.0%}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,516 @@
+#!/usr/bin/env python3
+"""
+差分正确性校验：orangebox 参考解码 vs 各条优化解码路径，同一次运行内对比并计时
+- 解码列逐位比较（float64 位模式完全一致），报告第一处分歧的帧号和字段
+- 派生统计（stats / events / frames）在容差内比较，两条路径共用同一个特征图
+- 仓库根目录的 golden JSON（bbl-output-*.json）按其精度校验采样点和特征
+- 合成日志额外校验 ground truth 中的 log 数、帧数、字段和起止时间；多段飞行的日志还校验段落切分与起降时刻一致
+
+用法:
+  python3 bench/diff_decoder.py                    # 默认语料（样例 + 多 log 拼接 + 合成日志）+ golden
+  python3 bench/diff_decoder.py a.BBL b.BBL --paths entry
+  python3 bench/diff_decoder.py --list-paths
+有任何不一致时退出码为 1
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCH_DIR, '..', 'src')
+REPO_ROOT = os.path.abspath(os.path.join(BENCH_DIR, '..', '..'))
+SAMPLE_LOG = os.path.join(REPO_ROOT, 'test-blackbox.bbl')
+GOLDEN_FILES = ['bbl-output-sample.json', 'bbl-output-compact.json', 'bbl-output-full.json']
+
+# 派生统计的默认容差：同一份列走同一个特征图时应完全相等，容差留给改变了浮点求和顺序的实现
+DEFAULT_RTOL = 1e-6
+DEFAULT_ATOL = 1e-9
+# 每个 log 最多报告的分歧条数
+MAX_REPORTS = 10
+# 段落起止与 truth 起降时刻的容差（秒）：起降各有 0.2s 油门斜坡，怠速判定落在斜坡中
+SEGMENT_TOL_S = 0.3
+
+
+def _import_entry():
+    sys.path.insert(0, os.path.abspath(SRC_DIR))
+    with contextlib.redirect_stdout(io.StringIO()):
+        import entry
+    return entry
+
+
+class DecodedLog:
+    """一个 log 的解码结果：headers、字段名和 (frames, fields) 的 float64 矩阵（非数值按 0 处理，与 safe_float 一致）"""
+
+    def __init__(self, headers, field_names, matrix):
+        self.headers = headers
+        self.field_names = list(field_names)
+        self.matrix = matrix
+
+    def column(self, name):
+        return self.matrix[:, self.field_names.index(name)]
+
+
+# ---------------------------------------------------------------------------
+# 解码路径：name -> fn(bbl_bytes) -> [DecodedLog, ...]（文件内每个 log 一项）
+# reference 只依赖 orangebox 本身（它自己的 log 切分和逐帧读取），新的解码实现在 DECODE_PATHS 中注册
+# ---------------------------------------------------------------------------
+
+def _ref_float(value):
+    if value is None or value == '':
+        return 0.0
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def reference_decode(bbl_bytes):
+    """orangebox 直接读文件，逐帧逐字段转 float"""
+    from orangebox import Parser
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.BBL') as tmp:
+        tmp.write(bbl_bytes)
+        tmp_path = tmp.name
+    try:
+        parser = Parser.load(tmp_path)
+        logs = []
+        for index in range(1, parser.reader.log_count + 1):
+            if index > 1:
+                parser.set_log_index(index)
+            width = len(parser.field_names)
+            rows = [[_ref_float(v) for v in frame.data] for frame in parser.frames()]
+            matrix = np.array(rows, dtype=np.float64).reshape(len(rows), width)
+            logs.append(DecodedLog(dict(parser.headers), parser.field_names, matrix))
+        return logs
+    finally:
+        os.unlink(tmp_path)
+
+
+def entry_decode(bbl_bytes):
+    """服务实际使用的路径：find_all_logs 切分 + parse_single_log + object 矩阵按列转数值"""
+    entry = _import_entry()
+    logs = []
+    for start, end in entry.find_all_logs(bbl_bytes):
+        headers, field_names, frames_list, _, _ = entry.parse_single_log(bbl_bytes[start:end])
+        raw = entry.frames_to_matrix(frames_list)
+        if len(raw):
+            matrix = np.stack([entry.numeric_column(raw, j) for j in range(len(field_names))], axis=1)
+        else:
+            matrix = np.zeros((0, len(field_names)), dtype=np.float64)
+        logs.append(DecodedLog(dict(headers), field_names, matrix))
+    return logs
+
+
+REFERENCE = 'reference'
+DECODE_PATHS = {
+    REFERENCE: reference_decode,
+    'entry': entry_decode,
+}
+
+
+# ---------------------------------------------------------------------------
+# 比较
+# ---------------------------------------------------------------------------
+
+def compare_columns(ref, new):
+    """逐位比较两份解码结果，返回分歧描述列表（空列表为一致）"""
+    issues = []
+    if ref.field_names != new.field_names:
+        missing = [f for f in ref.field_names if f not in new.field_names]
+        extra = [f for f in new.field_names if f not in ref.field_names]
+        issues.append(f"field names differ (missing {missing}, extra {extra})" if missing or extra
+                      else "field order differs")
+        return issues
+
+    n = min(len(ref.matrix), len(new.matrix))
+    a = ref.matrix[:n].view(np.uint64)
+    b = new.matrix[:n].view(np.uint64)
+    diff_rows = np.flatnonzero((a != b).any(axis=1))
+    if diff_rows.size:
+        first = int(diff_rows[0])
+        fields = [ref.field_names[j] for j in np.flatnonzero(a[first] != b[first])]
+        shown = ', '.join(f"{name}: {float(ref.column(name)[first])!r} != {float(new.column(name)[first])!r}"
+                          for name in fields[:4])
+        more = f" (+{len(fields) - 4} fields)" if len(fields) > 4 else ''
+        issues.append(f"first divergent frame {first} ({diff_rows.size} frames differ): {shown}{more}")
+    if len(ref.matrix) != len(new.matrix):
+        issues.append(f"frame count {len(ref.matrix)} != {len(new.matrix)} (first missing/extra frame {n})")
+    return issues
+
+
+def derived_features(entry, log):
+    """把解码矩阵喂给服务的特征图，得到 stats / events / frames（以最高目标采样率构建）"""
+    graph = entry.feature_graph.FeatureGraph(
+        entry.PIPELINE, headers=log.headers, field_names=log.field_names, frames_list=None, raw=log.matrix,
+        log_events=())
+    with contextlib.redirect_stdout(io.StringIO()):
+        blocks = graph.collect([n for n in entry.PIPELINE.public() if n != 'frames'])
+        frames, _, _ = graph.get('frames')(entry.TARGET_HZ_LIST[0])
+    blocks['frames'] = frames
+    return blocks
+
+
+def compare_values(ref, new, rtol, atol, path='', out=None):
+    """递归比较 JSON 风格的结构，数值在容差内视为一致；返回 [(路径, 参考值, 新值)]"""
+    out = [] if out is None else out
+    if len(out) >= MAX_REPORTS:
+        return out
+    if isinstance(ref, dict) and isinstance(new, dict):
+        for key in list(ref) + [k for k in new if k not in ref]:
+            sub = f"{path}.{key}" if path else str(key)
+            if key not in ref or key not in new:
+                out.append((sub, ref.get(key, '<missing>'), new.get(key, '<missing>')))
+            else:
+                compare_values(ref[key], new[key], rtol, atol, sub, out)
+    elif isinstance(ref, (list, tuple)) and isinstance(new, (list, tuple)):
+        if len(ref) != len(new):
+            out.append((f"{path}[len]", len(ref), len(new)))
+        for i, (x, y) in enumerate(zip(ref, new)):
+            compare_values(x, y, rtol, atol, f"{path}[{i}]", out)
+    elif _is_number(ref) and _is_number(new):
+        if not (ref == new or abs(ref - new) <= atol + rtol * abs(ref)):
+            out.append((path, ref, new))
+    elif ref != new:
+        out.append((path, ref, new))
+    return out
+
+
+def _is_number(value):
+    return isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool)
+
+
+# ---------------------------------------------------------------------------
+# golden JSON（旧版输出格式，基于 test-blackbox.bbl 的整段 log 计算）
+# ---------------------------------------------------------------------------
+
+# 采样点键 -> 字段（dict 为多轴/多电机）；除 vbat（伏特）外都是原始字段值
+GOLDEN_SAMPLES = {
+    'gyro': {'roll': 'gyroADC[0]', 'pitch': 'gyroADC[1]', 'yaw': 'gyroADC[2]'},
+    'gyro_unfilt': {'roll': 'gyroUnfilt[0]', 'pitch': 'gyroUnfilt[1]', 'yaw': 'gyroUnfilt[2]'},
+    'setpoint': {'roll': 'setpoint[0]', 'pitch': 'setpoint[1]', 'yaw': 'setpoint[2]', 'throttle': 'setpoint[3]'},
+    'rc_command': {'roll': 'rcCommand[0]', 'pitch': 'rcCommand[1]', 'yaw': 'rcCommand[2]', 'throttle': 'rcCommand[3]'},
+    'pid_p': {'roll': 'axisP[0]', 'pitch': 'axisP[1]', 'yaw': 'axisP[2]'},
+    'pid_i': {'roll': 'axisI[0]', 'pitch': 'axisI[1]', 'yaw': 'axisI[2]'},
+    'pid_d': {'roll': 'axisD[0]', 'pitch': 'axisD[1]'},
+    'pid_f': {'roll': 'axisF[0]', 'pitch': 'axisF[1]', 'yaw': 'axisF[2]'},
+    'motor': {f'm{i + 1}': f'motor[{i}]' for i in range(4)},
+    'erpm': {f'm{i + 1}': f'eRPM[{i}]' for i in range(4)},
+    'amperage': 'amperageLatest',
+    'vbat': 'vbatLatest',
+    'flight_mode': 'flightModeFlags',
+    'state': 'stateFlags',
+    'failsafe_phase': 'failsafePhase',
+    'rx_signal': 'rxSignalReceived',
+    'rx_channels_valid': 'rxFlightChannelsValid',
+}
+GOLDEN_SCALE = {'vbat': 100.0}
+
+
+def _rounding_tol(value):
+    """golden 值按打印精度四舍五入：容差为末位的半个单位"""
+    text = repr(float(value))
+    decimals = len(text.split('.')[1]) if '.' in text and 'e' not in text else 0
+    return 0.5 * 10 ** -decimals + 1e-9
+
+
+def _header_interval_us(headers):
+    try:
+        return int(headers.get('looptime', 125)) * int(headers.get('pid_process_denom', 1))
+    except (ValueError, TypeError):
+        return 250
+
+
+def golden_features(log):
+    """按 golden 生成时的口径（整段 log、header 采样率）重算特征，键与 golden JSON 的 features 一致"""
+    from detectors import motor_output_range
+
+    rate = 1_000_000 / _header_interval_us(log.headers)
+    rms, peak = {}, {}
+    for i, axis in enumerate(('roll', 'pitch', 'yaw')):
+        g = log.column(f'gyroADC[{i}]')
+        rms[axis] = float(np.sqrt(np.mean(g * g)))
+        peak[axis] = float(np.count_nonzero(np.diff(g >= 0)) / (2 * len(g) / rate))
+    motors = np.stack([log.column(f'motor[{i}]') for i in range(4)])
+    avgs = motors.mean(axis=1)
+    avg_all = float(avgs.mean())
+    vbat = log.column('vbatLatest') / 100
+    return {
+        'gyro': {'rms': rms, 'peak_hz': peak},
+        'motor': {
+            'saturation_ratio': float((motors >= motor_output_range(log.headers)[1]).any(axis=0).mean()),
+            'imbalance_ratio': float(np.max(np.abs(avgs - avg_all)) / avg_all) if avg_all > 0 else 0.0,
+        },
+        'battery': {'vbat_min': float(vbat.min()), 'vbat_sag': float(vbat.max() - vbat.min())},
+    }
+
+
+def _compare_rounded(golden, value, path, out):
+    if isinstance(golden, dict):
+        for key, sub in golden.items():
+            if key not in value:
+                out.append((f"{path}.{key}", sub, '<missing>'))
+            else:
+                _compare_rounded(sub, value[key], f"{path}.{key}", out)
+    elif abs(golden - value) > _rounding_tol(golden):
+        out.append((path, golden, round(value, 6)))
+
+
+def check_golden(log, golden):
+    """返回 [(路径, golden 值, 解码值)]"""
+    out = []
+    t = log.column('time')
+    total = len(t)
+    meta = golden.get('meta', {})
+    if meta.get('total_frames') != total:
+        out.append(('meta.total_frames', meta.get('total_frames'), total))
+    _compare_rounded(meta.get('log_duration_s', 0), (t[-1] - t[0]) / 1e6, 'meta.log_duration_s', out)
+    _compare_rounded(golden.get('features', {}), golden_features(log), 'features', out)
+
+    samples = golden.get('samples', {})
+    count = samples.get('time_base', {}).get('count') or len(samples.get('time_ms', []))
+    if not count:
+        return out
+    step = max(1, total // count)
+    idx = np.arange(0, total, step)[:count]
+    if 'time_ms' in samples:
+        expected = np.floor((t[idx] - t[0]) / 1000)
+        bad = np.flatnonzero(np.asarray(samples['time_ms'], dtype=np.float64) != expected)
+        if bad.size:
+            out.append((f"samples.time_ms[{bad[0]}]", samples['time_ms'][bad[0]], expected[bad[0]]))
+    if 'time_base' in samples:
+        dt_us = step * _header_interval_us(log.headers)
+        if samples['time_base'].get('dt_us') != dt_us:
+            out.append(('samples.time_base.dt_us', samples['time_base'].get('dt_us'), dt_us))
+
+    for key, fields in GOLDEN_SAMPLES.items():
+        if key not in samples:
+            continue
+        values = samples[key]
+        pairs = fields.items() if isinstance(fields, dict) else [(None, fields)]
+        for sub, field in pairs:
+            if sub and sub not in values:
+                continue
+            series = values[sub] if sub else values
+            decoded = log.column(field)[idx] / GOLDEN_SCALE.get(key, 1.0)
+            for i, g in enumerate(series):
+                if abs(g - decoded[i]) > _rounding_tol(g):
+                    name = f"samples.{key}.{sub}" if sub else f"samples.{key}"
+                    out.append((f"{name}[{i}] (frame {idx[i]}, {field})", g, float(decoded[i])))
+                    break
+    return out[:MAX_REPORTS]
+
+
+# ---------------------------------------------------------------------------
+# 语料
+# ---------------------------------------------------------------------------
+
+# 合成语料覆盖字段集、多 log、记录中断、模式切换和时间抖动（损坏文件的解码行为不在逐位比较范围内）
+SYNTH_CORPUS = [
+    ('synth-minimal.bbl', dict(rate_hz=1000, duration_s=20, fields='minimal', seed=11)),
+    ('synth-full-4k.bbl', dict(rate_hz=4000, duration_s=10, fields='full', seed=12)),
+    ('synth-3logs.bbl', dict(rate_hz=2000, duration_s=8, logs=3, seed=13)),
+    ('synth-gaps-modes.bbl', dict(rate_hz=2000, duration_s=20, gaps=[(5.0, 500), (12.0, 1000)],
+                                  mode_switches=[(3.0, 2), (9.0, 0)], time_jitter_us=20, seed=14)),
+    ('synth-faults.bbl', dict(rate_hz=2000, duration_s=15, throttle='chops',
+                              motor_faults=[{'motor': 2, 't_s': 8.0, 'dur_ms': 60, 'kind': 'desync'}], seed=15)),
+    # 段间 1s 地面怠速，怠速噪声偶尔越过怠速阈值（曾把后两段合成一段）
+    ('synth-3flights.bbl', dict(rate_hz=2000, duration_s=60, flights=3, seed=0)),
+]
+
+
+def default_corpus(workdir):
+    """返回 [(路径, truth 或 None)]"""
+    corpus = []
+    if os.path.exists(SAMPLE_LOG):
+        corpus.append((SAMPLE_LOG, None))
+        with open(SAMPLE_LOG, 'rb') as f:
+            data = f.read()
+        multi = os.path.join(workdir, 'multi-log-x3.bbl')
+        with open(multi, 'wb') as f:
+            f.write(data * 3)
+        corpus.append((multi, None))
+
+    sys.path.insert(0, BENCH_DIR)
+    import synth_bbl
+    for name, options in SYNTH_CORPUS:
+        path = os.path.join(workdir, name)
+        corpus.append((path, synth_bbl.generate_file(path, **options)))
+    return corpus
+
+
+def check_truth(logs, truth):
+    """合成日志：log 数、每个 log 的帧数、字段和首帧时间（时间抖动不超过半个帧间隔）"""
+    out = []
+    if len(logs) != len(truth['logs']):
+        return [f"log count {len(logs)} != truth {len(truth['logs'])}"]
+    for i, (log, t) in enumerate(zip(logs, truth['logs'])):
+        if len(log.matrix) != t['frames']:
+            out.append(f"log {i + 1}: frames {len(log.matrix)} != truth {t['frames']}")
+        # orangebox 把 S 帧字段追加在主帧字段之后
+        if log.field_names[:len(t['fields'])] != t['fields']:
+            out.append(f"log {i + 1}: field names differ from truth")
+        elif len(log.matrix) and abs(log.column('time')[0] - t['start_time_us']) > 0.5e6 / t['rate_hz']:
+            out.append(f"log {i + 1}: first time {log.column('time')[0]:.0f} != truth {t['start_time_us']}")
+    return out
+
+
+def check_segments(entry, log, t):
+    """多段飞行（且没有记录中断）的合成日志：段落数和每段起止时间与 truth 的 flights_s 一致"""
+    flights = t.get('flights_s') or []
+    if len(flights) < 2 or t.get('gaps'):
+        return []
+    graph = entry.feature_graph.FeatureGraph(
+        entry.PIPELINE, headers=log.headers, field_names=log.field_names, frames_list=None, raw=log.matrix,
+        log_events=())
+    with contextlib.redirect_stdout(io.StringIO()):
+        table = entry.segmentation.describe_segments(graph.get('segments'), graph.get('time_full'))
+    found = [[row['start_s'], row['end_s']] for row in table]
+    if len(found) != len(flights):
+        return [f"segments {found} != truth flights {flights}"]
+    return [f"segment {i + 1}: {got} != truth {want}" for i, (got, want) in enumerate(zip(found, flights))
+            if abs(got[0] - want[0]) > SEGMENT_TOL_S or abs(got[1] - want[1]) > SEGMENT_TOL_S]
+
+
+# ---------------------------------------------------------------------------
+# 主流程
+# ---------------------------------------------------------------------------
+
+def run_path(name, bbl_bytes):
+    """返回 (logs 或 None, 耗时, 错误信息)"""
+    t = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            logs = DECODE_PATHS[name](bbl_bytes)
+        return logs, time.perf_counter() - t, None
+    except Exception as e:
+        return None, time.perf_counter() - t, f"{type(e).__name__}: {e}"
+
+
+def check_file(entry, path, truth, paths, rtol, atol):
+    """对单个文件跑参考路径和各优化路径，返回 (报告, 是否通过)"""
+    with open(path, 'rb') as f:
+        bbl_bytes = f.read()
+    report = {'file': os.path.basename(path), 'paths': {}, 'issues': []}
+
+    def fail(message):
+        report['issues'].append(message)
+
+    decoded = {}
+    for name in [REFERENCE] + paths:
+        logs, elapsed, error = run_path(name, bbl_bytes)
+        decoded[name] = logs
+        report['paths'][name] = {'decode_s': round(elapsed, 4)}
+        if error:
+            fail(f"[{name}] decode failed: {error}")
+
+    ref_logs = decoded[REFERENCE]
+    ref_stats = None
+    if ref_logs is not None:
+        if truth is not None:
+            for issue in check_truth(ref_logs, truth):
+                fail(f"[{REFERENCE}] truth: {issue}")
+            for i, (log, t) in enumerate(zip(ref_logs, truth['logs'])):
+                for issue in check_segments(entry, log, t):
+                    fail(f"[{REFERENCE}] truth: log {i + 1}: {issue}")
+        t = time.perf_counter()
+        ref_stats = [derived_features(entry, log) for log in ref_logs]
+        report['paths'][REFERENCE]['stats_s'] = round(time.perf_counter() - t, 4)
+
+    for name in paths:
+        logs = decoded[name]
+        if logs is None or ref_logs is None:
+            continue
+        if len(logs) != len(ref_logs):
+            fail(f"[{name}] log count {len(logs)} != reference {len(ref_logs)}")
+            continue
+        t = time.perf_counter()
+        stats = [derived_features(entry, log) for log in logs]
+        report['paths'][name]['stats_s'] = round(time.perf_counter() - t, 4)
+        for i, (ref, new) in enumerate(zip(ref_logs, logs)):
+            for issue in compare_columns(ref, new):
+                fail(f"[{name}] log {i + 1}: {issue}")
+            for key, a, b in compare_values(ref_stats[i], stats[i], rtol, atol)[:MAX_REPORTS]:
+                fail(f"[{name}] log {i + 1}: {key}: {a!r} != {b!r}")
+
+    if os.path.abspath(path) == SAMPLE_LOG:
+        for golden_name in GOLDEN_FILES:
+            golden_path = os.path.join(REPO_ROOT, golden_name)
+            if not os.path.exists(golden_path):
+                continue
+            with open(golden_path) as f:
+                golden = json.load(f)
+            for name in [REFERENCE] + paths:
+                if decoded[name]:
+                    for key, a, b in check_golden(decoded[name][0], golden):
+                        fail(f"[{name}] {golden_name}: {key}: golden {a!r} != {b!r}")
+
+    report['logs'] = len(ref_logs) if ref_logs is not None else None
+    report['frames'] = sum(len(log.matrix) for log in ref_logs) if ref_logs else 0
+    return report, not report['issues']
+
+
+def print_report(reports, paths):
+    names = [REFERENCE] + paths
+    header = f"{'file':<24} {'frames':>9}" + ''.join(f" {n[:12] + ' s':>14}" for n in names)
+    print(header)
+    for rep in reports:
+        line = f"{rep['file'][:24]:<24} {rep['frames']:>9}"
+        for n in names:
+            p = rep['paths'][n]
+            line += f" {p['decode_s'] + p.get('stats_s', 0):>14.3f}"
+        print(line + ('  OK' if not rep['issues'] else f"  FAIL ({len(rep['issues'])})"))
+    for rep in reports:
+        for issue in rep['issues']:
+            print(f"  {rep['file']}: {issue}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('files', nargs='*', help='BBL 文件（默认使用样例 + 合成语料）')
+    ap.add_argument('--paths', help=f"要校验的解码路径，逗号分隔（默认全部：{', '.join(DECODE_PATHS)}）")
+    ap.add_argument('--rtol', type=float, default=DEFAULT_RTOL, help='派生统计的相对容差')
+    ap.add_argument('--atol', type=float, default=DEFAULT_ATOL, help='派生统计的绝对容差')
+    ap.add_argument('--output', help='结果另存为 JSON')
+    ap.add_argument('--list-paths', action='store_true', help='列出已注册的解码路径')
+    args = ap.parse_args()
+
+    if args.list_paths:
+        for name, fn in DECODE_PATHS.items():
+            print(f"{name:<12} {(fn.__doc__ or '').strip()}")
+        return 0
+
+    paths = [p for p in DECODE_PATHS if p != REFERENCE]
+    if args.paths:
+        paths = [p.strip() for p in args.paths.split(',') if p.strip() and p.strip() != REFERENCE]
+        unknown = [p for p in paths if p not in DECODE_PATHS]
+        if unknown:
+            print(f"Unknown decode path(s): {', '.join(unknown)}", file=sys.stderr)
+            return 2
+
+    entry = _import_entry()
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus = [(p, None) for p in args.files] or default_corpus(workdir)
+        reports, ok = [], True
+        for path, truth in corpus:
+            report, passed = check_file(entry, path, truth, paths, args.rtol, args.atol)
+            reports.append(report)
+            ok = ok and passed
+
+    print_report(reports, paths)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'paths': [REFERENCE] + paths, 'results': reports}, f, indent=2)
+    print(f"\n{'OK' if ok else 'MISMATCH'}: {len(reports)} file(s), paths: {', '.join([REFERENCE] + paths)}")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+并发压测：在本地启动服务（uvicorn / gunicorn），按配置的请求组合和并发度 / 到达率发送请求，
+统计 p50/p95/p99 延迟、吞吐、错误率，以及服务进程（含 worker）RSS 随时间的变化
+用于部署前对比不同配置（worker 数、服务器类型、环境变量开关等）
+
+依赖: pip install httpx（gunicorn 模式另需 gunicorn）
+
+用法:
+  python3 bench/load_test.py --concurrency 20 --duration 60
+  python3 bench/load_test.py --rate 5 --mix decode=3,meta=1,health=1 --bodies multipart,raw,base64
+  python3 bench/load_test.py --server gunicorn --workers 4 --label gunicorn-4 --output /tmp/g4.json
+  python3 bench/load_test.py --url http://localhost:8080 --concurrency 5      # 压测已在运行的服务
+  python3 bench/load_test.py --compare /tmp/u1.json /tmp/g4.json               # 对比多次结果
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.abspath(os.path.join(BENCH_DIR, '..'))
+SAMPLE_LOG = os.path.abspath(os.path.join(SERVICE_DIR, '..', 'test-blackbox.bbl'))
+
+ENDPOINTS = {
+    'decode': ('POST', '/decode'),
+    'meta': ('POST', '/meta'),
+    'health': ('GET', '/health'),
+}
+BODY_MODES = ('multipart', 'raw', 'base64')
+PERCENTILES = (50, 95, 99)
+
+
+# ---------------------------------------------------------------------------
+# 服务进程
+# ---------------------------------------------------------------------------
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(server, workers, port, env_overrides):
+    """在 bbl-decoder-standalone 目录下启动服务，返回 Popen（独立进程组，便于整体结束）"""
+    if server == 'uvicorn':
+        cmd = [sys.executable, '-m', 'uvicorn', 'src.entry:app', '--host', '127.0.0.1', '--port', str(port),
+               '--workers', str(workers), '--log-level', 'warning']
+    elif server == 'gunicorn':
+        # 与 deploy.sh 相同的 worker 类型
+        cmd = [sys.executable, '-m', 'gunicorn', 'src.entry:app', '--workers', str(workers),
+               '--worker-class', 'uvicorn.workers.UvicornWorker', '--bind', f'127.0.0.1:{port}',
+               '--timeout', '300', '--log-level', 'warning']
+    else:
+        raise ValueError(f"Unknown server: {server}")
+    env = dict(os.environ, **env_overrides)
+    return subprocess.Popen(cmd, cwd=SERVICE_DIR, env=env, start_new_session=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+def stop_server(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=15)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+def wait_healthy(base_url, proc=None, timeout=60):
+    import httpx
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"Server exited during startup:\n{proc.stderr.read().decode(errors='replace')}")
+        try:
+            if httpx.get(base_url + '/health', timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server not healthy after {timeout}s")
+
+
+def process_tree_rss_mb(root_pid):
+    """root_pid 及其所有子进程的 RSS 之和（ps 在 Linux / macOS 上都可用）"""
+    out = subprocess.run(['ps', '-A', '-o', 'pid=,ppid=,rss='], capture_output=True, text=True).stdout
+    children, rss = {}, {}
+    for line in out.splitlines():
+        parts = line.split()
+        if len(parts) != 3:
+            continue
+        pid, ppid, kb = (int(p) for p in parts)
+        children.setdefault(ppid, []).append(pid)
+        rss[pid] = kb
+    total, count, stack = 0, 0, [root_pid]
+    while stack:
+        pid = stack.pop()
+        if pid in rss:
+            total += rss[pid]
+            count += 1
+        stack.extend(children.get(pid, []))
+    return total / 1024, count
+
+
+class RssSampler(threading.Thread):
+    """后台线程定时采样服务进程树 RSS"""
+
+    def __init__(self, pid, interval):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+        self._t0 = time.perf_counter()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            mb, procs = process_tree_rss_mb(self.pid)
+            self.samples.append((round(time.perf_counter() - self._t0, 2), round(mb, 1), procs))
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+# ---------------------------------------------------------------------------
+# 请求
+# ---------------------------------------------------------------------------
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint: {name} (available: {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def parse_bodies(value):
+    modes = [m.strip() for m in value.split(',') if m.strip()]
+    unknown = [m for m in modes if m not in BODY_MODES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown body modes: {', '.join(unknown)} (available: {', '.join(BODY_MODES)})")
+    return modes
+
+
+def load_corpus(paths, workdir):
+    """读取语料（文件或目录）；未指定时使用 test-blackbox.bbl 和一个合成日志"""
+    files = []
+    for p in paths:
+        if os.path.isdir(p):
+            files += sorted(os.path.join(p, f) for f in os.listdir(p) if f.lower().endswith('.bbl'))
+        else:
+            files.append(p)
+    if not paths:
+        if os.path.exists(SAMPLE_LOG):
+            files.append(SAMPLE_LOG)
+        sys.path.insert(0, BENCH_DIR)
+        import synth_bbl
+        synth = os.path.join(workdir, 'synth-2k-20s.bbl')
+        synth_bbl.generate_file(synth, rate_hz=2000, duration_s=20, seed=7)
+        files.append(synth)
+    corpus = []
+    for path in files:
+        with open(path, 'rb') as f:
+            data = f.read()
+        corpus.append({'name': os.path.basename(path), 'bytes': data,
+                       'b64': base64.b64encode(data).decode('ascii')})
+    if not corpus:
+        raise ValueError("Empty corpus")
+    return corpus
+
+
+def build_request(endpoint, mode, item, params):
+    """返回 httpx.request 的关键字参数"""
+    method, path = ENDPOINTS[endpoint]
+    kwargs = {'method': method, 'url': path, 'params': params}
+    if method == 'GET':
+        return kwargs
+    if mode == 'multipart':
+        kwargs['files'] = {'file': (item['name'], item['bytes'], 'application/octet-stream')}
+    elif mode == 'base64':
+        kwargs['json'] = {'bbl_base64': item['b64']}
+    else:
+        kwargs['content'] = item['bytes']
+        kwargs['headers'] = {'content-type': 'application/octet-stream'}
+    return kwargs
+
+
+class LoadRun:
+    def __init__(self, client, corpus, mix, bodies, params, seed):
+        self.client = client
+        self.corpus = corpus
+        self.names = list(mix)
+        self.weights = [mix[n] for n in self.names]
+        self.bodies = bodies
+        self.params = params
+        self.rng = random.Random(seed)
+        self.records = []
+        self.t0 = time.perf_counter()
+
+    def pick(self):
+        endpoint = self.rng.choices(self.names, self.weights)[0]
+        mode = self.rng.choice(self.bodies)
+        item = self.rng.choice(self.corpus)
+        return endpoint, mode, item
+
+    async def one(self, record=True):
+        endpoint, mode, item = self.pick()
+        kwargs = build_request(endpoint, mode, item, self.params if endpoint != 'health' else None)
+        start = time.perf_counter()
+        status, size, error = 0, 0, None
+        try:
+            resp = await self.client.request(**kwargs)
+            status, size = resp.status_code, len(resp.content)
+            if status >= 400:
+                error = f"HTTP {status}"
+        except Exception as e:  # 超时 / 连接断开都计为错误
+            error = type(e).__name__
+        latency = time.perf_counter() - start
+        if record:
+            self.records.append({
+                'endpoint': endpoint, 'mode': mode, 'file': item['name'],
+                't': round(start - self.t0, 3), 'latency_s': latency,
+                'status': status, 'bytes': size, 'error': error,
+            })
+
+    async def closed_loop(self, concurrency, deadline, max_requests):
+        """固定并发：每个虚拟用户收到响应后立即发下一个请求"""
+        issued = 0
+
+        async def user():
+            nonlocal issued
+            while time.perf_counter() < deadline and (max_requests is None or issued < max_requests):
+                issued += 1
+                await self.one()
+
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+
+    async def open_loop(self, rate, deadline, max_requests, max_inflight):
+        """固定到达率（泊松过程）：不等待响应，超过 max_inflight 的到达计为丢弃"""
+        tasks, issued, self.dropped = set(), 0, 0
+        next_at = time.perf_counter()
+        while next_at < deadline and (max_requests is None or issued < max_requests):
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            issued += 1
+            if len(tasks) >= max_inflight:
+                self.dropped += 1
+            else:
+                task = asyncio.create_task(self.one())
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            next_at += self.rng.expovariate(rate)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+
+# ---------------------------------------------------------------------------
+# 统计与报告
+# ---------------------------------------------------------------------------
+
+def summarize(records, elapsed):
+    def block(rows):
+        if not rows:
+            return None
+        lat = np.array([r['latency_s'] for r in rows]) * 1000
+        errors = sum(1 for r in rows if r['error'])
+        out = {'requests': len(rows), 'errors': errors, 'error_rate': round(errors / len(rows), 4),
+               'rps': round(len(rows) / elapsed, 2), 'mean_ms': round(float(lat.mean()), 1),
+               'max_ms': round(float(lat.max()), 1)}
+        for p in PERCENTILES:
+            out[f'p{p}_ms'] = round(float(np.percentile(lat, p)), 1)
+        return out
+
+    by_endpoint = {}
+    for name in ENDPOINTS:
+        rows = [r for r in records if r['endpoint'] == name]
+        if rows:
+            by_endpoint[name] = block(rows)
+    by_mode = {}
+    for mode in BODY_MODES:
+        rows = [r for r in records if r['mode'] == mode and r['endpoint'] != 'health']
+        if rows:
+            by_mode[mode] = block(rows)
+    error_kinds = {}
+    for r in records:
+        if r['error']:
+            error_kinds[r['error']] = error_kinds.get(r['error'], 0) + 1
+    return {'total': block(records), 'endpoints': by_endpoint, 'bodies': by_mode, 'error_kinds': error_kinds}
+
+
+def print_summary(report):
+    cfg = report['config']
+    load = f"concurrency {cfg['concurrency']}" if cfg['rate'] is None else f"rate {cfg['rate']}/s"
+    print(f"\n== {report['label']}: {cfg['server']} x{cfg['workers']} | {load} | {report['elapsed_s']}s ==")
+    header = f"{'':<12} {'reqs':>6} {'err%':>6} {'rps':>7} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} {'max_ms':>8}"
+    print(header)
+    rows = [('total', report['summary']['total'])]
+    rows += list(report['summary']['endpoints'].items())
+    rows += [(f'  {k}', v) for k, v in report['summary']['bodies'].items()]
+    for name, s in rows:
+        if s:
+            print(f"{name:<12} {s['requests']:>6} {s['error_rate'] * 100:>5.1f}% {s['rps']:>7} "
+                  f"{s['p50_ms']:>8} {s['p95_ms']:>8} {s['p99_ms']:>8} {s['max_ms']:>8}")
+    if report['summary']['error_kinds']:
+        print(f"errors: {report['summary']['error_kinds']}")
+    if report.get('dropped'):
+        print(f"dropped arrivals (max in-flight reached): {report['dropped']}")
+    rss = report.get('rss')
+    if rss:
+        print(f"server RSS: start {rss['start_mb']} MB, peak {rss['peak_mb']} MB, end {rss['end_mb']} MB "
+              f"({rss['processes']} processes)")
+
+
+def print_compare(paths):
+    reports = []
+    for path in paths:
+        with open(path) as f:
+            reports.append(json.load(f))
+    cols = ['server', 'workers', 'load', 'reqs', 'err%', 'rps', 'p50_ms', 'p95_ms', 'p99_ms', 'peak_rss_mb']
+    print(f"{'label':<20} " + ' '.join(f"{c:>11}" for c in cols))
+    for r in reports:
+        cfg, total, rss = r['config'], r['summary']['total'] or {}, r.get('rss') or {}
+        load = f"c{cfg['concurrency']}" if cfg['rate'] is None else f"{cfg['rate']}/s"
+        values = [cfg['server'], cfg['workers'], load, total.get('requests'),
+                  round(total.get('error_rate', 0) * 100, 1), total.get('rps'),
+                  total.get('p50_ms'), total.get('p95_ms'), total.get('p99_ms'), rss.get('peak_mb')]
+        print(f"{r['label'][:20]:<20} " + ' '.join(f"{str(v):>11}" for v in values))
+
+
+async def run_load(args, base_url, corpus):
+    import httpx
+    limits = httpx.Limits(max_connections=max(args.concurrency, args.max_inflight) + 4)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        params = {'features': args.features} if args.features else None
+        run = LoadRun(client, corpus, args.mix, args.bodies, params, args.seed)
+        for _ in range(args.warmup):
+            await run.one(record=False)
+        run.t0 = time.perf_counter()
+        deadline = run.t0 + args.duration
+        if args.rate:
+            await run.open_loop(args.rate, deadline, args.requests, args.max_inflight)
+        else:
+            await run.closed_loop(args.concurrency, deadline, args.requests)
+        return run, time.perf_counter() - run.t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--corpus', nargs='*', default=[], help='BBL 文件或目录（默认：样例 + 合成日志）')
+    ap.add_argument('--mix', type=parse_mix, default=parse_mix('decode=6,meta=3,health=1'),
+                    help='端点权重，如 decode=6,meta=3,health=1')
+    ap.add_argument('--bodies', type=parse_bodies, default=list(BODY_MODES), help='multipart,raw,base64')
+    ap.add_argument('--features', help='透传给 /decode、/meta 的 features 参数')
+    ap.add_argument('--concurrency', type=int, default=10, help='固定并发（闭环）')
+    ap.add_argument('--rate', type=float, help='固定到达率 req/s（开环，泊松到达），指定后忽略 --concurrency')
+    ap.add_argument('--max-inflight', type=int, default=200, help='开环模式下的最大在途请求数')
+    ap.add_argument('--duration', type=float, default=30.0, help='压测秒数')
+    ap.add_argument('--requests', type=int, help='最多发送的请求数')
+    ap.add_argument('--warmup', type=int, default=2, help='预热请求数（不计入统计）')
+    ap.add_argument('--timeout', type=float, default=300.0, help='单请求超时秒数')
+    ap.add_argument('--server', choices=['uvicorn', 'gunicorn'], default='uvicorn')
+    ap.add_argument('--workers', type=int, default=1)
+    ap.add_argument('--env', action='append', default=[], metavar='KEY=VALUE', help='传给服务进程的环境变量')
+    ap.add_argument('--url', help='压测已运行的服务，不在本地启动')
+    ap.add_argument('--pid', type=int, help='配合 --url：采样该进程树的 RSS')
+    ap.add_argument('--rss-interval', type=float, default=0.5)
+    ap.add_argument('--label', help='本次结果的名称（默认按配置生成）')
+    ap.add_argument('--output', help='结果 JSON 路径（含每个请求的明细和 RSS 时间线）')
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--compare', nargs='+', metavar='RESULT_JSON', help='对比多个结果文件后退出')
+    args = ap.parse_args()
+
+    if args.compare:
+        print_compare(args.compare)
+        return 0
+    try:
+        import httpx  # noqa: F401
+    except ImportError:
+        print("httpx is required: pip install httpx", file=sys.stderr)
+        return 2
+
+    env_overrides = dict(item.split('=', 1) for item in args.env)
+    label = args.label or f"{args.server}-w{args.workers}-" + (f"r{args.rate:g}" if args.rate else f"c{args.concurrency}")
+
+    proc = None
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus = load_corpus(args.corpus, workdir)
+    try:
+        if args.url:
+            base_url = args.url.rstrip('/')
+            wait_healthy(base_url)
+            server_pid = args.pid
+        else:
+            port = _free_port()
+            base_url = f'http://127.0.0.1:{port}'
+            proc = start_server(args.server, args.workers, port, env_overrides)
+            wait_healthy(base_url, proc)
+            server_pid = proc.pid
+
+        sampler = RssSampler(server_pid, args.rss_interval) if server_pid else None
+        if sampler:
+            sampler.start()
+        run, elapsed = asyncio.run(run_load(args, base_url, corpus))
+        if sampler:
+            sampler.stop()
+    finally:
+        if proc is not None:
+            stop_server(proc)
+
+    rss = None
+    if sampler and sampler.samples:
+        values = [s[1] for s in sampler.samples]
+        rss = {'start_mb': values[0], 'peak_mb': max(values), 'end_mb': values[-1],
+               'processes': max(s[2] for s in sampler.samples), 'timeline': sampler.samples}
+
+    report = {
+        'label': label,
+        'config': {'server': args.server if not args.url else 'external', 'workers': args.workers,
+                   'concurrency': None if args.rate else args.concurrency, 'rate': args.rate,
+                   'mix': args.mix, 'bodies': args.bodies, 'features': args.features, 'env': env_overrides,
+                   'corpus': [c['name'] for c in corpus]},
+        'elapsed_s': round(elapsed, 2),
+        'dropped': getattr(run, 'dropped', 0),
+        'summary': summarize(run.records, elapsed),
+        'rss': rss,
+        'requests': run.records,
+    }
+    print_summary(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+        print(f"Saved: {args.output}")
+    return 1 if report['summary']['total'] and report['summary']['total']['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,862 @@
+#!/usr/bin/env python3
+"""
+合成 Blackbox 日志生成器（编码器）：生成可被 orangebox / blackbox_decode 解析的 BBL 文件
+- Betaflight 风格 header、I/P 帧（使用 Betaflight 的预测器：increment / straight line / previous / average2 等）
+- S 帧（flightModeFlags 等）、事件帧（sync beep / flight mode / logging resume / disarm / log end）
+- 采样率、时长、字段集合、log 数量、信号模型（噪声峰、阶跃、油门扫频 / 收油）均可配置
+- 可注入损坏：随机比特翻转、垃圾字节块、截断尾部
+- 信号已知，随文件输出 ground truth（噪声峰频率、收油时刻、电机故障窗口等），用于校验分析特征
+
+编码全部是 numpy 整块运算：帧按 I 帧边界分块，每块独立做预测残差 + 变长编码，内存占用与时长无关。
+P 帧字段统一用 signed VB（encoding 0），I 帧沿用 Betaflight 的编码；header 如实声明，任何解码器都按声明解析。
+
+用法:
+  python3 bench/synth_bbl.py out.bbl --rate 2000 --duration 60
+  python3 bench/synth_bbl.py out.bbl --rate 8000 --duration 600 --fields full --throttle race --logs 3
+  python3 bench/synth_bbl.py out.bbl --corrupt flip_rate=1e-5,bursts=3,truncate=0.97 --truth out.truth.json
+  python3 bench/synth_bbl.py corpus/log.bbl --count 20 --duration 300     # corpus/log_000.bbl ...
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+LOG_HEADER_PRODUCT = 'Blackbox flight data recorder by Nicholas Sherlock'
+END_OF_LOG_MESSAGE = b'End of log\x00'
+
+# 事件类型（Betaflight FLIGHT_LOG_EVENT_*）
+EVENT_SYNC_BEEP = 0
+EVENT_LOGGING_RESUME = 14
+EVENT_DISARM = 15
+EVENT_FLIGHT_MODE = 30
+EVENT_LOG_END = 255
+
+# 编码 / 预测器编号（与 Betaflight blackbox 一致）
+ENC_SIGNED_VB = 0
+ENC_UNSIGNED_VB = 1
+ENC_NEG_14BIT = 3
+ENC_TAG2_3S32 = 7
+ENC_NULL = 9
+PRED_ZERO = 0
+PRED_PREVIOUS = 1
+PRED_STRAIGHT_LINE = 2
+PRED_AVERAGE_2 = 3
+PRED_MOTOR_0 = 5
+PRED_INCREMENT = 6
+PRED_VBATREF = 9
+PRED_MINMOTOR = 11
+
+# 字段组：(name, signed, I predictor, I encoding, P predictor)，P 帧编码统一为 signed VB
+FIELD_GROUPS = {
+    'core': [('loopIteration', 0, PRED_ZERO, ENC_UNSIGNED_VB, PRED_INCREMENT),
+             ('time', 0, PRED_ZERO, ENC_UNSIGNED_VB, PRED_STRAIGHT_LINE)],
+    'pid': ([(f'axisP[{i}]', 1, PRED_ZERO, ENC_SIGNED_VB, PRED_PREVIOUS) for i in range(3)]
+            + [(f'axisI[{i}]', 1, PRED_ZERO, ENC_SIGNED_VB, PRED_PREVIOUS) for i in range(3)]
+            + [(f'axisD[{i}]', 1, PRED_ZERO, ENC_SIGNED_VB, PRED_PREVIOUS) for i in range(2)]
+            + [(f'axisF[{i}]', 1, PRED_ZERO, ENC_SIGNED_VB, PRED_PREVIOUS) for i in range(3)]),
+    'rc': ([(f'rcCommand[{i}]', 1, PRED_ZERO, ENC_SIGNED_VB, PRED_PREVIOUS) for i in range(3)]
+           + [('rcCommand[3]', 0, PRED_ZERO, ENC_UNSIGNED_VB, PRED_PREVIOUS)]
+           + [(f'setpoint[{i}]', 1, PRED_ZERO, ENC_SIGNED_VB, PRED_PREVIOUS) for i in range(4)]),
+    'power': [('vbatLatest', 0, PRED_VBATREF, ENC_NEG_14BIT, PRED_PREVIOUS),
+              ('amperageLatest', 1, PRED_ZERO, ENC_SIGNED_VB, PRED_PREVIOUS)],
+    'rssi': [('rssi', 0, PRED_ZERO, ENC_UNSIGNED_VB, PRED_PREVIOUS)],
+    'gyro': [(f'gyroADC[{i}]', 1, PRED_ZERO, ENC_SIGNED_VB, PRED_AVERAGE_2) for i in range(3)],
+    'gyro_unfilt': [(f'gyroUnfilt[{i}]', 1, PRED_ZERO, ENC_SIGNED_VB, PRED_AVERAGE_2) for i in range(3)],
+    'acc': [(f'accSmooth[{i}]', 1, PRED_ZERO, ENC_SIGNED_VB, PRED_AVERAGE_2) for i in range(3)],
+    'debug': [(f'debug[{i}]', 1, PRED_ZERO, ENC_SIGNED_VB, PRED_AVERAGE_2) for i in range(8)],
+    'motor': ([('motor[0]', 0, PRED_MINMOTOR, ENC_UNSIGNED_VB, PRED_AVERAGE_2)]
+              + [(f'motor[{i}]', 0, PRED_MOTOR_0, ENC_SIGNED_VB, PRED_AVERAGE_2) for i in range(1, 4)]),
+    'erpm': [(f'eRPM[{i}]', 0, PRED_ZERO, ENC_UNSIGNED_VB, PRED_PREVIOUS) for i in range(4)],
+}
+FIELD_GROUP_ORDER = ['core', 'pid', 'rc', 'power', 'rssi', 'gyro', 'gyro_unfilt', 'acc', 'debug', 'motor', 'erpm']
+FIELD_PRESETS = {
+    'minimal': ['core', 'rc', 'gyro', 'motor'],
+    'standard': ['core', 'pid', 'rc', 'power', 'rssi', 'gyro', 'acc', 'motor'],
+    'full': FIELD_GROUP_ORDER,
+}
+
+# S 帧：flightModeFlags 的 bit0 为 ARM（Betaflight 记录 rcModeActivationMask）
+SLOW_FIELDS = [('flightModeFlags', 0, ENC_UNSIGNED_VB), ('stateFlags', 0, ENC_UNSIGNED_VB),
+               ('failsafePhase', 0, ENC_TAG2_3S32), ('rxSignalReceived', 0, ENC_TAG2_3S32),
+               ('rxFlightChannelsValid', 0, ENC_TAG2_3S32)]
+FLAG_ARM = 1 << 0
+FLAG_ANGLE = 1 << 1
+
+# 每块包含的 I 帧组数（每组 = 1 个 I 帧 + 若干 P 帧），S 帧在每块开头重发
+CHUNK_GROUPS = 256
+
+# header 模板（取自真实 Betaflight 4.5 日志），looptime / 帧间隔等由配置计算后覆盖
+HEADER_TEMPLATE = {
+    'Firmware type': 'Cleanflight',
+    'Firmware revision': 'Betaflight 4.5.2 (024f8e13d) STM32F745',
+    'Firmware date': 'Apr  3 2025 01:50:48',
+    'Board information': 'SYNT SYNTHETIC745',
+    'Log start datetime': '0000-01-01T00:00:00.000+00:00',
+    'Craft name': 'synthetic',
+    'minthrottle': 1070,
+    'maxthrottle': 2000,
+    'gyro_scale': '0x3f800000',
+    'motorOutput': [158, 2047],
+    'acc_1G': 2048,
+    'vbat_scale': 111,
+    'vbatcellvoltage': [330, 350, 430],
+    'vbatref': 1680,
+    'currentSensor': [-500, 275],
+    'rc_rates': [64, 64, 64],
+    'rc_expo': [0, 0, 0],
+    'rates': [70, 70, 70],
+    'rate_limits': [1998, 1998, 1998],
+    'rollPID': [45, 80, 40],
+    'pitchPID': [47, 84, 46],
+    'yawPID': [45, 80, 0],
+    'd_max_gain': 37,
+    'd_max_advance': 20,
+    'dterm_lpf1_type': 0,
+    'dterm_lpf1_static_hz': 75,
+    'dterm_lpf1_dyn_hz': [75, 150],
+    'dterm_lpf1_dyn_expo': 5,
+    'dterm_lpf2_type': 0,
+    'dterm_lpf2_static_hz': 150,
+    'dterm_notch_hz': 0,
+    'dterm_notch_cutoff': 0,
+    'iterm_relax': 1,
+    'iterm_relax_type': 1,
+    'iterm_relax_cutoff': 15,
+    'anti_gravity_gain': 80,
+    'ff_weight': [120, 125, 120],
+    'gyro_lpf1_type': 0,
+    'gyro_lpf1_static_hz': 250,
+    'gyro_lpf1_dyn_hz': [250, 500],
+    'gyro_lpf1_dyn_expo': 5,
+    'gyro_lpf2_type': 0,
+    'gyro_lpf2_static_hz': 500,
+    'gyro_notch_hz': [0, 0],
+    'gyro_notch_cutoff': [0, 0],
+    'dyn_notch_max_hz': 600,
+    'dyn_notch_count': 1,
+    'dyn_notch_q': 500,
+    'dyn_notch_min_hz': 100,
+    'dshot_bidir': 1,
+    'motor_poles': 14,
+    'rpm_filter_harmonics': 3,
+    'rpm_filter_min_hz': 100,
+    'motor_pwm_protocol': 6,
+    'dshot_idle_value': 550,
+    'debug_mode': 6,
+    'features': 268795912,
+    'fields_disabled_mask': 0,
+    'blackbox_high_resolution': 0,
+}
+
+DEFAULTS = {
+    'rate_hz': 2000,            # 实际记录频率
+    'gyro_rate_hz': 8000,
+    'pid_rate_hz': None,        # 默认 max(rate_hz, 4000)
+    'duration_s': 30.0,         # 每个 log 的时长
+    'logs': 1,                  # 文件内 log 数量（多 log 闪存转储）
+    'fields': 'full',           # 预设名或字段组列表
+    'flights': 1,               # 每个 log 内的飞行段数，段间为怠速落地
+    'ground_s': 1.0,            # 每段落地怠速时长
+    'throttle': 'race',         # hover / sweep / chops / race
+    'step_dps': [300, 300, 150],  # 设定值阶跃幅度（roll/pitch/yaw）
+    'step_interval_s': 0.5,
+    'response_ms': 15.0,        # 陀螺跟随设定值的一阶延迟
+    'noise_peaks': [[180, 6.0], [320, 3.0]],  # 固定频率噪声峰 [hz, dps]（机架共振等）
+    'motor_noise': {'amp': 8.0, 'harmonics': [1.0, 0.5]},  # 随转速变化的电机噪声
+    'white_noise': 1.5,
+    'prop_wash': {'amp': 40.0, 'hz': 60.0, 'decay_ms': 80.0},
+    'motor_faults': [],         # [{'motor': 0, 't_s': 5.0, 'dur_ms': 40, 'kind': 'desync'|'dropout'}]
+    'gaps': [],                 # [[t_s, dur_ms]] 记录中断，下一个 I 帧处带 LOGGING_RESUME 事件恢复
+    'mode_switches': [],        # [[t_s, flags]] 飞行模式切换（FLIGHT_MODE 事件 + S 帧），flags 不含 ARM 位
+    'time_jitter_us': 0.0,
+    'kv': 1950,
+    'cells': 4,
+    'corrupt': {},              # {'flip_rate': 1e-5, 'bursts': 3, 'truncate': 0.97}
+    'headers': {},              # 覆盖 header（滤波配置等）
+    'seed': 0,
+}
+
+
+# ---------------------------------------------------------------------------
+# 配置
+# ---------------------------------------------------------------------------
+
+def _resolve_fields(fields):
+    groups = FIELD_PRESETS.get(fields) if isinstance(fields, str) else fields
+    if groups is None:
+        raise ValueError(f"Unknown field preset: {fields} (available: {', '.join(FIELD_PRESETS)})")
+    unknown = [g for g in groups if g not in FIELD_GROUPS]
+    if unknown:
+        raise ValueError(f"Unknown field groups: {', '.join(unknown)} (available: {', '.join(FIELD_GROUP_ORDER)})")
+    if 'core' not in groups:
+        groups = ['core'] + list(groups)
+    return [g for g in FIELD_GROUP_ORDER if g in groups]
+
+
+def make_config(**options):
+    """合并默认值并校验采样率关系，返回完整配置 dict"""
+    unknown = set(options) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown options: {', '.join(sorted(unknown))}")
+    cfg = dict(DEFAULTS, **options)
+    cfg['headers'] = dict(HEADER_TEMPLATE, **cfg['headers'])
+
+    gyro_rate = int(cfg['gyro_rate_hz'])
+    rate = int(cfg['rate_hz'])
+    pid_rate = int(cfg['pid_rate_hz'] or max(rate, 4000))
+    if gyro_rate % pid_rate or pid_rate % rate:
+        raise ValueError(f"rate_hz ({rate}) must divide pid_rate_hz ({pid_rate}), which must divide gyro_rate_hz ({gyro_rate})")
+    p_denom = pid_rate // rate
+    # Betaflight 约每 32ms 一个 I 帧，间隔需为 P 间隔的整数倍
+    i_interval = max(p_denom, round(pid_rate * 0.032 / p_denom) * p_denom)
+    cfg.update(gyro_rate_hz=gyro_rate, pid_rate_hz=pid_rate, rate_hz=rate,
+               p_denom=p_denom, i_interval=i_interval, groups=_resolve_fields(cfg['fields']))
+
+    flights = int(cfg['flights'])
+    if flights < 1 or cfg['duration_s'] - cfg['ground_s'] * (flights + 1) < flights:
+        raise ValueError("duration_s too short for the requested flights / ground_s")
+    if cfg['throttle'] not in THROTTLE_MODELS:
+        raise ValueError(f"Unknown throttle model: {cfg['throttle']} (available: {', '.join(THROTTLE_MODELS)})")
+
+    cfg['headers'].update({
+        'I interval': i_interval,
+        'P interval': p_denom,
+        'P ratio': i_interval // p_denom,
+        'looptime': round(1_000_000 / gyro_rate),
+        'gyro_sync_denom': 1,
+        'pid_process_denom': gyro_rate // pid_rate,
+    })
+    return cfg
+
+
+def field_layout(cfg):
+    """按配置展开字段定义列表"""
+    return [f for g in cfg['groups'] for f in FIELD_GROUPS[g]]
+
+
+def build_header(cfg):
+    fields = field_layout(cfg)
+
+    def csv(values):
+        return ','.join(str(v) for v in values)
+
+    lines = [
+        f'H Product:{LOG_HEADER_PRODUCT}',
+        'H Data version:2',
+        f'H Field I name:{csv(f[0] for f in fields)}',
+        f'H Field I signed:{csv(f[1] for f in fields)}',
+        f'H Field I predictor:{csv(f[2] for f in fields)}',
+        f'H Field I encoding:{csv(f[3] for f in fields)}',
+        f'H Field P predictor:{csv(f[4] for f in fields)}',
+        f'H Field P encoding:{csv(ENC_NULL if f[4] == PRED_INCREMENT else ENC_SIGNED_VB for f in fields)}',
+        f'H Field S name:{csv(f[0] for f in SLOW_FIELDS)}',
+        f'H Field S signed:{csv(f[1] for f in SLOW_FIELDS)}',
+        f'H Field S predictor:{csv(0 for _ in SLOW_FIELDS)}',
+        f'H Field S encoding:{csv(f[2] for f in SLOW_FIELDS)}',
+    ]
+    for key, value in cfg['headers'].items():
+        lines.append(f'H {key}:{csv(value) if isinstance(value, (list, tuple)) else value}')
+    return ('\n'.join(lines) + '\n').encode('ascii')
+
+
+# ---------------------------------------------------------------------------
+# 飞行计划：油门节点、设定值阶跃、收油时刻等，全部预先确定，信号可按任意时间点求值
+# ---------------------------------------------------------------------------
+
+def _throttle_hover(rng, a, b):
+    t = np.arange(a, b, 1.0)
+    return t, 0.35 + rng.uniform(-0.05, 0.05, t.size)
+
+
+def _throttle_sweep(rng, a, b, period=4.0):
+    t = np.arange(a, b, period / 2)
+    return t, np.where(np.arange(t.size) % 2 == 0, 0.1, 0.9)
+
+
+def _throttle_chops(rng, a, b):
+    t, v, cur = [], [], a
+    while cur + 2.4 < b:
+        t += [cur, cur + 0.3, cur + 1.5, cur + 1.53, cur + 2.3]
+        v += [0.1, 0.7, 0.7, 0.1, 0.1]
+        cur += 2.4
+    return np.array(t), np.array(v)
+
+
+def _throttle_race(rng, a, b):
+    t, v, cur, level = [a], [0.3], a, 0.3
+    while True:
+        if rng.random() < 0.25 and level > 0.45:
+            cur, level = cur + 0.04, 0.08      # 收油
+        else:
+            cur, level = cur + rng.uniform(0.15, 0.8), rng.uniform(0.2, 0.95)
+        if cur >= b:
+            break
+        t.append(cur)
+        v.append(level)
+    return np.array(t), np.array(v)
+
+
+THROTTLE_MODELS = {
+    'hover': _throttle_hover,
+    'sweep': _throttle_sweep,
+    'chops': _throttle_chops,
+    'race': _throttle_race,
+}
+
+# 与 detectors.py 的收油判定一致：100ms 内下降 >= 15%
+CHOP_LAG_S = 0.100
+CHOP_DROP = 0.15
+
+
+def build_plan(cfg, rng):
+    """生成一个 log 的飞行计划（油门节点、阶跃、收油时刻），ground truth 也从这里导出"""
+    duration = float(cfg['duration_s'])
+    ground = float(cfg['ground_s'])
+    flights = int(cfg['flights'])
+    flight_len = (duration - ground * (flights + 1)) / flights
+    windows = [(ground + k * (flight_len + ground), ground + k * (flight_len + ground) + flight_len)
+               for k in range(flights)]
+
+    # 油门节点：落地为 0，起飞 / 降落各 0.2s 斜坡
+    thr_t, thr_v = [0.0], [0.0]
+    for a, b in windows:
+        t, v = THROTTLE_MODELS[cfg['throttle']](rng, a + 0.2, b - 0.2)
+        thr_t += [a] + list(t) + [b]
+        thr_v += [0.0] + list(v) + [0.0]
+    thr_t.append(duration)
+    thr_v.append(0.0)
+    thr_t, order = np.unique(np.asarray(thr_t, dtype=np.float64), return_index=True)
+    thr_v = np.asarray(thr_v, dtype=np.float64)[order]
+
+    dv = thr_v[:-1] - thr_v[1:]
+    chops = thr_t[:-1][(dv >= CHOP_DROP) & (np.diff(thr_t) <= CHOP_LAG_S)]
+    in_flight = np.zeros(chops.size, dtype=bool)
+    for a, b in windows:
+        in_flight |= (chops > a) & (chops < b - 0.2)
+    chops = chops[in_flight]
+
+    # 设定值阶跃：飞行中每 step_interval_s 随机换一次（分段常值），落地为 0
+    step_t = [np.array([0.0])] * 3
+    step_v = [np.array([0.0])] * 3
+    interval = float(cfg['step_interval_s'])
+    for axis in range(3):
+        times, values = [0.0], [0.0]
+        for a, b in windows:
+            t = np.arange(a, b, interval)
+            times += list(t) + [b]
+            values += list(rng.uniform(-1, 1, t.size) * cfg['step_dps'][axis]) + [0.0]
+        step_t[axis] = np.asarray(times)
+        step_v[axis] = np.round(np.asarray(values))
+
+    # 一阶响应的闭式解：e(t) = E_k * exp(-(t - s_k) / tau)，E_k 为第 k 次阶跃后残余误差
+    tau = cfg['response_ms'] / 1000
+    residual = []
+    for axis in range(3):
+        s, v = step_t[axis], step_v[axis]
+        deltas = np.diff(v, prepend=0.0)
+        e = np.zeros(s.size)
+        for k in range(s.size):
+            e[k] = deltas[k] + (e[k - 1] * math.exp(-(s[k] - s[k - 1]) / tau) if k else 0.0)
+        residual.append(e)
+
+    # 油门分段积分的节点累计值（电机噪声相位 = 2π ∫ f(t) dt）
+    thr_integral = np.concatenate(([0.0], np.cumsum((thr_v[1:] + thr_v[:-1]) / 2 * np.diff(thr_t))))
+
+    return {
+        'windows': windows,
+        'thr_t': thr_t, 'thr_v': thr_v, 'thr_integral': thr_integral,
+        'chops': chops,
+        'step_t': step_t, 'step_v': step_v, 'residual': residual,
+        'peak_phase': rng.uniform(0, 2 * np.pi, (len(cfg['noise_peaks']), 3)),
+    }
+
+
+def _throttle_integral(plan, t):
+    tk, vk, ck = plan['thr_t'], plan['thr_v'], plan['thr_integral']
+    i = np.clip(np.searchsorted(tk, t, side='right') - 1, 0, tk.size - 1)
+    v = np.interp(t, tk, vk)
+    return ck[i] + (vk[i] + v) / 2 * (t - tk[i])
+
+
+def _pt1_gain(freq, cutoff):
+    return 1.0 / np.sqrt(1.0 + (np.asarray(freq) / cutoff) ** 2)
+
+
+def motor_noise_hz(cfg, throttle):
+    """电机基频（机械转速 Hz），随油门线性变化：怠速 ~ 满油门"""
+    idle = cfg['headers']['dshot_idle_value'] / 10000
+    full = cfg['kv'] * cfg['cells'] * 4.2 / 60 * 0.85
+    return full * (idle + (1 - idle) * np.asarray(throttle))
+
+
+def _gyro_parts(cfg, plan, t):
+    """返回 (setpoint (3,n), 响应+桨洗 (3,n), 噪声 (3,n), 滤波后噪声 (3,n), throttle (n,))"""
+    n = t.size
+    thr = np.interp(t, plan['thr_t'], plan['thr_v'])
+    tau = cfg['response_ms'] / 1000
+    sp = np.empty((3, n))
+    response = np.empty((3, n))
+    for axis in range(3):
+        s = plan['step_t'][axis]
+        k = np.clip(np.searchsorted(s, t, side='right') - 1, 0, s.size - 1)
+        sp[axis] = plan['step_v'][axis][k]
+        response[axis] = sp[axis] - plan['residual'][axis][k] * np.exp(-(t - s[k]) / tau)
+
+    pw = cfg['prop_wash']
+    chops = plan['chops']
+    if chops.size and pw.get('amp'):
+        j = np.searchsorted(chops, t, side='right') - 1
+        dt = t - chops[np.maximum(j, 0)]
+        active = (j >= 0) & (dt < 0.4)
+        wave = np.where(active, pw['amp'] * np.exp(-dt / (pw['decay_ms'] / 1000)) * np.sin(2 * np.pi * pw['hz'] * dt), 0.0)
+        response += wave * np.array([1.0, 1.0, 0.4])[:, None]
+
+    h = cfg['headers']
+    lpf = lambda f: _pt1_gain(f, h['gyro_lpf1_static_hz']) * _pt1_gain(f, h['gyro_lpf2_static_hz'])
+    noise = np.zeros((3, n))
+    filtered = np.zeros((3, n))
+    for (hz, amp), phase in zip(cfg['noise_peaks'], plan['peak_phase']):
+        wave = amp * np.sin(2 * np.pi * hz * t[None, :] + phase[:, None])
+        noise += wave
+        filtered += wave * lpf(hz)
+
+    mn = cfg['motor_noise']
+    if mn.get('amp'):
+        idle = h['dshot_idle_value'] / 10000
+        base = motor_noise_hz(cfg, 0.0)
+        span = motor_noise_hz(cfg, 1.0) - base
+        phase = 2 * np.pi * (base * t + span * _throttle_integral(plan, t))
+        freq = base + span * thr
+        # RPM 滤波开启时电机噪声在滤波后基本消除
+        rpm_atten = 0.05 if h.get('dshot_bidir') else 1.0
+        for harmonic, weight in enumerate(mn['harmonics'], start=1):
+            wave = mn['amp'] * weight * (idle + thr) * np.sin(harmonic * phase)
+            noise += wave * np.array([1.0, 0.8, 0.5])[:, None]
+            filtered += wave * lpf(freq * harmonic) * rpm_atten * np.array([1.0, 0.8, 0.5])[:, None]
+    return sp, response, noise, filtered, thr
+
+
+def compute_columns(cfg, plan, t, rng):
+    """对时间点 t（秒，相对 log 起点）计算所有字段的整数值，返回 {field: (n,) int64}"""
+    n = t.size
+    h = cfg['headers']
+    sp, response, noise, filtered, thr = _gyro_parts(cfg, plan, t)
+    white = rng.normal(0.0, cfg['white_noise'], (3, n)) if cfg['white_noise'] else 0.0
+    gyro_unfilt = response + noise + white
+    gyro = response + filtered + white * 0.3
+
+    # D 项用上一采样点的确定性部分求导，分块之间保持连续
+    dt = 1.0 / cfg['rate_hz']
+    sp_prev, response_prev, _, filtered_prev, _ = _gyro_parts(cfg, plan, t - dt)
+    d_gyro = ((response + filtered) - (response_prev + filtered_prev)) / dt
+    d_sp = (sp - sp_prev) / dt
+
+    pids = np.array([h['rollPID'], h['pitchPID'], h['yawPID']], dtype=np.float64)
+    ff = np.asarray(h['ff_weight'], dtype=np.float64)
+    err = sp - gyro
+    axis_p = pids[:, 0:1] * 0.032 * err
+    axis_i = pids[:, 1:2] * 0.05 * (sp - response)
+    axis_d = -pids[:, 2:3] * 0.0003 * d_gyro
+    axis_f = ff[:, None] * 0.0002 * d_sp
+
+    # Quad-X 混控（Betaflight 电机顺序：右后 / 右前 / 左后 / 左前）
+    mix = np.array([[-1, 1, -1], [-1, -1, 1], [1, 1, 1], [1, -1, -1]], dtype=np.float64)
+    pid_sum = np.clip(axis_p + axis_i + axis_d + axis_f, -500, 500)
+    lo, hi = h['motorOutput']
+    motor_norm = np.clip(thr[None, :] + mix @ pid_sum / 2000, 0.0, 1.0)
+    motor = lo + motor_norm * (hi - lo)
+
+    # eRPM（/100）：机械转速 * 极对数
+    erpm = motor_noise_hz(cfg, motor_norm) * 60 * (h['motor_poles'] / 2) / 100
+    for fault in cfg['motor_faults']:
+        t0 = fault['t_s']
+        mask = (t >= t0) & (t < t0 + fault['dur_ms'] / 1000)
+        erpm[fault['motor'], mask] *= 0.3 if fault.get('kind', 'desync') == 'desync' else 0.0
+
+    vbat0 = cfg['cells'] * 420
+    vbat = vbat0 - 150 * thr - cfg['cells'] * 60 * t / cfg['duration_s']
+    amperage = (100 + 8000 * thr ** 1.5)
+
+    stick = np.clip(sp / np.asarray(h['rate_limits'], dtype=np.float64)[:, None] * 500 * 3, -500, 500)
+    acc = np.stack([rng.normal(0, 20, n), rng.normal(0, 20, n), h['acc_1G'] * (1 + thr)])
+
+    cols = {'rssi': np.full(n, 1023.0), 'vbatLatest': vbat, 'amperageLatest': amperage,
+            'rcCommand[3]': 1000 + thr * 1000, 'setpoint[3]': thr * 1000}
+    for i in range(3):
+        cols[f'axisP[{i}]'] = axis_p[i]
+        cols[f'axisI[{i}]'] = axis_i[i]
+        cols[f'axisF[{i}]'] = axis_f[i]
+        cols[f'rcCommand[{i}]'] = stick[i]
+        cols[f'setpoint[{i}]'] = sp[i]
+        cols[f'gyroADC[{i}]'] = gyro[i]
+        cols[f'gyroUnfilt[{i}]'] = gyro_unfilt[i]
+        cols[f'accSmooth[{i}]'] = acc[i]
+        cols[f'debug[{i}]'] = gyro_unfilt[i]     # debug_mode GYRO_SCALED：滤波前陀螺
+    for i in range(2):
+        cols[f'axisD[{i}]'] = axis_d[i]
+    for i in range(3, 8):
+        cols[f'debug[{i}]'] = np.zeros(n)
+    for i in range(4):
+        cols[f'motor[{i}]'] = motor[i]
+        cols[f'eRPM[{i}]'] = erpm[i]
+    return {k: np.rint(v).astype(np.int64) for k, v in cols.items()}
+
+
+# ---------------------------------------------------------------------------
+# 编码
+# ---------------------------------------------------------------------------
+
+def _vb_length(u):
+    return 1 + (u >= 1 << 7) + (u >= 1 << 14) + (u >= 1 << 21) + (u >= 1 << 28)
+
+
+def vb_encode(u, lengths):
+    """向量化变长编码：u (m,) uint64，lengths (m,) 每个值的字节数（0 表示不写），返回 uint8 数组"""
+    total = int(lengths.sum())
+    starts = np.cumsum(lengths) - lengths
+    k = np.arange(total, dtype=np.int64) - np.repeat(starts, lengths)
+    values = np.repeat(u, lengths) >> (7 * k).astype(np.uint64)
+    more = k < np.repeat(lengths, lengths) - 1
+    return ((values & 0x7F) | (more.astype(np.uint64) << 7)).astype(np.uint8)
+
+
+def _uvb(value):
+    return vb_encode(np.array([value & 0xFFFFFFFF], dtype=np.uint64),
+                     _vb_length(np.array([value & 0xFFFFFFFF], dtype=np.uint64))).tobytes()
+
+
+def _tag2_3s32(values):
+    """3 个小整数的 tag2_3s32 编码（S 帧用）"""
+    if all(-2 <= v <= 1 for v in values):
+        return bytes([((values[0] & 3) << 4) | ((values[1] & 3) << 2) | (values[2] & 3)])
+    if all(-8 <= v <= 7 for v in values):
+        return bytes([0x40 | (values[0] & 0xF), ((values[1] & 0xF) << 4) | (values[2] & 0xF)])
+    if all(-32 <= v <= 31 for v in values):
+        return bytes([0x80 | (v & 0x3F) for v in values])
+    out = bytes([0xC0 | 0x3F])   # 3 个 32bit
+    for v in values:
+        out += (v & 0xFFFFFFFF).to_bytes(4, 'little')
+    return out
+
+
+def slow_frame(flags, state=0, failsafe=0, rx=1, channels=1):
+    return b'S' + _uvb(flags) + _uvb(state) + _tag2_3s32([failsafe, rx, channels])
+
+
+def event_frame(kind, *values):
+    body = END_OF_LOG_MESSAGE if kind == EVENT_LOG_END else b''.join(_uvb(v) for v in values)
+    return b'E' + bytes([kind]) + body
+
+
+def encode_frames(values, intra, fields, headers):
+    """
+    values: (n, F) int64，字段顺序同 fields；intra: (n,) bool，第 0 帧必须是 I 帧
+    返回 (bytes uint8 数组, 每帧起始偏移 (n+1,))
+    P 帧的历史与 orangebox / Betaflight 一致：I 帧之后历史被 I 帧填满
+    """
+    n, F = values.shape
+    idx = np.arange(n)
+    group = np.maximum.accumulate(np.where(intra, idx, 0))
+    prev_idx = np.maximum(idx - 1, 0)
+    prev2_idx = np.maximum(idx - 2, group)
+    names = [f[0] for f in fields]
+    cols = np.ascontiguousarray(values.T)
+
+    # 逐字段（连续内存的行）计算残差和编码后的无符号值
+    u = np.empty((F + 1, n), dtype=np.uint64)
+    lengths = np.empty((F + 1, n), dtype=np.int64)
+    u[0] = np.where(intra, ord('I'), ord('P'))     # 帧类型标记（单字节 VB 与原字节相同）
+    lengths[0] = 1
+    for j, (name, _, i_pred, i_enc, p_pred) in enumerate(fields):
+        v = cols[j]
+        if p_pred == PRED_PREVIOUS:
+            res = v - v[prev_idx]
+        elif p_pred == PRED_STRAIGHT_LINE:
+            res = v - (2 * v[prev_idx] - v[prev2_idx])
+        elif p_pred == PRED_AVERAGE_2:
+            total = v[prev_idx] + v[prev2_idx]
+            res = v - ((total + ((total >> 63) & 1)) >> 1)    # 向零取整
+        else:
+            res = np.zeros(n, dtype=np.int64)
+
+        base = v
+        if i_pred == PRED_VBATREF:
+            base = v - int(headers['vbatref'])
+        elif i_pred == PRED_MINMOTOR:
+            base = v - int(headers['motorOutput'][0])
+        elif i_pred == PRED_MOTOR_0:
+            base = v - cols[names.index('motor[0]')]
+        res = np.where(intra, base, res)
+
+        zigzag = ((res << 1) ^ (res >> 63)) & 0xFFFFFFFF
+        if i_enc == ENC_UNSIGNED_VB:
+            uj = np.where(intra, res & 0xFFFFFFFF, zigzag)
+        elif i_enc == ENC_NEG_14BIT:
+            uj = np.where(intra, (-res) & 0x3FFF, zigzag)
+        else:
+            uj = zigzag
+        u[j + 1] = uj
+        lengths[j + 1] = _vb_length(u[j + 1])
+        if p_pred == PRED_INCREMENT:
+            lengths[j + 1][~intra] = 0
+
+    offsets = np.concatenate(([0], np.cumsum(lengths.sum(axis=0))))
+    return vb_encode(u.T.ravel(), lengths.T.ravel()), offsets
+
+
+# ---------------------------------------------------------------------------
+# 写文件
+# ---------------------------------------------------------------------------
+
+def _frame_iterations(cfg):
+    """每个记录帧的 loopIteration；gaps 中的迭代被跳过，并在下一个 I 帧边界恢复"""
+    total_iters = int(cfg['duration_s'] * cfg['pid_rate_hz'])
+    iters = np.arange(0, total_iters, cfg['p_denom'], dtype=np.int64)
+    resumes = []
+    for t_s, dur_ms in cfg['gaps']:
+        a = int(t_s * cfg['pid_rate_hz'])
+        b = int((t_s + dur_ms / 1000) * cfg['pid_rate_hz'])
+        b = -(-b // cfg['i_interval']) * cfg['i_interval']
+        iters = iters[(iters < a) | (iters >= b)]
+        if b < total_iters:
+            resumes.append(b)
+    return iters, resumes
+
+
+def _apply_corruption(buf, corrupt, rng, truth, base_offset, frame_offsets, is_last):
+    """对一个数据块注入损坏，返回新的 bytes；truth 中记录位置（文件内绝对偏移）"""
+    data = np.frombuffer(buf, dtype=np.uint8).copy()
+    flip_rate = corrupt.get('flip_rate', 0)
+    if flip_rate:
+        count = rng.binomial(data.size, flip_rate)
+        pos = rng.integers(0, data.size, count)
+        data[pos] ^= rng.integers(1, 256, count).astype(np.uint8)
+        truth['flipped'] += int(count)
+    out = data.tobytes()
+
+    cut = None
+    if is_last and corrupt.get('truncate'):
+        frame = int(len(frame_offsets) * corrupt['truncate'])
+        frame = min(max(frame, 1), len(frame_offsets) - 2)
+        cut = int(frame_offsets[frame]) + 3   # 切在帧中间
+        out = out[:cut]
+        truth['truncated_at'] = base_offset + cut
+
+    bursts = truth.pop('_bursts_here', 0)
+    for _ in range(bursts):
+        pos = int(rng.integers(0, len(out)))
+        junk = rng.integers(0, 256, int(rng.integers(16, 256)), dtype=np.uint8).tobytes()
+        out = out[:pos] + junk + out[pos:]
+        truth['bursts'].append(base_offset + pos)
+    return out, cut is not None
+
+
+def write_log(fh, cfg, rng, start_time_us):
+    """写一个完整 log，返回该 log 的 ground truth"""
+    fields = field_layout(cfg)
+    names = [f[0] for f in fields]
+    header = build_header(cfg)
+    log_start = fh.tell()
+    fh.write(header)
+
+    plan = build_plan(cfg, rng)
+    iters, resumes = _frame_iterations(cfg)
+    pid_us = 1_000_000 / cfg['pid_rate_hz']
+    intra = iters % cfg['i_interval'] == 0
+    intra_idx = np.flatnonzero(intra)
+    chunk_starts = list(intra_idx[::CHUNK_GROUPS]) + [iters.size]
+
+    corrupt = cfg['corrupt']
+    n_chunks = len(chunk_starts) - 1
+    burst_chunks = rng.integers(0, n_chunks, int(corrupt.get('bursts', 0)))
+    ctruth = {'flipped': 0, 'bursts': [], 'truncated_at': None}
+    jitter = cfg['time_jitter_us']
+    jitter_max = 0.4 * pid_us * cfg['p_denom']
+    resume_set = set(resumes)
+    switches = sorted((float(t_s), FLAG_ARM | int(flags)) for t_s, flags in cfg['mode_switches'])
+    switch_t = np.array([t_s for t_s, _ in switches])
+    flags = FLAG_ARM
+
+    truncated = False
+    for c in range(n_chunks):
+        a, b = chunk_starts[c], chunk_starts[c + 1]
+        chunk_iters = iters[a:b]
+        time_us = chunk_iters * pid_us
+        if jitter:
+            time_us = time_us + np.clip(rng.normal(0, jitter, time_us.size), -jitter_max, jitter_max)
+        time_us = np.rint(time_us).astype(np.int64)
+        cols = compute_columns(cfg, plan, time_us / 1e6, rng)
+        cols['loopIteration'] = chunk_iters
+        cols['time'] = time_us + start_time_us
+        values = np.stack([cols[name] for name in names], axis=1)
+        data, offsets = encode_frames(values, intra[a:b], fields, cfg['headers'])
+        buf = data.tobytes()
+
+        # 插入 S / E 帧（位于帧边界）
+        inserts = {}
+        if c == 0:
+            inserts[1] = event_frame(EVENT_SYNC_BEEP, int(start_time_us)) + slow_frame(flags)
+        else:
+            inserts[0] = slow_frame(flags)
+        if switches:
+            t0, t1 = time_us[0] / 1e6, time_us[-1] / 1e6
+            for s_idx in np.flatnonzero((switch_t > t0) & (switch_t <= t1)):
+                k = max(1, int(np.searchsorted(time_us, switch_t[s_idx] * 1e6)))
+                new_flags = switches[s_idx][1]
+                inserts[k] = inserts.get(k, b'') + event_frame(EVENT_FLIGHT_MODE, new_flags, flags) + slow_frame(new_flags)
+                flags = new_flags
+        for k in np.flatnonzero(np.isin(chunk_iters, list(resume_set))):
+            inserts[int(k)] = inserts.get(int(k), b'') + event_frame(
+                EVENT_LOGGING_RESUME, int(chunk_iters[k]), int(cols['time'][k]))
+        if inserts:
+            pieces, pos = [], 0
+            shifted = []
+            for k in sorted(inserts):
+                off = int(offsets[k])
+                pieces += [buf[pos:off], inserts[k]]
+                pos = off
+                shifted.append((k, len(inserts[k])))
+            pieces.append(buf[pos:])
+            buf = b''.join(pieces)
+            for k, size in shifted:
+                offsets[k:] += size
+
+        if corrupt:
+            ctruth['_bursts_here'] = int((burst_chunks == c).sum())
+            buf, truncated = _apply_corruption(buf, corrupt, rng, ctruth, fh.tell(), offsets, c == n_chunks - 1)
+        fh.write(buf)
+
+    if not truncated:
+        fh.write(event_frame(EVENT_DISARM, 4) + event_frame(EVENT_LOG_END))
+
+    duration = float(cfg['duration_s'])
+    end_time_us = start_time_us + int(duration * 1e6)
+    return {
+        'offset': log_start,
+        'bytes': fh.tell() - log_start,
+        'frames': int(iters.size),
+        'intra_frames': int(intra.sum()),
+        'start_time_us': int(start_time_us),
+        'end_time_us': end_time_us,
+        'rate_hz': cfg['rate_hz'],
+        'pid_rate_hz': cfg['pid_rate_hz'],
+        'gyro_rate_hz': cfg['gyro_rate_hz'],
+        'duration_s': duration,
+        'fields': names,
+        'flights_s': [[round(x, 3), round(y, 3)] for x, y in plan['windows']],
+        'throttle_model': cfg['throttle'],
+        'chops_s': [round(float(x), 4) for x in plan['chops']],
+        'noise_peaks_hz': [p[0] for p in cfg['noise_peaks']],
+        'motor_noise_hz': [round(float(motor_noise_hz(cfg, 0.0)), 1), round(float(motor_noise_hz(cfg, 1.0)), 1)],
+        'prop_wash': cfg['prop_wash'],
+        'motor_faults': cfg['motor_faults'],
+        'gaps': [[t, d] for t, d in cfg['gaps']],
+        'mode_switches': [[t, f] for t, f in switches],
+        'resume_iterations': [int(x) for x in resumes],
+        'corruption': ctruth if corrupt else None,
+    }
+
+
+def generate(fh, **options):
+    """把 logs 个 log 依次写入文件对象 fh，返回 ground truth"""
+    cfg = make_config(**options)
+    rng = np.random.default_rng(cfg['seed'])
+    truth = {'seed': cfg['seed'], 'logs': []}
+    start_time_us = 10_000_000
+    for _ in range(int(cfg['logs'])):
+        log_truth = write_log(fh, cfg, rng, start_time_us)
+        truth['logs'].append(log_truth)
+        start_time_us = log_truth['end_time_us'] + 20_000_000
+    truth['bytes'] = fh.tell()
+    return truth
+
+
+def generate_bytes(**options):
+    """返回 (bbl_bytes, truth)"""
+    buf = io.BytesIO()
+    truth = generate(buf, **options)
+    return buf.getvalue(), truth
+
+
+def generate_file(path, **options):
+    with open(path, 'wb') as fh:
+        truth = generate(fh, **options)
+    truth['file'] = os.path.basename(path)
+    return truth
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def _parse_corrupt(value):
+    out = {}
+    for part in filter(None, (value or '').split(',')):
+        key, _, val = part.partition('=')
+        if key not in ('flip_rate', 'bursts', 'truncate'):
+            raise argparse.ArgumentTypeError(f"Unknown corruption: {key}")
+        out[key] = int(val) if key == 'bursts' else float(val or 1.0)
+    return out
+
+
+def _parse_fault(value):
+    kind, motor, t_s, dur_ms = value.split(':')
+    return {'kind': kind, 'motor': int(motor), 't_s': float(t_s), 'dur_ms': float(dur_ms)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('output')
+    ap.add_argument('--rate', type=int, default=DEFAULTS['rate_hz'], help='记录频率 Hz')
+    ap.add_argument('--gyro-rate', type=int, default=DEFAULTS['gyro_rate_hz'])
+    ap.add_argument('--pid-rate', type=int)
+    ap.add_argument('--duration', type=float, default=DEFAULTS['duration_s'], help='每个 log 的秒数')
+    ap.add_argument('--logs', type=int, default=1)
+    ap.add_argument('--flights', type=int, default=1)
+    ap.add_argument('--fields', default='full', help=f"{'/'.join(FIELD_PRESETS)} 或逗号分隔的字段组")
+    ap.add_argument('--throttle', default=DEFAULTS['throttle'], choices=sorted(THROTTLE_MODELS))
+    ap.add_argument('--noise-peak', action='append', metavar='HZ:DPS', help='固定频率噪声峰，可重复')
+    ap.add_argument('--fault', action='append', type=_parse_fault, metavar='KIND:MOTOR:T_S:DUR_MS')
+    ap.add_argument('--gap', action='append', metavar='T_S:DUR_MS', help='记录中断，可重复')
+    ap.add_argument('--jitter-us', type=float, default=0.0)
+    ap.add_argument('--corrupt', type=_parse_corrupt, default={}, help='flip_rate=1e-5,bursts=3,truncate=0.97')
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--count', type=int, default=1, help='生成多个文件（种子递增）')
+    ap.add_argument('--truth', help='ground truth JSON 路径（默认 <output>.truth.json）')
+    args = ap.parse_args()
+
+    fields = args.fields if args.fields in FIELD_PRESETS else args.fields.split(',')
+    options = dict(rate_hz=args.rate, gyro_rate_hz=args.gyro_rate, pid_rate_hz=args.pid_rate,
+                   duration_s=args.duration, logs=args.logs, flights=args.flights, fields=fields,
+                   throttle=args.throttle, motor_faults=args.fault or [], time_jitter_us=args.jitter_us,
+                   corrupt=args.corrupt)
+    if args.noise_peak:
+        options['noise_peaks'] = [[float(x) for x in p.split(':')] for p in args.noise_peak]
+    if args.gap:
+        options['gaps'] = [[float(x) for x in g.split(':')] for g in args.gap]
+
+    root, ext = os.path.splitext(args.output)
+    total_bytes, t = 0, time.perf_counter()
+    for i in range(args.count):
+        path = args.output if args.count == 1 else f"{root}_{i:03d}{ext or '.bbl'}"
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        truth = generate_file(path, seed=args.seed + i, **options)
+        truth_path = args.truth if args.truth and args.count == 1 else os.path.splitext(path)[0] + '.truth.json'
+        with open(truth_path, 'w') as f:
+            json.dump(truth, f, indent=1)
+        total_bytes += truth['bytes']
+        frames = sum(log['frames'] for log in truth['logs'])
+        print(f"{path}: {len(truth['logs'])} log(s), {frames} frames, {truth['bytes'] / 1e6:.1f} MB")
+    elapsed = time.perf_counter() - t
+    print(f"Generated {total_bytes / 1e6:.1f} MB in {elapsed:.1f}s ({total_bytes / 1e6 / elapsed:.1f} MB/s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
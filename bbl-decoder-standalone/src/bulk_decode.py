@@ -0,0 +1,297 @@
+"""
+离线批量解码：python3 entry.py bulk <目录 / 文件 / glob ...> --out DIR [--format json|npz|arrow|parquet]
+- 进程池并行（默认使用所有核），文件中的每个 log 单独输出，按 craft=<机名>/date=<日期> 分区
+- json 为 /decode 的输出；npz / arrow / parquet 为全速率的全部字段（columnar.py）
+- 按内容 sha256 断点续跑：输出目录的 manifest.jsonl 记录已处理的文件，再次运行时跳过
+- 每个 log 的 meta / headers / stats 写入元数据索引（默认输出目录的 index.sqlite，log_index.py），按批次事务写入
+- stderr 显示进度，结束时打印吞吐量汇总
+"""
+
+import argparse
+import contextlib
+import glob
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+try:
+    from . import columnar, entry, log_index
+except ImportError:  # 直接运行 python3 entry.py bulk / python3 bulk_decode.py
+    import columnar
+    import entry
+    import log_index
+
+OUTPUT_FORMATS = ('json',) + columnar.FORMATS
+MANIFEST = 'manifest.jsonl'
+INDEX = 'index.sqlite'
+# 每个工作进程最多排队的文件数
+IN_FLIGHT_PER_WORKER = 2
+# 非终端输出时进度行的打印间隔（秒）
+PROGRESS_INTERVAL_S = 10
+# 索引和 manifest 一起按批写入：攒够该文件数或间隔该秒数（中断时未写入的文件下次重新处理）
+INDEX_BATCH_FILES = 64
+INDEX_FLUSH_S = 5
+
+
+def iter_inputs(inputs, extensions=entry.BATCH_EXTENSIONS):
+    """展开目录（递归）、glob 和文件路径，按路径排序去重"""
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                paths.update(os.path.join(root, f) for f in files if f.lower().endswith(extensions))
+        elif os.path.isfile(item):
+            paths.add(item)
+        else:
+            paths.update(p for p in glob.glob(item, recursive=True)
+                         if os.path.isfile(p) and p.lower().endswith(extensions))
+    return sorted(paths)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(out_dir):
+    """{sha256: 记录}；同一文件多次出现时以最后一条为准"""
+    done = {}
+    path = os.path.join(out_dir, MANIFEST)
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # 中断时写了一半的行
+                done[record['sha256']] = record
+    return done
+
+
+def _safe_name(value):
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', str(value)).strip('_') or 'unknown'
+
+
+def partition(headers, path):
+    """craft=<机名>/date=<日期>：日期取 Log start datetime，没有 RTC 时间（0000-01-01）时用文件修改日期"""
+    craft = _safe_name(headers.get('Craft name') or 'unknown')
+    started = str(headers.get('Log start datetime') or '')
+    if re.match(r'\d{4}-\d{2}-\d{2}', started) and not started.startswith('0000'):
+        date = started[:10]
+    else:
+        date = time.strftime('%Y-%m-%d', time.localtime(os.path.getmtime(path)))
+    return os.path.join(f'craft={craft}', f'date={date}')
+
+
+def process_file(path, digest, out_dir, fmt, features, index=False):
+    """工作进程：解码文件中的每个 log 并写出，返回 manifest 记录（index 时 record['index'] 为索引记录列表）"""
+    record = {'sha256': digest, 'source': path, 'bytes': os.path.getsize(path), 'outputs': [], 'logs': 0,
+              'frames': 0, 'errors': []}
+    if index:
+        record['index'] = []
+    with open(path, 'rb') as f:
+        data = f.read()
+    spans = entry.find_all_logs(data)
+    requested = entry.PIPELINE.resolve(features)
+    summary_features = entry.PIPELINE.resolve(['cli', 'stats'])
+    with contextlib.redirect_stdout(io.StringIO()):
+        for k, (start, end) in enumerate(spans, 1):
+            try:
+                log_bytes = data[start:end]
+                graph, _, _ = entry.load_log_graph(log_bytes)
+                headers = graph.get('headers')
+                frames = len(graph.get('time_full'))
+                if fmt == 'json':
+                    payload = entry.graph_to_json(graph, requested, 0, 1)
+                    payload['meta'].update({'logs_found': len(spans), 'log_used': k})
+                else:
+                    field_names = graph.get('field_names')
+                    columns = columnar.typed_columns(graph.get('raw'), field_names)
+                    metadata = {'source': path, 'sha256': digest, 'log': k, 'headers': headers,
+                                'events': graph.get('log_events'), 'corruption': graph.get('corruption')}
+                if index:
+                    summary = payload if fmt == 'json' and set(summary_features) <= set(requested) \
+                        else entry.graph_to_json(graph, summary_features, 0, 1)
+                    rec = entry.index_record(summary, digest, k, log_bytes, path)
+                    if rec is not None:
+                        record['index'].append(rec)
+                del graph
+
+                name = f'{digest[:16]}_{k}{columnar.EXTENSIONS.get(fmt, ".json")}'
+                rel = os.path.join(partition(headers, path), name)
+                target = os.path.join(out_dir, rel)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                if fmt == 'json':
+                    with open(target, 'w', encoding='utf-8') as f:
+                        json.dump(payload, f, ensure_ascii=False, separators=(',', ':'))
+                else:
+                    columnar.write(target, fmt, columns, metadata)
+                record['outputs'].append(rel)
+                record['logs'] += 1
+                record['frames'] += frames
+            except Exception as e:
+                record['errors'].append({'log': k, 'error': str(e)})
+    return record
+
+
+class Progress:
+    """单行进度（终端中原地刷新，否则每 PROGRESS_INTERVAL_S 打印一行）和最终汇总"""
+
+    def __init__(self, total_files, total_bytes, stream=sys.stderr):
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.stream = stream
+        self.files = self.logs = self.frames = self.bytes = self.failed = 0
+        self.started = time.perf_counter()
+        self._printed = 0.0
+        self._tty = stream.isatty()
+
+    def add(self, record):
+        self.files += 1
+        self.logs += record['logs']
+        self.frames += record['frames']
+        self.bytes += record['bytes']
+        self.failed += bool(record['errors'])
+        self.show()
+
+    def show(self, final=False):
+        now = time.perf_counter()
+        if not final and not self._tty and now - self._printed < PROGRESS_INTERVAL_S:
+            return
+        self._printed = now
+        elapsed = max(now - self.started, 1e-9)
+        rate = self.bytes / elapsed
+        eta = (self.total_bytes - self.bytes) / rate if rate > 0 else 0
+        line = (f"[bulk] {self.files}/{self.total_files} files  {self.logs} logs  "
+                f"{self.bytes / 1e6:.1f}/{self.total_bytes / 1e6:.1f} MB  {rate / 1e6:.2f} MB/s  ETA {eta:.0f}s")
+        if self._tty:
+            self.stream.write('\r' + line.ljust(100) + ('\n' if final else ''))
+        else:
+            self.stream.write(line + '\n')
+        self.stream.flush()
+
+    def summary(self, skipped):
+        elapsed = time.perf_counter() - self.started
+        return {
+            'files': self.files,
+            'skipped': skipped,
+            'failed': self.failed,
+            'logs': self.logs,
+            'frames': self.frames,
+            'input_mb': round(self.bytes / 1e6, 1),
+            'elapsed_s': round(elapsed, 1),
+            'mb_per_s': round(self.bytes / 1e6 / elapsed, 2) if elapsed else 0,
+            'frames_per_s': round(self.frames / elapsed) if elapsed else 0,
+            'logs_per_s': round(self.logs / elapsed, 2) if elapsed else 0,
+        }
+
+
+def run(paths, out_dir, fmt='json', features=None, workers=None, retry_failed=False, index_path=None):
+    """批量解码 paths，返回汇总 dict；index_path 为元数据索引文件，None 时不写索引"""
+    os.makedirs(out_dir, exist_ok=True)
+    done = load_manifest(out_dir)
+    index = log_index.LogIndex(index_path) if index_path else None
+    workers = workers or os.cpu_count() or 1
+
+    todo, seen, skipped = [], set(), 0
+    for path in paths:
+        digest = file_sha256(path)
+        previous = done.get(digest)
+        if digest in seen or (previous and not (retry_failed and previous['errors'])):
+            skipped += 1
+            continue
+        seen.add(digest)
+        todo.append((path, digest))
+
+    progress = Progress(len(todo), sum(os.path.getsize(p) for p, _ in todo))
+    print(f"[bulk] {len(todo)} file(s) to decode, {skipped} skipped (already done / duplicate), "
+          f"{workers} worker(s) -> {out_dir} ({fmt})",
+          file=sys.stderr)
+    indexed = 0
+    batch_lines, batch_index, flushed = [], [], time.monotonic()
+
+    def flush():
+        """一个事务写入这批索引记录，之后才把这批文件记入 manifest"""
+        nonlocal indexed, flushed
+        if index is not None:
+            indexed += index.add(batch_index)
+        manifest.writelines(batch_lines)
+        manifest.flush()
+        batch_lines.clear()
+        batch_index.clear()
+        flushed = time.monotonic()
+
+    with open(os.path.join(out_dir, MANIFEST), 'a', encoding='utf-8') as manifest, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        queue = iter(todo)
+        pending = {}
+        while True:
+            while len(pending) < workers * IN_FLIGHT_PER_WORKER:
+                item = next(queue, None)
+                if item is None:
+                    break
+                path, digest = item
+                pending[pool.submit(process_file, path, digest, out_dir, fmt, features, index is not None)] = item
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                path, digest = pending.pop(future)
+                try:
+                    record = future.result()
+                except Exception as e:  # 工作进程崩溃
+                    record = {'sha256': digest, 'source': path, 'bytes': os.path.getsize(path), 'outputs': [],
+                              'logs': 0, 'frames': 0, 'errors': [{'log': None, 'error': str(e)}]}
+                batch_index.extend(record.pop('index', []))
+                batch_lines.append(json.dumps(record, ensure_ascii=False) + '\n')
+                progress.add(record)
+            if (index is None or len(batch_lines) >= INDEX_BATCH_FILES
+                    or time.monotonic() - flushed >= INDEX_FLUSH_S):
+                flush()
+        flush()
+    progress.show(final=True)
+    summary = progress.summary(skipped)
+    if index is not None:
+        summary.update({'indexed': indexed, 'index': index_path})
+    return summary
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog='entry.py bulk', description='批量解码 BBL 目录为 JSON 或列式数据集')
+    ap.add_argument('inputs', nargs='+', help='目录（递归）、文件或 glob（如 "archive/**/*.BBL"）')
+    ap.add_argument('--out', required=True, help='输出目录（含 manifest.jsonl）')
+    ap.add_argument('--format', default='json', choices=OUTPUT_FORMATS)
+    ap.add_argument('--features', help='json 格式的特征（同 /decode 的 features），默认全部')
+    ap.add_argument('--workers', type=int, help='工作进程数，默认 CPU 核数')
+    ap.add_argument('--retry-failed', action='store_true', help='重新处理 manifest 中有错误的文件')
+    ap.add_argument('--index', help=f'元数据索引文件，默认输出目录的 {INDEX}（多次运行可共用同一个索引）')
+    ap.add_argument('--no-index', action='store_true', help='不写元数据索引')
+    args = ap.parse_args(argv)
+
+    features = [f.strip() for f in args.features.split(',')] if args.features else None
+    try:
+        entry.PIPELINE.resolve(features)
+        if args.format in ('arrow', 'parquet'):
+            columnar.require_pyarrow()
+    except ValueError as e:
+        ap.error(str(e))
+
+    paths = iter_inputs(args.inputs)
+    if not paths:
+        ap.error('no BBL files found')
+    index_path = None if args.no_index else (args.index or os.path.join(args.out, INDEX))
+    summary = run(paths, args.out, args.format, features, args.workers, args.retry_failed, index_path)
+    print(json.dumps(summary, indent=2))
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
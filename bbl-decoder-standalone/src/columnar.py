@@ -0,0 +1,175 @@
+"""
+全速率列式输出：把解码后的 object 矩阵转成带类型的列，写成 NPZ / Arrow IPC / Parquet，或编码为 /decode 的二进制响应
+- 整数字段为 int64，含空值（S 帧字段在第一个 S 帧之前为空串）的列为 float64，空值记 NaN
+- Arrow / Parquet 依赖 pyarrow，msgpack 依赖 msgpack（可选依赖，未安装时抛 ColumnarError）；NPZ 只需要 numpy
+"""
+
+import io
+import json
+
+import numpy as np
+
+FORMATS = ('npz', 'arrow', 'parquet')
+EXTENSIONS = {'npz': '.npz', 'arrow': '.arrow', 'parquet': '.parquet'}
+# /decode 的 Accept 协商：媒体类型 -> 响应格式（按格式回写 Content-Type）
+MEDIA_TYPES = {
+    'application/vnd.apache.arrow.stream': 'arrow',
+    'application/msgpack': 'msgpack',
+    'application/x-msgpack': 'msgpack',
+    'application/x-npz': 'npz',
+}
+CONTENT_TYPES = {'arrow': 'application/vnd.apache.arrow.stream', 'msgpack': 'application/msgpack',
+                 'npz': 'application/x-npz'}
+# 这些媒体类型表示客户端接受 JSON（默认输出）
+JSON_MEDIA_TYPES = ('application/json', 'application/*', '*/*')
+
+
+class ColumnarError(ValueError):
+    pass
+
+
+def typed_column(raw, j):
+    """object 矩阵的第 j 列转 int64；含空串等非整数值时转 float64（空值为 NaN）"""
+    col = raw[:, j]
+    try:
+        return col.astype(np.int64)
+    except (ValueError, TypeError):
+        pass
+    blank = col == ''
+    try:
+        return np.where(blank, np.nan, col).astype(np.float64)
+    except (ValueError, TypeError):
+        out = np.full(len(col), np.nan)
+        for i, v in enumerate(col):
+            try:
+                out[i] = float(v)
+            except (ValueError, TypeError):
+                pass
+        return out
+
+
+def typed_columns(raw, field_names):
+    """{字段名: 带类型的列}，保持字段顺序"""
+    if raw.size == 0:
+        return {name: np.zeros(0, dtype=np.int64) for name in field_names}
+    return {name: typed_column(raw, j) for j, name in enumerate(field_names)}
+
+
+def require_pyarrow():
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError:
+        raise ColumnarError("Arrow / Parquet output requires pyarrow (pip install pyarrow)")
+
+
+def require_msgpack():
+    try:
+        import msgpack
+        return msgpack
+    except ImportError:
+        raise ColumnarError("msgpack output requires msgpack (pip install msgpack)")
+
+
+def available(fmt):
+    """响应格式的可选依赖是否已安装"""
+    try:
+        if fmt == 'arrow':
+            require_pyarrow()
+        elif fmt == 'msgpack':
+            require_msgpack()
+    except ColumnarError:
+        return False
+    return True
+
+
+def negotiate(accept):
+    """按 Accept 头（q 值从高到低）选择响应格式：返回 MEDIA_TYPES 中的格式，JSON 时返回 None
+    只列出了二进制格式、且对应依赖都未安装时抛 ColumnarError（406）
+    """
+    if not accept:
+        return None
+    ranked = []
+    for k, part in enumerate(accept.split(',')):
+        media_type, *params = [p.strip() for p in part.split(';')]
+        q = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            ranked.append((-q, k, media_type.lower()))
+    missing = []
+    for _, _, media_type in sorted(ranked):
+        if media_type in JSON_MEDIA_TYPES:
+            return None
+        fmt = MEDIA_TYPES.get(media_type)
+        if fmt is not None:
+            if available(fmt):
+                return fmt
+            missing.append(fmt)
+    if missing:
+        raise ColumnarError(f"Requested format(s) not available on this server: {', '.join(missing)} "
+                            f"(install {' / '.join('pyarrow' if f == 'arrow' else f for f in missing)}, "
+                            f"or accept application/json)")
+    return None
+
+
+def arrow_table(columns, metadata=None):
+    """列 dict 转 pyarrow.Table（numpy 数组零拷贝），metadata 为 JSON 可序列化的 dict，写入 schema 元数据"""
+    pa = require_pyarrow()
+    table = pa.table({name: pa.array(col) for name, col in columns.items()})
+    if metadata:
+        table = table.replace_schema_metadata({'bbl': json.dumps(metadata, ensure_ascii=False, default=str)})
+    return table
+
+
+def encode(fmt, columns, metadata=None):
+    """编码为响应字节：npz（元数据为 __meta__）、Arrow IPC stream（schema 元数据 bbl）、
+    msgpack（{meta, columns: {名称: {dtype, shape, data}}}，data 为小端原始字节）；列数据直接取自 numpy 缓冲区
+    """
+    if fmt == 'npz':
+        buf = io.BytesIO()
+        arrays = dict(columns)
+        if metadata:
+            arrays['__meta__'] = np.array(json.dumps(metadata, ensure_ascii=False, default=str))
+        np.savez(buf, **arrays)
+        return buf.getvalue()
+    if fmt == 'arrow':
+        pa = require_pyarrow()
+        table = arrow_table(columns, metadata)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    if fmt == 'msgpack':
+        msgpack = require_msgpack()
+        packed = {}
+        for name, col in columns.items():
+            col = np.ascontiguousarray(col, dtype=col.dtype.newbyteorder('<'))
+            packed[name] = {'dtype': col.dtype.str, 'shape': list(col.shape), 'data': memoryview(col).cast('B')}
+        return msgpack.packb({'meta': metadata or {}, 'columns': packed}, default=str)
+    raise ColumnarError(f"Unknown response format: {fmt} (available: {', '.join(CONTENT_TYPES)})")
+
+
+def write(path, fmt, columns, metadata=None):
+    """按格式写文件：npz 中元数据存为 __meta__（JSON 字符串）"""
+    if fmt == 'npz':
+        arrays = dict(columns)
+        if metadata:
+            arrays['__meta__'] = np.array(json.dumps(metadata, ensure_ascii=False, default=str))
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+    elif fmt == 'arrow':
+        pa = require_pyarrow()
+        table = arrow_table(columns, metadata)
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    elif fmt == 'parquet':
+        require_pyarrow()
+        import pyarrow.parquet as pq
+        pq.write_table(arrow_table(columns, metadata), path)
+    else:
+        raise ColumnarError(f"Unknown columnar format: {fmt} (available: {', '.join(FORMATS)})")
@@ -0,0 +1,248 @@
+"""
+事件检测器：在全速率列上做向量化扫描，找出被全局平均值掩盖的瞬态问题
+所有检测都是 numpy 整列运算（cumsum 滑动窗口 + 游程分割，桨洗窗口的带通为批量 rFFT），不做逐帧 Python 循环
+"""
+
+import numpy as np
+
+# 每类事件最多输出条数（按 严重度 x 时长 排序保留），控制 payload 体积
+MAX_EVENTS_PER_KIND = 20
+
+# 电机事件阈值（油门均已归一化到 0..1）
+MOTOR_SMOOTH_S = 0.005      # 5ms 滑动平均，滤掉单帧抖动
+MOTOR_MIN_EVENT_S = 0.003   # 持续 >= 3ms 才算事件
+CMD_ACTIVE = 0.15           # 高于此输出时 eRPM 不应为 0
+CMD_HIGH = 0.30             # 失步判定要求的最低输出
+DESYNC_RATIO = 0.5          # eRPM 低于同时刻其余电机中位数的 50%
+MISMATCH_CMD_TOL = 0.05     # 输出与中位数相差 < 5% 视为“相近指令”
+MISMATCH_RATIO_TOL = 0.30   # 相近指令下 eRPM 偏离中位数 > 30%
+
+# 桨洗（prop wash）阈值：油门（0..1）快速下降后的陀螺振荡
+THROTTLE_SMOOTH_S = 0.010   # 油门 10ms 平滑
+CHOP_LAG_S = 0.100          # 100ms 内下降
+CHOP_DROP = 0.15            # 下降幅度 >= 15% 油门
+PROPWASH_WINDOW_S = 0.250   # 收油后分析 250ms
+PROPWASH_RMS_S = 0.020      # 滚动 RMS 窗口 20ms
+PROPWASH_BAND_HZ = (20, 120)  # 桨洗典型频段
+
+
+def rolling_mean(x, window):
+    """沿最后一维的居中滑动平均（cumsum 实现，O(n)），输出长度与输入相同"""
+    x = np.asarray(x, dtype=np.float64)
+    window = int(window)
+    n = x.shape[-1]
+    if window <= 1 or n < window:
+        return x
+    c = np.cumsum(x, axis=-1)
+    c = np.concatenate([np.zeros(x.shape[:-1] + (1,)), c], axis=-1)
+    out = (c[..., window:] - c[..., :-window]) / window
+    left = (window - 1) // 2
+    pad = [(0, 0)] * (x.ndim - 1) + [(left, window - 1 - left)]
+    return np.pad(out, pad, mode='edge')
+
+
+def find_runs(mask, min_len=1):
+    """返回布尔序列中连续 True 段的 (starts, ends)，ends 为开区间"""
+    m = np.concatenate(([0], np.asarray(mask, dtype=np.int8), [0]))
+    d = np.diff(m)
+    starts = np.flatnonzero(d == 1)
+    ends = np.flatnonzero(d == -1)
+    keep = (ends - starts) >= min_len
+    return starts[keep], ends[keep]
+
+
+def run_means(values, starts, ends):
+    """对每个 [start, end) 段求均值（前缀和，一次完成所有段）"""
+    if len(starts) == 0:
+        return np.zeros(0)
+    c = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+    return (c[ends] - c[starts]) / (ends - starts)
+
+
+def estimate_sample_rate(time_us, default=1000.0):
+    """用实际时间列的中位间隔估计采样率（比 header 推算更可靠）"""
+    time_us = np.asarray(time_us)
+    if time_us.size < 2:
+        return default
+    dt = np.median(np.diff(time_us))
+    return 1_000_000 / dt if dt > 0 else default
+
+
+def motor_output_range(headers):
+    """电机输出范围：优先 motorOutput（DShot 为 [idle, 2047]），否则 min/maxthrottle"""
+    motor_output = headers.get('motorOutput')
+    if isinstance(motor_output, list) and len(motor_output) >= 2 and motor_output[1] > motor_output[0]:
+        return float(motor_output[0]), float(motor_output[1])
+    lo = headers.get('minthrottle', 1000)
+    hi = headers.get('maxthrottle', 2000)
+    try:
+        lo, hi = float(lo), float(hi)
+    except (ValueError, TypeError):
+        lo, hi = 1000.0, 2000.0
+    return (lo, hi) if hi > lo else (1000.0, 2000.0)
+
+
+def _collect_events(kind, masks, severity, time_us, min_len, sample_rate):
+    """把 (motors, n) 的布尔掩码转换成事件列表，按 严重度 x 时长 保留前 N 条"""
+    found = []
+    for motor in range(masks.shape[0]):
+        starts, ends = find_runs(masks[motor], min_len)
+        if len(starts) == 0:
+            continue
+        sev = np.clip(run_means(severity[motor], starts, ends), 0.0, 1.0)
+        found.append((np.full(len(starts), motor), starts, ends, sev))
+
+    if not found:
+        return [], 0
+
+    motors, starts, ends, sev = (np.concatenate(parts) for parts in zip(*found))
+    total = len(starts)
+    order = np.argsort(-(sev * (ends - starts)), kind='stable')[:MAX_EVENTS_PER_KIND]
+    order = order[np.argsort(starts[order], kind='stable')]
+
+    events = []
+    for k in order:
+        events.append({
+            't_ms': int(time_us[starts[k]] / 1000),
+            'motor': int(motors[k]),
+            'kind': kind,
+            'dur_ms': round(float(ends[k] - starts[k]) * 1000 / sample_rate, 1),
+            'severity': round(float(sev[k]), 2),
+        })
+    return events, total
+
+
+def detect_motor_events(time_us, motor, erpm, headers):
+    """
+    检测电机失步 / 双向 DShot eRPM 遥测掉线
+    - erpm_dropout: 有明显油门输出但 eRPM 持续为 0（遥测丢失或电机停转）
+    - desync: 输出不低于其他电机，但 eRPM 跌到同时刻中位数的一半以下
+    - erpm_mismatch: 与其他电机指令相近，但 eRPM 明显偏离
+    severity 为相对同时刻 eRPM 中位数的平均偏差（0..1）
+    返回 (events, counts)
+    """
+    time_us = np.asarray(time_us)
+    motor = np.asarray(motor, dtype=np.float64)
+    erpm = np.asarray(erpm, dtype=np.float64)
+    kinds = ('erpm_dropout', 'desync', 'erpm_mismatch')
+    if (motor.ndim != 2 or erpm.ndim != 2 or erpm.shape[0] < 2
+            or erpm.shape[1] != time_us.size or motor.shape[1] != time_us.size):
+        return [], {k: 0 for k in kinds}
+
+    n_motors = min(motor.shape[0], erpm.shape[0])
+    motor, erpm = motor[:n_motors], erpm[:n_motors]
+    sample_rate = estimate_sample_rate(time_us)
+    window = max(1, int(sample_rate * MOTOR_SMOOTH_S))
+    min_len = max(1, int(sample_rate * MOTOR_MIN_EVENT_S))
+
+    lo, hi = motor_output_range(headers)
+    cmd = rolling_mean(np.clip((motor - lo) / (hi - lo), 0.0, 1.0), window)
+    rpm = rolling_mean(erpm, window)
+
+    med_cmd = np.median(cmd, axis=0)
+    med_rpm = np.median(rpm, axis=0)
+    ratio = rpm / np.maximum(med_rpm, 1.0)
+    deviation = np.abs(1.0 - ratio)
+
+    dropout = (rpm < 1.0) & (cmd > CMD_ACTIVE)
+    desync = (ratio < DESYNC_RATIO) & (cmd > CMD_HIGH) & (cmd >= med_cmd - MISMATCH_CMD_TOL) & ~dropout
+    mismatch = ((np.abs(cmd - med_cmd) < MISMATCH_CMD_TOL) & (deviation > MISMATCH_RATIO_TOL)
+                & (cmd > CMD_ACTIVE) & ~dropout & ~desync)
+
+    events, counts = [], {}
+    for kind, mask in zip(kinds, (dropout, desync, mismatch)):
+        found, total = _collect_events(kind, mask, deviation, time_us, min_len, sample_rate)
+        events.extend(found)
+        counts[kind] = total
+    events.sort(key=lambda e: e['t_ms'])
+    return events, counts
+
+
+def band_windows(x, starts, window, sample_rate, band):
+    """
+    x[..., start:start + window] 的带通（rFFT 频域掩码，频段外的分量置零），所有窗口一次完成
+    x: (axes, n)；超出 n 的部分补零。返回 (带通信号 (axes, k, window), 有效点掩码 (k, window), 频段内功率谱 (axes, k, bins), 频率)
+    每个窗口先减去有效点均值，补零不引入阶跃
+    """
+    n = x.shape[-1]
+    idx = starts[:, None] + np.arange(window)
+    valid = idx < n
+    seg = x[:, np.minimum(idx, n - 1)]
+    count = valid.sum(axis=1)[:, None]
+    seg = np.where(valid, seg - (seg * valid).sum(axis=-1, keepdims=True) / count, 0.0)
+    spectrum = np.fft.rfft(seg, axis=-1)
+    freqs = np.fft.rfftfreq(window, 1 / sample_rate)
+    in_band = (freqs >= band[0]) & (freqs <= band[1])
+    spectrum[..., ~in_band] = 0
+    return np.fft.irfft(spectrum, n=window, axis=-1) * valid, valid, np.abs(spectrum) ** 2, freqs
+
+
+def normalize_throttle(rc_throttle=None, motor=None, headers=None):
+    """油门归一化到 0..1：优先 rcCommand[3]（1000..2000），否则用电机输出均值"""
+    if rc_throttle is not None and len(rc_throttle) > 0:
+        return np.clip((np.asarray(rc_throttle, dtype=np.float64) - 1000.0) / 1000.0, 0.0, 1.0)
+    lo, hi = motor_output_range(headers or {})
+    return np.clip((np.asarray(motor, dtype=np.float64).mean(axis=0) - lo) / (hi - lo), 0.0, 1.0)
+
+
+def detect_prop_wash(time_us, throttle, gyro, band=PROPWASH_BAND_HZ):
+    """
+    检测收油门（throttle chop）后的桨洗振荡
+    throttle: 归一化油门 (n,)；gyro: (axes, n)
+    对每次收油，在之后 PROPWASH_WINDOW_S 内做带通（band_windows）+ 滚动 RMS 衡量振荡能量，
+    主频取频段内功率最大的频点（总在 band 内）。
+    返回 (events, total)，每个事件含
+    t_ms / axis / rms / peak_rms / freq_hz / drop
+    """
+    time_us = np.asarray(time_us)
+    throttle = np.asarray(throttle, dtype=np.float64)
+    gyro = np.asarray(gyro, dtype=np.float64)
+    n = time_us.size
+    sample_rate = estimate_sample_rate(time_us)
+    lag = max(1, int(sample_rate * CHOP_LAG_S))
+    window = max(2, int(sample_rate * PROPWASH_WINDOW_S))
+    if gyro.ndim != 2 or gyro.shape[1] != n or throttle.size != n or n < lag + window:
+        return [], 0
+
+    thr = rolling_mean(throttle, max(1, int(sample_rate * THROTTLE_SMOOTH_S)))
+    drop = thr[:-lag] - thr[lag:]
+    starts, ends = find_runs(drop >= CHOP_DROP)
+    if len(starts) == 0:
+        return [], 0
+
+    # 首次满足下降幅度的位置作为收油时刻；同一分析窗口内的多次下降只保留第一次
+    chops = np.minimum(starts + lag, n - 1)
+    depth = np.maximum.reduceat(drop, starts)
+    keep = (np.diff(chops, prepend=-window) >= window) & (chops < n - 1)
+    chops, depth = chops[keep], depth[keep]
+    total = len(chops)
+    if total == 0:
+        return [], 0
+
+    bp, valid, power, freqs = band_windows(gyro, chops, window, sample_rate, band)
+    span = valid.sum(axis=1)
+    rms = np.sqrt((bp * bp).sum(axis=-1) / span)
+    rolling_rms = np.sqrt(rolling_mean(bp * bp, max(1, int(sample_rate * PROPWASH_RMS_S))))
+    peak = np.where(valid, rolling_rms, 0.0).max(axis=-1)
+    freq = freqs[np.argmax(power, axis=-1)]
+
+    axis = np.argmax(rms, axis=0)
+    idx = np.arange(total)
+    magnitude = rms[axis, idx]
+    order = np.argsort(-magnitude, kind='stable')[:MAX_EVENTS_PER_KIND]
+    order = np.sort(order)
+
+    names = 'rpy'
+    events = []
+    for k in order:
+        a = axis[k]
+        events.append({
+            't_ms': int(time_us[chops[k]] / 1000),
+            'axis': names[a] if a < len(names) else str(a),
+            'rms': round(float(rms[a, k]), 1),
+            'peak_rms': round(float(peak[a, k]), 1),
+            'freq_hz': round(float(freq[a, k]), 0),
+            'drop': round(float(depth[k]), 2),
+            'rms_rpy': [round(float(v), 1) for v in rms[:, k]],
+        })
+    return events, total
@@ -5,11 +5,45 @@ BBL (Betaflight Blackbox Log) Decoder Service
 采样率优先使用 500Hz-200Hz（GPT 推荐的 PID 调参分析范围）
 """
 
+from contextlib import asynccontextmanager, contextmanager
+
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+import asyncio
 import base64
+import hashlib
+import hmac
+import itertools
 import json
-import math
+import os
+import sys
+import tempfile
+import zipfile
+
+import numpy as np
+
+try:
+    from . import (columnar, detectors, envelope, export, feature_graph, filter_sim, jobs, log_index, log_store,
+                   log_summary, profiling, resample, resync, segmentation, throttle_stats, transport, uploads)
+except ImportError:  # 直接运行 python3 entry.py
+    import columnar
+    import detectors
+    import envelope
+    import export
+    import feature_graph
+    import filter_sim
+    import jobs
+    import log_index
+    import log_store
+    import log_summary
+    import profiling
+    import resample
+    import resync
+    import segmentation
+    import throttle_stats
+    import transport
+    import uploads
 
 # Monkey-patch orangebox to handle errors gracefully
 def _patch_orangebox():
@@ -21,46 +55,96 @@ def _patch_orangebox():
         import logging
         _log = logging.getLogger("orangebox.parser")
 
+        def count_warning(parser, kind):
+            """损坏的闪存转储可能产生成千上万条告警：按类别计数（parser.warning_counts），不逐条打印"""
+            counts = parser.__dict__.setdefault('warning_counts', {})
+            counts[kind] = counts.get(kind, 0) + 1
+
         def patched_parse_event(self, reader):
             byte = next(reader)
             try:
                 event_type = EventType(byte)
             except ValueError:
-                _log.warning(f"Unknown event type: {byte}")
+                count_warning(self, 'unknown_event')
+                _log.debug(f"Unknown event type: {byte}")
                 return False
 
             # Check if event_type is in event_map
             if event_type not in event_map:
-                _log.warning(f"Unhandled event type: {event_type}")
+                count_warning(self, 'unhandled_event')
+                _log.debug(f"Unhandled event type: {event_type}")
                 return False
 
             # Call parser with error handling
             try:
                 parser_func = event_map[event_type]
                 event_data = parser_func(reader)
-                self.events.append(Event(event_type, event_data))
+                self._events.append(Event(event_type, event_data))  # events 属性返回的是副本
                 if event_type == EventType.LOG_END:
                     self._end_of_log = True
             except ValueError as e:
                 # Handle "Invalid 'End of log' message" and similar errors
-                _log.warning(f"Event parse error ({event_type}): {e}")
+                count_warning(self, 'event_parse_error')
+                _log.debug(f"Event parse error ({event_type}): {e}")
                 if event_type == EventType.LOG_END:
                     self._end_of_log = True  # Still mark as end of log
                 return False
             return True
 
         ob_parser.Parser._parse_event_frame = patched_parse_event
-        print("[BBL Decoder] Orangebox patched for error handling")
+        print("[BBL Decoder] Orangebox patched for error handling", file=sys.stderr)
     except Exception as e:
-        print(f"[BBL Decoder] Failed to patch orangebox: {e}")
+        print(f"[BBL Decoder] Failed to patch orangebox: {e}", file=sys.stderr)
 
 _patch_orangebox()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app):
+    # 启动时恢复上次未完成的 /jobs 任务
+    job_runner()
+    yield
+    if _JOB_RUNNER is not None:
+        _JOB_RUNNER.shutdown()
+    if _INDEX_WRITER is not None:
+        _INDEX_WRITER.flush()  # 写入还在攒批的索引记录
+
+
+app = FastAPI(lifespan=lifespan)
+# 响应按 Accept-Encoding 压缩（gzip / br / zstd）
+app.add_middleware(transport.CompressionMiddleware)
 
 MAX_PAYLOAD_CHARS = 500000  # 测试极限：500K chars（约 125K tokens）
 # 采样率列表：最低 200Hz，保证 PID 调参分析精度
 TARGET_HZ_LIST = [1000, 500, 250, 200]
+# 桨洗事件中最严重的 N 个窗口在 frames.hi 中保留全速率 gyro
+FULLRATE_WINDOWS = 3
+# X-Profile 剖析需要请求头 X-Profile-Token 与该环境变量一致；未设置时剖析关闭
+PROFILE_TOKEN_ENV = 'BBL_PROFILE_TOKEN'
+# POST /logs 句柄存储的总大小上限（MB）和空闲过期时间（秒）
+LOG_STORE_MB_ENV = 'BBL_LOG_STORE_MB'
+LOG_STORE_TTL_ENV = 'BBL_LOG_STORE_TTL_S'
+# /logs/{id}/frames 单次最多返回的帧数
+MAX_QUERY_FRAMES = 100_000
+# /jobs 的任务目录（SQLite + 上传 / 结果文件，部署时应挂载持久卷）和工作进程数
+JOBS_DIR_ENV = 'BBL_JOBS_DIR'
+JOB_WORKERS_ENV = 'BBL_JOB_WORKERS'
+# 长轮询最长等待（秒）、SSE 轮询间隔和保活间隔（秒）
+JOB_MAX_WAIT_S = 60
+JOB_POLL_S = 0.25
+JOB_KEEPALIVE_S = 15
+# 解压后的上传大小上限（MB）
+MAX_UPLOAD_MB_ENV = 'BBL_MAX_UPLOAD_MB'
+# /uploads 断点续传暂存区的总大小上限（MB）和未完成上传的保留时间（秒）
+UPLOAD_STAGING_MB_ENV = 'BBL_UPLOAD_STAGING_MB'
+UPLOAD_TTL_ENV = 'BBL_UPLOAD_TTL_S'
+# 元数据索引（SQLite）路径，设置后完整解码结果自动入库
+INDEX_DB_ENV = 'BBL_INDEX_DB'
+# /decode?stream=true 中 frames 数组每块的行数
+STREAM_CHUNK_ROWS = 2048
+# /decode/batch：zip 中只解码这些扩展名的成员；每个工作进程最多排队的 log 数
+BATCH_EXTENSIONS = ('.bbl', '.bfl', '.txt')
+BATCH_IN_FLIGHT_PER_WORKER = 2
 
 
 def safe_int(val, default=0):
@@ -82,25 +166,47 @@ def safe_float(val, default=0.0):
 
 
 def calculate_rms(values):
-    if not values:
+    values = np.asarray(values, dtype=np.float64)
+    if values.size == 0:
         return 0.0
-    squared = [v * v for v in values]
-    return math.sqrt(sum(squared) / len(squared))
+    return float(np.sqrt(np.mean(values * values)))
 
 
 def calculate_peak_frequency(values, sample_rate):
+    values = np.asarray(values, dtype=np.float64)
     if len(values) < 10:
         return 0.0
-    zero_crossings = 0
-    for i in range(1, len(values)):
-        if (values[i-1] >= 0 and values[i] < 0) or (values[i-1] < 0 and values[i] >= 0):
-            zero_crossings += 1
+    # 符号翻转次数（np.diff 对布尔数组即为异或）
+    zero_crossings = int(np.count_nonzero(np.diff(values >= 0)))
     duration = len(values) / sample_rate
     if duration > 0:
         return zero_crossings / (2 * duration)
     return 0.0
 
 
+def frames_to_matrix(frames_list):
+    """把 orangebox 帧列表转成 (frames, fields) 的 object 矩阵，需要的列再按需转成数值"""
+    if not frames_list:
+        return np.zeros((0, 0), dtype=object)
+    return np.array([frame.data for frame in frames_list], dtype=object)
+
+
+def numeric_column(raw, j):
+    """object 列转 float64；空串（S 帧之前）为 0.0，其余非数值时才逐个 safe_float"""
+    col = raw[:, j]
+    try:
+        return col.astype(np.float64)
+    except (ValueError, TypeError):
+        pass
+    empty = col == ''
+    out = np.zeros(len(col), dtype=np.float64)
+    try:
+        out[~empty] = col[~empty].astype(np.float64)
+        return out
+    except (ValueError, TypeError):
+        return np.array([safe_float(v) for v in col], dtype=np.float64)
+
+
 # CLI 字段分类
 CLI_A_CORE = {
     'Firmware revision', 'Firmware date', 'Board information', 'Craft name',
@@ -175,51 +281,14 @@ def build_cli_sections(headers):
     }
 
 
-def find_flight_segments(all_time_us, all_motor, sample_interval_us):
-    """
-    检测飞行记录中的多个段落（通过时间跳跃或电机停止来分割）
-    返回每个段落的 (start_idx, end_idx, duration_s)
-    """
-    if not all_time_us or len(all_time_us) < 10:
-        return [(0, len(all_time_us), 0)]
-
-    segments = []
-    segment_start = 0
-
-    # 时间跳跃阈值：超过 1 秒认为是新段落
-    time_gap_threshold_us = 1_000_000
-
-    for i in range(1, len(all_time_us)):
-        time_gap = all_time_us[i] - all_time_us[i-1]
-
-        # 检测时间跳跃（新的飞行段落）
-        is_time_gap = time_gap > time_gap_threshold_us or time_gap < 0
-
-        if is_time_gap:
-            # 保存当前段落
-            if i - segment_start >= 10:  # 至少 10 帧才算有效段落
-                duration = (all_time_us[i-1] - all_time_us[segment_start]) / 1_000_000
-                segments.append((segment_start, i, duration))
-            segment_start = i
-
-    # 保存最后一个段落
-    if len(all_time_us) - segment_start >= 10:
-        duration = (all_time_us[-1] - all_time_us[segment_start]) / 1_000_000
-        segments.append((segment_start, len(all_time_us), duration))
-
-    # 如果没有找到有效段落，返回整个数据
-    if not segments:
-        duration = (all_time_us[-1] - all_time_us[0]) / 1_000_000
-        segments = [(0, len(all_time_us), duration)]
-
-    return segments
+LOG_HEADER = b'H Product:Blackbox'
 
 
 def find_all_logs(bbl_bytes):
     """查找 BBL 文件中所有独立的飞行记录"""
     import re
     # 查找所有 header 位置
-    headers = list(re.finditer(b'H Product:Blackbox', bbl_bytes))
+    headers = list(re.finditer(LOG_HEADER, bbl_bytes))
     if not headers:
         return [(0, len(bbl_bytes))]
 
@@ -231,325 +300,872 @@ def find_all_logs(bbl_bytes):
     return logs
 
 
-def parse_single_log(bbl_bytes):
-    """解析单个 log 的数据"""
+def parse_single_log(bbl_bytes, progress=None):
+    """解析单个 log 的数据，返回 (headers, field_names, frames_list, events, corruption)，见 decode_log"""
+    with open_log_parser(bbl_bytes) as parser:
+        return decode_log(parser, progress)
+
+
+def decode_log(parser, progress=None):
+    """解码已打开的 log，返回 (headers, field_names, frames_list, events, corruption)
+    逐帧解码走 resync.decode_frames：损坏区域直接跳到下一个可信 I 帧，corruption 为损坏索引（meta.corruption）
+    events 为日志事件（disarm / log end / resume 等）及其所在帧序号，用于段落切分
+    progress: 可选进度回调，见 resync.decode_frames
+    """
+    headers = parser.headers
+    field_names = parser.field_names
+    frames_list, events, corruption = resync.decode_frames(parser, _sample_interval_us(headers), progress)
+    if corruption.range_count or corruption.warnings:
+        print(f"[BBL Decoder] Corruption: {corruption.summary()}")
+    return headers, field_names, frames_list, events, corruption.to_meta()
+
+
+@contextmanager
+def open_log_parser(bbl_bytes):
+    """orangebox 只能从文件加载：写入临时文件后打开，退出时删除"""
     from orangebox import Parser
-    import tempfile
-    import os
 
     with tempfile.NamedTemporaryFile(delete=False, suffix='.BBL') as tmp:
         tmp.write(bbl_bytes)
         tmp_path = tmp.name
-
     try:
-        parser = Parser.load(tmp_path)
-        headers = parser.headers
-        field_names = parser.field_names
-        frames_list = list(parser.frames())
-        return headers, field_names, frames_list
+        yield Parser.load(tmp_path)
     finally:
         os.unlink(tmp_path)
 
 
-def parse_bbl_to_json(bbl_bytes):
-    """解析 BBL 文件，输出 <= 500K chars 的 JSON
-    支持多 log 文件，自动选择最长的 log
+def iter_log_export(bbl_bytes, fmt='csv', log=None, fields=None, start_s=None, end_s=None):
+    """全分辨率导出选中 log（默认最长的）的所有字段：边解码边 yield CSV / NDJSON 文本块（export.iter_export）
+    不保留解码后的帧，内存只有原始字节；log / 字段不合法时在第一个块之前抛 SelectionError / ExportError
     """
-    from orangebox import Parser
-    import tempfile
-    import os
+    log_bytes, _, _ = select_log(bbl_bytes, log)
+    del bbl_bytes
+    with open_log_parser(log_bytes) as parser:
+        del log_bytes
+        index = resync.CorruptionIndex(parser.reader._header_size)
+        frames = resync.iter_frames(parser, _sample_interval_us(parser.headers), index, [])
+        yield from export.iter_export(frames, parser.field_names, fmt, fields, start_s, end_s)
+        if index.range_count or index.warnings:
+            print(f"[BBL Decoder] Corruption: {index.summary()}")
+
+
+# ---------------------------------------------------------------------------
+# 特征依赖图：下面每个节点按需计算并缓存，客户端用 features= 只请求需要的部分
+# 输入节点：headers / field_names / frames_list / log_events / corruption
+# ---------------------------------------------------------------------------
+
+PIPELINE = feature_graph.FeatureRegistry()
+
+# 全速率列：节点名 -> 字段名（列表为多轴，返回 (k, n)；字符串为单列，返回 (n,)）
+COLUMN_FIELDS = {
+    'rc_throttle': 'rcCommand[3]',
+    'setpoint': [f'setpoint[{i}]' for i in range(3)],
+    'gyro': [f'gyroADC[{i}]' for i in range(3)],
+    'axisP': [f'axisP[{i}]' for i in range(2)],
+    'axisD': [f'axisD[{i}]' for i in range(2)],
+    'motor': [f'motor[{i}]' for i in range(4)],
+    'erpm': [f'eRPM[{i}]' for i in range(4)],
+    'vbat_latest': 'vbatLatest',
+    'amperage': 'amperageLatest',
+}
 
-    # 检测文件中所有 log
-    all_logs = find_all_logs(bbl_bytes)
-    total_logs = len(all_logs)
-    best_log_idx = 0  # 默认使用第一个 log
 
-    if total_logs > 1:
-        print(f"[BBL Decoder] Found {total_logs} logs in file, analyzing each...")
+@PIPELINE.node('sample_interval_us', deps=('headers',))
+def _sample_interval_us(headers):
+    looptime = safe_int(headers.get('looptime'), 125)
+    pid_process_denom = safe_int(headers.get('pid_process_denom'), 1)
+    return looptime * pid_process_denom
 
-        # 解析每个 log，找出最长的
-        best_log_idx = 0
-        best_duration = 0
-        log_durations = []
 
-        for i, (start, end) in enumerate(all_logs):
-            try:
-                log_bytes = bbl_bytes[start:end]
-                _, field_names, frames = parse_single_log(log_bytes)
+@PIPELINE.node('original_sample_rate', deps=('timing',))
+def _original_sample_rate(timing):
+    """实际记录频率（time 列的中位帧间隔），header 推算的值在 P 帧比例 / 丢帧时不准"""
+    return timing['sample_rate_hz']
+
+
+@PIPELINE.node('raw', deps=('frames_list',))
+def _raw(frames_list):
+    return frames_to_matrix(frames_list)
 
-                if len(frames) < 10:
-                    log_durations.append(0)
-                    continue
 
-                # 计算时长
-                field_idx = {name: j for j, name in enumerate(field_names)}
-                time_idx = field_idx.get('time', -1)
+@PIPELINE.node('field_idx', deps=('field_names',))
+def _field_idx(field_names):
+    return {name: i for i, name in enumerate(field_names)}
 
-                if time_idx >= 0:
-                    first_time = frames[0].data[time_idx]
-                    last_time = frames[-1].data[time_idx]
-                    duration = (last_time - first_time) / 1_000_000
-                else:
-                    duration = len(frames) / 1000  # 估算
 
-                log_durations.append(duration)
+@PIPELINE.node('time_full', deps=('raw', 'field_idx', 'sample_interval_us'))
+def _time_full(raw, field_idx, sample_interval_us):
+    time_idx = field_idx.get('time', -1)
+    if time_idx >= 0 and len(raw):
+        try:
+            return raw[:, time_idx].astype(np.int64)
+        except (ValueError, TypeError):
+            pass
+    return np.arange(len(raw), dtype=np.int64) * sample_interval_us
+
+
+@PIPELINE.node('motor_full', deps=('raw', 'field_idx'))
+def _motor_full(raw, field_idx):
+    """整个 log 的电机列（段落切分和选中段落的 motor 共用，只转换一次）；字段缺失时返回 None"""
+    motor_idx = [field_idx.get(f, -1) for f in COLUMN_FIELDS['motor']]
+    if not len(raw) or any(j < 0 for j in motor_idx):
+        return None
+    return np.stack([numeric_column(raw, j) for j in motor_idx])
+
 
-                if duration > best_duration:
-                    best_duration = duration
-                    best_log_idx = i
+@PIPELINE.node('segments', deps=('time_full', 'motor_full', 'raw', 'field_idx', 'headers', 'log_events'))
+def _segments(time_full, motor, raw, field_idx, headers, log_events):
+    """飞行段落：时间跳跃 + 解锁状态（flightModeFlags）+ disarm / log end 事件 + 地面怠速"""
+    armed = None
+    j = field_idx.get('flightModeFlags', -1)
+    if j >= 0 and len(raw):
+        known = raw[:, j] != ''
+        armed = segmentation.armed_mask(numeric_column(raw, j), known)
+    return segmentation.find_flight_segments(time_full, motor, detectors.motor_output_range(headers),
+                                             armed, log_events)
 
-            except Exception as e:
-                print(f"[BBL Decoder] Log {i+1} parse error: {e}")
-                log_durations.append(0)
 
-        print(f"[BBL Decoder] Log durations: {[round(d, 1) for d in log_durations]}s")
-        print(f"[BBL Decoder] Using log {best_log_idx + 1} ({round(best_duration, 1)}s)")
+@PIPELINE.node('segment_index')
+def _segment_index():
+    """segment 选择器（meta.segments 的序号，1 起），由 load_log_graph 传入；None 为自动选择"""
+    return None
 
-        # 使用最长的 log
-        start, end = all_logs[best_log_idx]
-        bbl_bytes = bbl_bytes[start:end]
 
-    # 解析选中的 log
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.BBL') as tmp:
-        tmp.write(bbl_bytes)
-        tmp_path = tmp.name
+@PIPELINE.node('segment', deps=('segments', 'segment_index'))
+def _segment(segments, segment_index):
+    """选择最长的段落；指定了 segment 时选 meta.segments 中的该段，越界时抛 log_summary.SelectionError"""
+    print(f"[BBL Decoder] Found {len(segments)} flight segment(s)")
+    if segment_index is not None:
+        chosen = segments[log_summary.check_segment_index(segment_index, len(segments))]
+        print(f"[BBL Decoder] Using selected segment: {round(chosen.duration, 1)}s ({chosen.end - chosen.start} frames)")
+        return chosen
+    longest_segment = max(segments, key=lambda s: s.duration)
+    if len(segments) > 1:
+        print(f"[BBL Decoder] Segment durations: {[round(s.duration, 1) for s in segments]}s")
+        print(f"[BBL Decoder] Using longest segment: {round(longest_segment.duration, 1)}s "
+              f"({longest_segment.end - longest_segment.start} frames)")
+    return longest_segment
 
-    try:
-        parser = Parser.load(tmp_path)
-    finally:
-        os.unlink(tmp_path)
 
-    headers = parser.headers
-    field_names = parser.field_names
-    frames_list = list(parser.frames())
-    field_idx = {name: i for i, name in enumerate(field_names)}
+@PIPELINE.node('time', deps=('time_full', 'segment'))
+def _time(time_full, segment):
+    return time_full[segment.start:segment.end]
 
-    # 计算原始采样率
-    looptime = safe_int(headers.get('looptime'), 125)
-    pid_process_denom = safe_int(headers.get('pid_process_denom'), 1)
-    sample_interval_us = looptime * pid_process_denom
-    original_sample_rate = 1_000_000 / sample_interval_us
 
-    # 字段索引
-    time_idx = field_idx.get('time', -1)
-    gyro_idx = [field_idx.get(f'gyroADC[{i}]', -1) for i in range(3)]
-    rc_idx = [field_idx.get(f'rcCommand[{i}]', -1) for i in range(4)]
-    setpoint_idx = [field_idx.get(f'setpoint[{i}]', -1) for i in range(3)]
-    axis_p_idx = [field_idx.get(f'axisP[{i}]', -1) for i in range(2)]
-    axis_i_idx = [field_idx.get(f'axisI[{i}]', -1) for i in range(2)]
-    axis_d_idx = [field_idx.get(f'axisD[{i}]', -1) for i in range(2)]
-    axis_f_idx = [field_idx.get(f'axisF[{i}]', -1) for i in range(2)]
-    motor_idx = [field_idx.get(f'motor[{i}]', -1) for i in range(4)]
-    erpm_idx = [field_idx.get(f'eRPM[{i}]', -1) for i in range(4)]
-    vbat_idx = field_idx.get('vbatLatest', -1)
-    amperage_idx = field_idx.get('amperageLatest', -1)
-
-    # 收集所有帧数据
-    all_time_us, all_vbat, all_amperage = [], [], []
-    all_rc = [[], [], [], []]
-    all_setpoint = [[], [], []]
-    all_gyro = [[], [], []]
-    all_axis_p, all_axis_i, all_axis_d, all_axis_f = [[], []], [[], []], [[], []], [[], []]
-    all_motor = [[], [], [], []]
-    all_erpm = [[], [], [], []]
-
-    for idx, frame in enumerate(frames_list):
-        data = frame.data
-        if time_idx >= 0:
-            try:
-                all_time_us.append(int(data[time_idx]))
-            except:
-                all_time_us.append(idx * sample_interval_us)
-        else:
-            all_time_us.append(idx * sample_interval_us)
-
-        for r in range(4):
-            if rc_idx[r] >= 0:
-                all_rc[r].append(safe_float(data[rc_idx[r]]))
-        for s in range(3):
-            if setpoint_idx[s] >= 0:
-                all_setpoint[s].append(safe_float(data[setpoint_idx[s]]))
-        for g in range(3):
-            if gyro_idx[g] >= 0:
-                all_gyro[g].append(safe_float(data[gyro_idx[g]]))
-        for p in range(2):
-            if axis_p_idx[p] >= 0:
-                all_axis_p[p].append(safe_float(data[axis_p_idx[p]]))
-            if axis_i_idx[p] >= 0:
-                all_axis_i[p].append(safe_float(data[axis_i_idx[p]]))
-            if axis_d_idx[p] >= 0:
-                all_axis_d[p].append(safe_float(data[axis_d_idx[p]]))
-            if axis_f_idx[p] >= 0:
-                all_axis_f[p].append(safe_float(data[axis_f_idx[p]]))
-        for m in range(4):
-            if motor_idx[m] >= 0:
-                all_motor[m].append(safe_float(data[motor_idx[m]]))
-            if erpm_idx[m] >= 0:
-                all_erpm[m].append(safe_float(data[erpm_idx[m]]))
-        if vbat_idx >= 0:
-            all_vbat.append(safe_float(data[vbat_idx]))
-        if amperage_idx >= 0:
-            all_amperage.append(safe_float(data[amperage_idx]))
-
-    # 检测多段飞行记录，选择最长的一段
-    segments = find_flight_segments(all_time_us, all_motor, sample_interval_us)
-
-    # 选择最长的段落
-    longest_segment = max(segments, key=lambda x: x[2])
-    seg_start, seg_end, seg_duration = longest_segment
-    total_segments = len(segments)
-
-    print(f"[BBL Decoder] Found {total_segments} flight segment(s)")
-    if total_segments > 1:
-        print(f"[BBL Decoder] Segment durations: {[round(s[2], 1) for s in segments]}s")
-        print(f"[BBL Decoder] Using longest segment: {round(seg_duration, 1)}s ({seg_end - seg_start} frames)")
-
-    # 截取最长段落的数据
-    def slice_data(data_list, start, end):
-        if isinstance(data_list, list) and len(data_list) > 0:
-            if isinstance(data_list[0], list):
-                return [d[start:end] for d in data_list]
-            return data_list[start:end]
-        return data_list
-
-    all_time_us = all_time_us[seg_start:seg_end]
-    all_vbat = all_vbat[seg_start:seg_end] if all_vbat else []
-    all_amperage = all_amperage[seg_start:seg_end] if all_amperage else []
-    all_rc = [rc[seg_start:seg_end] for rc in all_rc]
-    all_setpoint = [sp[seg_start:seg_end] for sp in all_setpoint]
-    all_gyro = [g[seg_start:seg_end] for g in all_gyro]
-    all_axis_p = [p[seg_start:seg_end] for p in all_axis_p]
-    all_axis_i = [i[seg_start:seg_end] for i in all_axis_i]
-    all_axis_d = [d[seg_start:seg_end] for d in all_axis_d]
-    all_axis_f = [f[seg_start:seg_end] for f in all_axis_f]
-    all_motor = [m[seg_start:seg_end] for m in all_motor]
-    all_erpm = [e[seg_start:seg_end] for e in all_erpm]
-
-    total_frames = len(all_time_us)
-    duration_s = (all_time_us[-1] - all_time_us[0]) / 1_000_000 if all_time_us else 0
-
-    # 统计特征（使用选中段落的数据计算）
-    gyro_rms = {
-        'r': round(calculate_rms(all_gyro[0]), 1),
-        'p': round(calculate_rms(all_gyro[1]), 1),
-        'y': round(calculate_rms(all_gyro[2]), 1) if all_gyro[2] else 0,
-    }
-    gyro_peak = {
-        'r': round(calculate_peak_frequency(all_gyro[0], original_sample_rate), 0),
-        'p': round(calculate_peak_frequency(all_gyro[1], original_sample_rate), 0),
-        'y': round(calculate_peak_frequency(all_gyro[2], original_sample_rate), 0) if all_gyro[2] else 0,
-    }
-    motor_avgs = [round(sum(m)/len(m), 0) if m else 0 for m in all_motor]
-    motor_max = [int(max(m)) if m else 0 for m in all_motor]
+@PIPELINE.node('timing', deps=('time', 'headers', 'sample_interval_us'))
+def _timing(time_us, headers, sample_interval_us):
+    """选中段落的帧间隔 / 抖动统计（meta.timing）"""
+    return resample.timing_stats(time_us, resample.nominal_frame_interval_us(headers, sample_interval_us))
+
+
+def segment_column(raw, field_idx, segment, name):
+    """选中段落内某个字段的数值列；字段不存在时返回 None"""
+    j = field_idx.get(name, -1)
+    seg_start, seg_end = segment.start, segment.end
+    if j < 0 or seg_end <= seg_start or not len(raw):
+        return None
+    return numeric_column(raw[seg_start:seg_end], j)
+
+
+def _register_column(name, fields):
+    @PIPELINE.node(name, deps=('raw', 'field_idx', 'segment'))
+    def _column(raw, field_idx, segment):
+        """截取选中段落的列；任一字段缺失时返回 None"""
+        names = [fields] if isinstance(fields, str) else fields
+        cols = [segment_column(raw, field_idx, segment, f) for f in names]
+        if any(c is None for c in cols):
+            return None
+        return cols[0] if isinstance(fields, str) else np.stack(cols)
+
+
+for _name, _fields in COLUMN_FIELDS.items():
+    if _name != 'motor':
+        _register_column(_name, _fields)
+
+
+@PIPELINE.node('motor', deps=('motor_full', 'segment'))
+def _motor(motor_full, segment):
+    """选中段落的电机列（motor_full 的切片）"""
+    if motor_full is None or segment.end <= segment.start:
+        return None
+    return motor_full[:, segment.start:segment.end]
+
+
+@PIPELINE.node('throttle', deps=('rc_throttle', 'motor', 'headers'))
+def _throttle(rc_throttle, motor, headers):
+    """归一化油门（0..1），事件检测和油门分档共用"""
+    if rc_throttle is None and motor is None:
+        return None
+    return detectors.normalize_throttle(rc_throttle, motor, headers)
+
+
+@PIPELINE.node('prefilter_gyro', deps=('raw', 'field_idx', 'segment', 'headers'))
+def _prefilter_gyro(raw, field_idx, segment, headers):
+    """滤波前 gyro 及其来源（gyroUnfilt / debug / gyroADC），供滤波仿真使用"""
+    return filter_sim.prefilter_gyro(lambda name: segment_column(raw, field_idx, segment, name), headers)
+
+
+def _axis_values(gyro, fn, digits):
+    """按 r/p/y 三轴计算，缺失的轴为 0"""
+    values = {}
+    for i, axis in enumerate('rpy'):
+        values[axis] = round(fn(gyro[i]), digits) if gyro is not None and i < len(gyro) else 0
+    return values
+
+
+@PIPELINE.node('cli', deps=('headers',), section='cli', key='cli')
+def _cli(headers):
+    return build_cli_sections(headers)
+
+
+@PIPELINE.node('gyro_rms', deps=('gyro',), section='stats', key='gyro_rms')
+def _gyro_rms(gyro):
+    return _axis_values(gyro, calculate_rms, 1)
+
+
+@PIPELINE.node('gyro_peak_hz', deps=('gyro', 'original_sample_rate'), section='stats', key='gyro_peak_hz')
+def _gyro_peak_hz(gyro, original_sample_rate):
+    return _axis_values(gyro, lambda v: calculate_peak_frequency(v, original_sample_rate), 0)
+
+
+@PIPELINE.node('motor_avg', deps=('motor',), section='stats', key='motor_avg')
+def _motor_avg(motor):
+    if motor is None:
+        return [0, 0, 0, 0]
+    return [round(float(m.mean()), 0) for m in motor]
+
+
+@PIPELINE.node('motor_max', deps=('motor',), section='stats', key='motor_max')
+def _motor_max(motor):
+    if motor is None:
+        return [0, 0, 0, 0]
+    return [int(m.max()) for m in motor]
+
+
+@PIPELINE.node('motor_imbalance', deps=('motor_avg',), section='stats', key='motor_imbalance')
+def _motor_imbalance(motor_avgs):
     avg_all = sum(motor_avgs) / 4 if motor_avgs else 0
-    imbalance = round(max(abs(a - avg_all) / avg_all for a in motor_avgs) if avg_all > 0 else 0, 3)
-    vbat_min = round(min(all_vbat) / 100, 2) if all_vbat else 0
-    vbat_max = round(max(all_vbat) / 100, 2) if all_vbat else 0
-    amp_max = round(max(all_amperage) / 100, 1) if all_amperage else 0
-    amp_avg = round(sum(all_amperage) / len(all_amperage) / 100, 1) if all_amperage else 0
-
-    cli = build_cli_sections(headers)
-
-    def build_frames(target_hz, use_delta_t=False):
-        """构建 frames 数据，优化格式减少体积"""
-        step = max(1, int(original_sample_rate / target_hz))
-        indices = list(range(0, total_frames, step))
-        points = len(indices)
-
-        # t: 时间戳（使用 delta_t 模式节省空间）
-        if points > 1:
-            t0 = int(all_time_us[indices[0]] / 1000)
-            t1 = int(all_time_us[indices[1]] / 1000) if len(indices) > 1 else t0
-            dt = t1 - t0 if t1 > t0 else int(1000 / target_hz)
-            t_data = {'t0': t0, 'dt': dt}
-        else:
-            t_data = {'t0': 0, 'dt': int(1000 / target_hz)}
+    return round(max(abs(a - avg_all) / avg_all for a in motor_avgs) if avg_all > 0 else 0, 3)
+
 
-        # rc: [thr] 只保留油门（最重要），整数
-        rc = [int(all_rc[3][i]) for i in indices if i < len(all_rc[3])]
+@PIPELINE.node('vbat', deps=('vbat_latest',), section='stats', key='vbat')
+def _vbat_range(vbat):
+    if vbat is None:
+        return [0, 0]
+    return [round(float(vbat.min()) / 100, 2), round(float(vbat.max()) / 100, 2)]
 
-        # sp: [r, p, y] setpoint，整数（减少小数）
-        sp = []
-        for i in indices:
-            if i < len(all_setpoint[0]):
-                sp.append([int(all_setpoint[0][i]), int(all_setpoint[1][i]), int(all_setpoint[2][i])])
 
-        # g: [r, p, y] gyro，整数
-        g = []
-        for i in indices:
-            if i < len(all_gyro[0]):
-                g.append([int(all_gyro[0][i]), int(all_gyro[1][i]), int(all_gyro[2][i])])
+@PIPELINE.node('amp', deps=('amperage',), section='stats', key='amp')
+def _amp_summary(amp):
+    if amp is None:
+        return [0, 0]
+    return [round(float(amp.mean()) / 100, 1), round(float(amp.max()) / 100, 1)]
+
+
+@PIPELINE.node('throttle_bins', deps=('throttle', 'gyro', 'setpoint', 'axisD', 'motor', 'vbat_latest', 'amperage', 'headers'),
+               section='stats', key='throttle_bins')
+def _throttle_bins(throttle, gyro, setpoint, axis_d, motor, vbat, amp, headers):
+    """按油门分档的统计表"""
+    if throttle is None:
+        return {}
+    columns = {
+        'gyro': gyro, 'setpoint': setpoint, 'axisD': axis_d, 'motor': motor,
+        'vbat': vbat, 'amp': amp, 'motor_range': detectors.motor_output_range(headers),
+    }
+    return throttle_stats.throttle_binned_stats(columns, throttle)
+
+
+@PIPELINE.node('motor_events', deps=('time', 'motor', 'erpm', 'headers'), section='events')
+def _motor_events(time_us, motor, erpm, headers):
+    """电机失步 / eRPM 掉线事件（全速率列，向量化）"""
+    motor_events, motor_event_counts = [], {}
+    if erpm is not None and motor is not None:
+        motor_events, motor_event_counts = detectors.detect_motor_events(time_us, motor, erpm, headers)
+        print(f"[BBL Decoder] Motor events: {motor_event_counts}")
+    return {'motor': motor_events, 'motor_counts': motor_event_counts}
+
+
+@PIPELINE.node('prop_wash', deps=('time', 'throttle', 'gyro'), section='events')
+def _prop_wash(time_us, throttle, gyro):
+    """收油后的桨洗振荡事件"""
+    prop_wash_events, prop_wash_count = [], 0
+    if gyro is not None and throttle is not None:
+        prop_wash_events, prop_wash_count = detectors.detect_prop_wash(time_us, throttle, gyro)
+        print(f"[BBL Decoder] Prop wash events: {prop_wash_count}")
+    return {'prop_wash': prop_wash_events, 'prop_wash_count': prop_wash_count}
+
+
+@PIPELINE.node('fullrate_windows', deps=('prop_wash', 'time', 'gyro'))
+def _fullrate_windows(prop_wash, time_us, gyro):
+    """最严重桨洗事件窗口内的全速率 gyro，避免关键细节被降采样抹掉"""
+    worst = sorted(prop_wash['prop_wash'], key=lambda e: -e['rms'])[:FULLRATE_WINDOWS]
+    if not worst or gyro is None:
+        return []
+    span = int(detectors.estimate_sample_rate(time_us) * detectors.PROPWASH_WINDOW_S)
+    windows = []
+    for event in sorted(worst, key=lambda e: e['t_ms']):
+        start = int(np.searchsorted(time_us, event['t_ms'] * 1000))
+        end = min(start + span, len(time_us))
+        if end - start < 2:
+            continue
+        windows.append({
+            't0': int(time_us[start] / 1000),
+            'dt_us': int(round((time_us[end - 1] - time_us[start]) / (end - start - 1))),
+            'g': gyro[:, start:end].T.astype(np.int64).tolist(),
+        })
+    return windows
+
+
+@PIPELINE.node('frame_arrays', deps=('time', 'timing', 'rc_throttle', 'setpoint', 'gyro',
+                                     'axisP', 'axisD', 'motor', 'fullrate_windows'))
+def _frame_arrays(time_us, timing, rc_throttle, setpoint, gyro, axis_p, axis_d, motor, fullrate_windows):
+    """返回 sample_frames(target_hz)：frames 块，通道为 int64 数组（(points,) / (points, k)），还没有转成列表"""
+    gap_us = resample.gap_threshold_us(timing)
+
+    def sample_frames(target_hz):
+        """按实际 time 列插值到 target_hz 的均匀网格（不超过实际记录频率），优化格式减少体积"""
+        hz = min(target_hz, timing['sample_rate_hz']) if timing['sample_rate_hz'] > 0 else target_hz
+        grid = resample.UniformGrid(time_us, 1_000_000 / hz, gap_us)
+        points = len(grid)
+
+        def rows(columns):
+            if columns is None:
+                return []
+            return np.rint(grid.sample(columns)).T.astype(np.int64)
+
+        # t: 时间戳（delta_t 模式，网格严格等间隔）；gaps: 缺帧区间内的网格点 [起始点, 点数]
+        dt_ms = 1000 / hz
+        t_data = {
+            't0': int(time_us[0] / 1000) if points else 0,
+            'dt': int(dt_ms) if float(dt_ms).is_integer() else round(dt_ms, 3),
+        }
 
         # pid: [Pr, Dr, Pp, Dp] 只保留 roll/pitch 的 P 和 D（最关键）
         pid = []
-        for i in indices:
-            if i < len(all_axis_p[0]):
-                pid.append([
-                    int(all_axis_p[0][i]) if i < len(all_axis_p[0]) else 0,
-                    int(all_axis_d[0][i]) if i < len(all_axis_d[0]) else 0,
-                    int(all_axis_p[1][i]) if i < len(all_axis_p[1]) else 0,
-                    int(all_axis_d[1][i]) if i < len(all_axis_d[1]) else 0,
-                ])
-
-        # m: [m1, m2, m3, m4] 电机输出，整数
-        m = []
-        for i in indices:
-            if i < len(all_motor[0]):
-                m.append([int(all_motor[0][i]), int(all_motor[1][i]), int(all_motor[2][i]), int(all_motor[3][i])])
+        if axis_p is not None:
+            d_terms = axis_d if axis_d is not None else np.zeros_like(axis_p)
+            pid = rows(np.stack([axis_p[0], d_terms[0], axis_p[1], d_terms[1]]))
 
         return {
             't': t_data,
-            'rc': rc,  # 只有油门
-            'sp': sp,
-            'g': g,
+            'gaps': grid.gap_runs(),
+            'rc': np.rint(grid.sample(rc_throttle)).astype(np.int64) if rc_throttle is not None else [],  # 只有油门
+            'sp': rows(setpoint),  # [r, p, y] setpoint，整数
+            'g': rows(gyro),  # [r, p, y] gyro，整数
             'pid': pid,  # 简化的 PID 输出
-            'm': m,
-        }, points, target_hz
+            'm': rows(motor),  # [m1, m2, m3, m4] 电机输出，整数
+            'hi': fullrate_windows,  # 桨洗窗口全速率 gyro
+        }, points, hz
+
+    return sample_frames
+
+
+@PIPELINE.node('frames', deps=('frame_arrays',), section='frames', key='frames')
+def _frames(sample_frames):
+    """返回 build_frames(target_hz)：sample_frames 的结果转成列表"""
+    def build_frames(target_hz):
+        frames, points, hz = sample_frames(target_hz)
+        return frames_lists(frames), points, hz
+
+    return build_frames
+
+
+def frames_lists(frames):
+    """frames 块中的数组转成列表（可直接 json.dumps）"""
+    return {key: value.tolist() if isinstance(value, np.ndarray) else value for key, value in frames.items()}
+
+
+# 10 的幂（uint64 能表示到 10**19），按位数计算整数的 JSON 长度
+_POW10 = 10 ** np.arange(20, dtype=np.uint64)
+
+
+def int_array_chars(values):
+    """int64 数组（任意维）tolist 后紧凑 json.dumps 的字符数，由位数直接算出，不生成列表和字符串"""
+    if not values.size:
+        return 2
+    digits = np.maximum(np.searchsorted(_POW10, np.abs(values).astype(np.uint64), side='right'), 1)
+    chars = int(digits.sum()) + int(np.count_nonzero(values < 0))
+    lists = 1
+    for dim in values.shape:
+        chars += lists * (dim + 1)  # 每个列表：方括号 2 个 + 元素之间 dim - 1 个逗号
+        lists *= dim
+    return chars
+
+
+def frames_json_chars(frames):
+    """sample_frames 结果按 frames_lists + 紧凑 json.dumps 序列化后的字符数"""
+    chars = len(frames) + 1  # 花括号 + 键之间的逗号
+    for key, value in frames.items():
+        chars += len(f'"{key}":')
+        if isinstance(value, np.ndarray):
+            chars += int_array_chars(value)
+        else:
+            chars += len(json.dumps(value, ensure_ascii=False, separators=(',', ':')))
+    return chars
 
-    def build_result(target_hz, use_delta_t=False):
-        frames, points, hz = build_frames(target_hz, use_delta_t)
-        return {
-            'meta': {
-                'fw': headers.get('Firmware revision', ''),
-                'board': headers.get('Board information', ''),
-                'craft': headers.get('Craft name', ''),
-                'duration_s': round(duration_s, 1),
-                'total_frames': total_frames,
-                'sample_rate_hz': hz,
-                'points': points,
-                'logs_found': total_logs,
-                'log_used': best_log_idx + 1,
-                'segments_found': total_segments,
-                'segment_used': 'longest',
-            },
-            'cli': cli,
-            'stats': {
-                'gyro_rms': gyro_rms,
-                'gyro_peak_hz': gyro_peak,
-                'motor_avg': motor_avgs,
-                'motor_max': motor_max,
-                'motor_imbalance': imbalance,
-                'vbat': [vbat_min, vbat_max],
-                'amp': [amp_avg, amp_max],
-            },
-            'frames': frames,
-        }
 
-    # 自动降采样直到 <= 100K chars
+def choose_frames(graph, head_chars, progress=None):
+    """自动降采样直到整个输出 <= MAX_PAYLOAD_CHARS，返回 sample_frames 的 (frames, points, hz)
+    head_chars(points, hz): 不含 frames 的输出 JSON 的字符数；frames 的字符数由数组算出，选定之前不转列表、不序列化
+    """
+    progress = progress or _no_progress
+    sample_frames = graph.get('frame_arrays')
     for target_hz in TARGET_HZ_LIST:
-        result = build_result(target_hz, use_delta_t=False)
-        compact = json.dumps(result, ensure_ascii=False, separators=(',', ':'))
-        if len(compact) <= MAX_PAYLOAD_CHARS:
-            print(f"[BBL Decoder] Output: {len(compact)} chars @ {target_hz}Hz, {result['meta']['points']} points")
-            return result
-
-    # 兜底：使用 delta_t 模式节省字符
-    result = build_result(TARGET_HZ_LIST[-1], use_delta_t=True)
-    compact = json.dumps(result, ensure_ascii=False, separators=(',', ':'))
-    print(f"[BBL Decoder] Output (delta_t mode): {len(compact)} chars @ {TARGET_HZ_LIST[-1]}Hz")
+        progress('frames', target_hz=target_hz)
+        frames, points, hz = sample_frames(target_hz)
+        chars = head_chars(points, hz) + len(',"frames":') + frames_json_chars(frames)
+        if chars <= MAX_PAYLOAD_CHARS:
+            print(f"[BBL Decoder] Output: {chars} chars @ {hz}Hz, {points} points")
+            return frames, points, hz
+
+    # 兜底：最低采样率
+    print(f"[BBL Decoder] Output (lowest rate): {chars} chars @ {TARGET_HZ_LIST[-1]}Hz")
+    return frames, points, hz
+
+
+def select_log(bbl_bytes, log=None, summaries=None):
+    """检测文件中所有 log，返回 (选中 log 的字节, 选中序号, log 总数)
+    log 为 1 起的序号；未指定且有多个 log 时按 I 帧快速扫描（log_summary）的时长选最长的，不完整解码每个 log
+    summaries: 已有的 log_summary.scan_logs 结果，避免重复扫描
+    """
+    all_logs = find_all_logs(bbl_bytes)
+    total_logs = len(all_logs)
+    best_log_idx = 0  # 默认使用第一个 log
+
+    if log is not None:
+        best_log_idx = log_summary.check_log_index(log, total_logs)
+        print(f"[BBL Decoder] Using selected log {log} of {total_logs}")
+    elif total_logs > 1:
+        print(f"[BBL Decoder] Found {total_logs} logs in file, scanning each...")
+        summaries = summaries or log_summary.scan_logs(bbl_bytes, all_logs)
+        log_durations = [s.row['duration_s'] for s in summaries]
+        best_log_idx = max(range(total_logs), key=lambda i: log_durations[i])
+        print(f"[BBL Decoder] Log durations: {log_durations}s")
+        print(f"[BBL Decoder] Using log {best_log_idx + 1} ({log_durations[best_log_idx]}s)")
+
+    start, end = all_logs[best_log_idx]
+    return bbl_bytes[start:end], best_log_idx, total_logs
+
+
+def scan_file(bbl_bytes):
+    """文件中所有 log 的快速摘要（meta.logs 表）"""
+    return log_summary.scan_logs(bbl_bytes, find_all_logs(bbl_bytes))
+
+
+def scan_file_prefix(f, size, chunk=1 << 20):
+    """已打开文件前 size 字节的 scan_file：分块查找 header，再逐个 log 读取并扫描，内存中最多只有一个 log"""
+    starts, tail, pos = [], b'', 0
+    f.seek(0)
+    while pos < size:
+        data = f.read(min(chunk, size - pos))
+        if not data:
+            break
+        buf = tail + data
+        i = buf.find(LOG_HEADER)
+        while i >= 0:
+            starts.append(pos - len(tail) + i)
+            i = buf.find(LOG_HEADER, i + 1)
+        tail = buf[-(len(LOG_HEADER) - 1):]  # 比 header 短，跨块的 header 不会重复计入
+        pos += len(data)
+    size = pos
+    spans = list(zip(starts, starts[1:] + [size])) if starts else [(0, size)]
+    summaries = []
+    for start, end in spans:
+        f.seek(start)
+        summaries.append(log_summary.summarize_log(f.read(end - start), (start, end)))
+    return summaries
+
+
+def load_log_graph(bbl_bytes, log=None, segment=None, summaries=None, progress=None):
+    """选择并解析 log，返回 (graph, best_log_idx, total_logs)；特征在 graph 上按需计算
+    log: meta.logs 表中的序号，segment: meta.segments 中的序号（1 起）；超出范围时抛 log_summary.SelectionError
+    （segment 在完整解码后、第一次取 segment 节点时检查）
+    """
+    log_bytes, best_log_idx, total_logs = select_log(bbl_bytes, log, summaries)
+    return log_graph(parse_single_log(log_bytes, progress), segment), best_log_idx, total_logs
+
+
+def log_graph(parsed, segment=None):
+    """decode_log 的结果作为输入节点的特征图"""
+    headers, field_names, frames_list, events, corruption = parsed
+    return feature_graph.FeatureGraph(PIPELINE, headers=headers, field_names=field_names, frames_list=frames_list,
+                                      log_events=events, corruption=corruption, segment_index=segment)
+
+
+def parse_bbl_to_json(bbl_bytes, features=None, log=None, segment=None, summary=False, progress=None):
+    """解析 BBL 文件，输出 <= 500K chars 的 JSON
+    支持多 log 文件，默认选择最长的 log 和其中最长的段落
+    features: 需要的特征（见 PIPELINE.public()，或块名 cli/stats/events/frames），None 为全部
+    log / segment: 按 meta.logs / meta.segments 的序号（1 起）指定分析哪个 log / 段落
+    summary: meta 中附带所有 log / 段落的摘要表（meta.logs）
+    progress: 可选进度回调 progress(阶段, **字段)，阶段依次为 scan / decode / features / frames（/jobs 使用）
+    """
+    requested = PIPELINE.resolve(features)
+    progress = progress or _no_progress
+
+    progress('scan')
+    summaries = scan_file(bbl_bytes) if summary else None
+    graph, best_log_idx, total_logs = load_log_graph(bbl_bytes, log, segment, summaries, progress)
+    return graph_to_json(graph, requested, best_log_idx, total_logs, segment, summaries if summary else None,
+                         progress)
+
+
+def _no_progress(stage, **fields):
+    pass
+
+
+def graph_to_json(graph, requested, best_log_idx, total_logs, segment=None, summaries=None, progress=None):
+    """在已解析 log 的特征图上组装输出 JSON（requested 为 PIPELINE.resolve 的结果）"""
+    progress = progress or _no_progress
+    progress('features', frames=len(graph.get('time_full')))
+    blocks = graph.collect([name for name in requested if name != 'frames'])
+
+    def head(points=None, hz=None):
+        return result_head(graph, blocks, best_log_idx, total_logs, segment, summaries, points, hz)
+
+    if 'frames' not in requested:
+        print(f"[BBL Decoder] Features: {', '.join(requested) or 'meta only'}")
+        return head()
+
+    frames, points, hz = choose_frames(graph, lambda points, hz: compact_chars(head(points, hz)), progress)
+    result = head(points, hz)
+    result['frames'] = frames_lists(frames)
     return result
 
 
+def result_head(graph, blocks, best_log_idx, total_logs, segment=None, summaries=None, points=None, hz=None):
+    """输出 JSON 中 frames 以外的部分（meta / cli / stats / events），直接取自特征图节点和 graph.collect 的 blocks
+    points / hz 为 frames 的点数和采样率；没有 frames 时为选中段落的帧数和实际记录频率
+    """
+    headers = graph.get('headers')
+    time_us = graph.get('time')
+    total_frames = len(time_us)
+    duration_s = (time_us[-1] - time_us[0]) / 1_000_000 if total_frames else 0
+    result = {
+        'meta': {
+            'fw': headers.get('Firmware revision', ''),
+            'board': headers.get('Board information', ''),
+            'craft': headers.get('Craft name', ''),
+            'duration_s': round(float(duration_s), 1),
+            'total_frames': total_frames,
+            'sample_rate_hz': hz if hz is not None else round(graph.get('original_sample_rate')),
+            'points': points if points is not None else total_frames,
+            'logs_found': total_logs,
+            'log_used': best_log_idx + 1,
+            'segments_found': len(graph.get('segments')),
+            'segment_used': segment if segment is not None else 'longest',
+            'segments': segmentation.describe_segments(graph.get('segments'), graph.get('time_full'),
+                                                       used=graph.get('segment')),
+            'timing': graph.get('timing'),
+            'corruption': graph.get('corruption'),
+        },
+    }
+    if summaries is not None:
+        result['meta']['logs'] = log_summary.describe(summaries)
+    for section in ('cli', 'stats', 'events'):
+        if section in blocks:
+            result[section] = blocks[section]
+    return result
+
+
+def compact_chars(value):
+    """紧凑 JSON（与响应相同的 json.dumps 参数）的字符数"""
+    return len(json.dumps(value, ensure_ascii=False, separators=(',', ':')))
+
+
+def frame_fields(field_idx):
+    """默认输出的全速率字段：COLUMN_FIELDS 中 log 里存在的字段"""
+    return [f for group in COLUMN_FIELDS.values() for f in ([group] if isinstance(group, str) else group)
+            if f in field_idx]
+
+
+def graph_to_columns(graph, requested, best_log_idx, total_logs, segment=None, hz=None, fields=None):
+    """二进制列式输出（Accept 协商）：选中段落的带类型列，没有 payload 上限
+    hz 为 None 时为全速率原始帧，否则插值到 hz 的均匀网格（不超过实际记录频率，同 frames）
+    fields 默认 frame_fields；返回 (列 dict, 元数据)，元数据为不含 frames 的 /decode 输出（meta / cli / stats / events）
+    """
+    field_idx = graph.get('field_idx')
+    fields = frame_fields(field_idx) if fields is None else fields
+    unknown = [f for f in fields if f not in field_idx]
+    if unknown:
+        raise log_summary.SelectionError(f"Unknown field(s): {', '.join(unknown)}")
+
+    metadata = graph_to_json(graph, [name for name in requested if name != 'frames'], best_log_idx, total_logs,
+                             segment)
+    chosen, time_us, timing = graph.get('segment'), graph.get('time'), graph.get('timing')
+    raw = graph.get('raw')[chosen.start:chosen.end]
+    columns = {'time': time_us}
+    for name in fields:
+        columns[name] = columnar.typed_column(raw, field_idx[name]) if len(raw) else np.zeros(0, dtype=np.int64)
+
+    layout = {'rate': 'full', 'points': len(time_us), 'fields': ['time'] + fields}
+    if hz is not None and len(time_us):
+        hz = min(hz, timing['sample_rate_hz']) if timing['sample_rate_hz'] > 0 else hz
+        grid = resample.UniformGrid(time_us, 1_000_000 / hz, resample.gap_threshold_us(timing))
+        for name, col in columns.items():
+            sampled = grid.sample(col)
+            columns[name] = np.rint(sampled).astype(np.int64) if col.dtype.kind == 'i' else sampled
+        layout.update({'rate': 'uniform', 'sample_rate_hz': round(hz, 3), 'points': len(grid),
+                       'gaps': grid.gap_runs()})
+    metadata['meta']['columns'] = layout
+    print(f"[BBL Decoder] Columns: {len(columns)} x {layout['points']} points ({layout['rate']})")
+    return columns, metadata
+
+
+def iter_json_stream(bbl_bytes, requested, log=None, segment=None):
+    """/decode?stream=true：与 parse_bbl_to_json 内容相同的 JSON 对象，按各部分可用的先后分块输出
+    cli 只依赖 header，在解码之前输出；meta / stats / events 在特征计算完成后直接由特征图节点输出，
+    frames 的采样率由数组长度算出（choose_frames），之后各数组按 STREAM_CHUNK_ROWS 行分块转换和序列化。
+    键的顺序与非流式输出不同。指定 segment 时序号要在完整解码后才能检查，cli 推迟到检查之后，
+    越界仍在第一个块之前抛 SelectionError
+    """
+    log_bytes, best_log_idx, total_logs = select_log(bbl_bytes, log)
+    del bbl_bytes
+    sep = '{'
+    early_cli = [name for name in requested if PIPELINE.nodes[name][2] == 'cli'] if segment is None else []
+    with open_log_parser(log_bytes) as parser:
+        if early_cli:
+            cli = feature_graph.FeatureGraph(PIPELINE, headers=parser.headers).collect(early_cli)['cli']
+            yield sep + '"cli":' + json.dumps(cli, ensure_ascii=False, separators=(',', ':'))
+            sep = ','
+        parsed = decode_log(parser)
+    del log_bytes
+
+    graph = log_graph(parsed, segment)
+    del parsed
+    graph.get('segment')
+    blocks = graph.collect([name for name in requested if name != 'frames'])
+
+    def head(points=None, hz=None):
+        return result_head(graph, blocks, best_log_idx, total_logs, segment, None, points, hz)
+
+    frames = points = hz = None
+    if 'frames' in requested:
+        frames, points, hz = choose_frames(graph, lambda points, hz: compact_chars(head(points, hz)))
+    for key, value in head(points, hz).items():
+        if key == 'cli' and early_cli:
+            continue
+        yield sep + f'"{key}":' + json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+        sep = ','
+    if frames is not None:
+        yield from _iter_frames_json(sep, frames)
+    yield '}'
+
+
+def _iter_frames_json(sep, frames):
+    """frames 块（sample_frames 的结果）：长数组按 STREAM_CHUNK_ROWS 行分块转成列表并序列化"""
+    yield sep + '"frames":'
+    sep = '{'
+    for key, value in frames.items():
+        if not isinstance(value, np.ndarray) or len(value) <= STREAM_CHUNK_ROWS:
+            value = value.tolist() if isinstance(value, np.ndarray) else value
+            yield sep + f'"{key}":' + json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+        else:
+            for i in range(0, len(value), STREAM_CHUNK_ROWS):
+                chunk = json.dumps(value[i:i + STREAM_CHUNK_ROWS].tolist(), separators=(',', ':'))[1:-1]
+                yield (sep + f'"{key}":[' if i == 0 else ',') + chunk
+            yield ']'
+        sep = ','
+    yield '{}' if sep == '{' else '}'
+
+
+def simulate_filters(bbl_bytes, candidates=None, grid=None):
+    """用本 log 的滤波前 gyro 批量评估候选滤波配置（第一个结果为当前配置）"""
+    overrides = filter_sim.expand_candidates(candidates, grid)
+    graph, _, _ = load_log_graph(bbl_bytes)
+    headers = graph.get('headers')
+    gyro, source = graph.get('prefilter_gyro')
+    time_us = graph.get('time')
+    if gyro is None or gyro.shape[1] < 64:
+        raise ValueError("Not enough gyro data for filter simulation")
+
+    throttle = graph.get('throttle')
+    gyro_rate = 1_000_000 / max(safe_int(headers.get('looptime'), 125), 1)
+    pid_rate = gyro_rate / max(safe_int(headers.get('pid_process_denom'), 1), 1)
+    meta, results = filter_sim.simulate(
+        gyro, detectors.estimate_sample_rate(time_us), headers, overrides,
+        throttle=float(throttle.mean()) if throttle is not None else 0.5,
+        gyro_rate=gyro_rate, pid_rate=pid_rate)
+    meta['source'] = source
+    print(f"[BBL Decoder] Filter simulation: {len(results)} candidates, source={source}")
+    return {'meta': meta, 'current': filter_sim.settings_from_headers(headers), 'results': results}
+
+
+def parse_json_option(value, name):
+    """表单 / query 中以 JSON 字符串传入的选项"""
+    if value is None or not isinstance(value, str):
+        return value
+    try:
+        return json.loads(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be valid JSON")
+
+
+def parse_feature_option(value):
+    """features 选项：逗号分隔字符串或 JSON 列表；未指定时为 None（全部）"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(',') if item.strip()]
+    if isinstance(value, (list, tuple)):
+        return [str(item) for item in value]
+    raise HTTPException(status_code=400, detail="features must be a comma separated string or a list")
+
+
+def resolve_features(value, default=None):
+    """解析并校验 features 选项，未知特征返回 400"""
+    requested = parse_feature_option(value)
+    try:
+        return PIPELINE.resolve(default if requested is None else requested)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def parse_index_option(value, name):
+    """log / segment 选择器：1 起的整数；未指定时为 None"""
+    if value is None or value == '':
+        return None
+    try:
+        index = int(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail=f"{name} must be an integer (1-based)")
+    if index < 1:
+        raise HTTPException(status_code=400, detail=f"{name} must be >= 1")
+    return index
+
+
+def parse_rate_option(value):
+    """hz 选项：正数；未指定或 full 时为 None（全速率）"""
+    if value is None or value == '' or str(value).lower() == 'full':
+        return None
+    try:
+        hz = float(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="hz must be a positive number or 'full'")
+    if not hz > 0:
+        raise HTTPException(status_code=400, detail="hz must be a positive number or 'full'")
+    return hz
+
+
+def negotiate_columnar(request: Request):
+    """Accept 头选择的二进制列式格式（columnar.MEDIA_TYPES），JSON 时返回 None；格式不可用时 406"""
+    try:
+        return columnar.negotiate(request.headers.get('accept'))
+    except columnar.ColumnarError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+
+
+def parse_bool_option(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
+def profile_request(request: Request):
+    """X-Profile: cpu|mem（可选 X-Profile-Format: summary|pstats|speedscope）
+    未携带时返回 None；需要 X-Profile-Token 与 BBL_PROFILE_TOKEN 一致，否则 403
+    """
+    mode = request.headers.get('X-Profile')
+    if not mode:
+        return None
+    token = os.environ.get(PROFILE_TOKEN_ENV)
+    if not token:
+        raise HTTPException(status_code=403, detail="Profiling is disabled on this server")
+    if not hmac.compare_digest(request.headers.get('X-Profile-Token', '').encode(), token.encode()):
+        raise HTTPException(status_code=403, detail="Invalid X-Profile-Token")
+    try:
+        return profiling.check_options(mode, request.headers.get('X-Profile-Format'))
+    except profiling.ProfileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def profiled_response(profile, bbl_bytes, fn, name, log=None):
+    """在剖析器下执行 fn()，附带帧类型计数；summary 返回 {result, profile}，否则返回可下载的剖析文件"""
+    mode, fmt = profile
+    result, report, artifact = profiling.run(mode, fmt, fn, name=name)
+    try:  # 计数是附带信息，重新解析失败不影响已经拿到的剖析结果
+        log_bytes, _, _ = select_log(bbl_bytes, log)
+        report['frame_counts'] = profiling.frame_type_counts(log_bytes)
+    except Exception as e:
+        report['frame_counts'] = {'error': str(e)}
+    print(f"[BBL Decoder] Profiled {name} ({mode}/{fmt}): {report['wall_s']}s")
+    if artifact is None:
+        return {'result': result, 'profile': report}
+    content, media_type, filename = artifact
+    return Response(content=content, media_type=media_type,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+def max_upload_bytes():
+    return safe_int(os.environ.get(MAX_UPLOAD_MB_ENV), transport.DEFAULT_MAX_UPLOAD_MB) * 1024 * 1024
+
+
+def transport_error(e):
+    """transport 的解压错误转 HTTPException：不支持的编码 415，超过上限 413，数据损坏 400"""
+    if isinstance(e, transport.UnsupportedEncodingError):
+        return HTTPException(status_code=415, detail=str(e))
+    if isinstance(e, transport.UploadTooLargeError):
+        return HTTPException(status_code=413, detail=str(e))
+    return HTTPException(status_code=400, detail=str(e))
+
+
+async def decoded_request(request: Request):
+    """Content-Encoding: gzip / zstd 的请求体边接收边解压，返回读取解压后 body 的 Request；未压缩时原样返回"""
+    encodings = transport.content_encodings(request.headers)
+    if not encodings:
+        return request
+    limit = max_upload_bytes()
+    try:
+        outer = transport.Decompressor(encodings[-1], limit)
+        body = b''.join([outer.feed(chunk) async for chunk in request.stream()])
+        for encoding in reversed(encodings[:-1]):
+            body = transport.decompress(body, encoding, limit)
+    except transport.TransportError as e:
+        raise transport_error(e)
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    return Request(request.scope, receive)
+
+
+async def read_bbl_upload(request: Request):
+    """读取上传的 BBL（multipart 文件 / base64 JSON / 原始二进制），以及请求选项
+    选项来自 query 参数、multipart 的其他表单字段或 JSON body 的其他键
+    请求体可以带 Content-Encoding: gzip / zstd；上传的文件本身也可以是 .gz / .zst / .zip（按魔数识别）
+    """
+    request = await decoded_request(request)
+    options = dict(request.query_params)
+    content_type = request.headers.get('content-type', '')
+
+    # 处理 multipart/form-data (文件上传)
+    if 'multipart/form-data' in content_type:
+        form = await request.form()
+        file = form.get('file')
+        if file:
+            bbl_bytes = await file.read()
+        else:
+            raise HTTPException(status_code=400, detail="No file in form data")
+        options.update({k: v for k, v in form.items() if k != 'file' and isinstance(v, str)})
+    elif 'application/json' in content_type:
+        body = await request.json()
+        bbl_base64 = body.get('bbl_base64')
+        if not bbl_base64:
+            raise HTTPException(status_code=400, detail="Missing bbl_base64 field")
+        bbl_bytes = base64.b64decode(bbl_base64)
+        options.update({k: v for k, v in body.items() if k != 'bbl_base64'})
+    else:
+        bbl_bytes = await request.body()
+
+    try:
+        bbl_bytes = transport.unpack_file(bbl_bytes, max_upload_bytes())
+    except transport.TransportError as e:
+        raise transport_error(e)
+    if not bbl_bytes:
+        raise HTTPException(status_code=400, detail="Empty BBL data")
+    return bbl_bytes, options
+
+
 @app.post("/decode")
 async def decode_bbl(request: Request):
     import traceback
@@ -561,27 +1177,24 @@ async def decode_bbl(request: Request):
     debug_mode = request.headers.get('X-Debug', '').lower() == 'true'
 
     try:
-        content_type = request.headers.get('content-type', '')
-
-        # 处理 multipart/form-data (文件上传)
-        if 'multipart/form-data' in content_type:
-            form = await request.form()
-            file = form.get('file')
-            if file:
-                bbl_bytes = await file.read()
-            else:
-                raise HTTPException(status_code=400, detail="No file in form data")
-        elif 'application/json' in content_type:
-            body = await request.json()
-            bbl_base64 = body.get('bbl_base64')
-            if not bbl_base64:
-                raise HTTPException(status_code=400, detail="Missing bbl_base64 field")
-            bbl_bytes = base64.b64decode(bbl_base64)
-        else:
-            bbl_bytes = await request.body()
-
-        if not bbl_bytes:
-            raise HTTPException(status_code=400, detail="Empty BBL data")
+        profile = profile_request(request)
+        fmt = negotiate_columnar(request)
+        if profile and fmt:
+            raise HTTPException(status_code=400, detail="X-Profile is only supported for JSON responses")
+        bbl_bytes, options = await read_bbl_upload(request)
+        requested = resolve_features(options.get('features'))
+        log = parse_index_option(options.get('log'), 'log')
+        segment = parse_index_option(options.get('segment'), 'segment')
+        hz = parse_rate_option(options.get('hz'))
+        fields = parse_feature_option(options.get('fields'))
+        if parse_bool_option(options.get('stream', False)) and not fmt and not profile:
+            # 渐进式 JSON：cli 在解码之前输出，meta / stats 随后，frames 分块；log / segment 选择错误在开始输出前返回
+            chunks = iter_json_stream(bbl_bytes, requested, log, segment)
+            try:
+                first = next(chunks)
+            except log_summary.SelectionError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            return StreamingResponse(itertools.chain([first], chunks), media_type="application/json")
 
         log_buffer.write(f"[DEBUG] Received {len(bbl_bytes)} bytes\n")
 
@@ -590,7 +1203,19 @@ async def decode_bbl(request: Request):
         sys.stdout = log_buffer
 
         try:
-            result = parse_bbl_to_json(bbl_bytes)
+            if fmt:
+                # 二进制列式响应：带类型的列，全速率或 hz 指定的采样率，没有 MAX_PAYLOAD_CHARS 上限
+                graph, best_log_idx, total_logs = load_log_graph(bbl_bytes, log, segment)
+                columns, metadata = graph_to_columns(graph, requested, best_log_idx, total_logs, segment, hz, fields)
+                return Response(content=columnar.encode(fmt, columns, metadata),
+                                media_type=columnar.CONTENT_TYPES[fmt])
+            decode = lambda: parse_bbl_to_json(bbl_bytes, features=requested, log=log, segment=segment)
+            if profile:
+                return profiled_response(profile, bbl_bytes, decode, 'decode', log)
+            result = decode()
+            index_decoded(bbl_bytes, result, background=True)
+        except log_summary.SelectionError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         finally:
             sys.stdout = old_stdout
 
@@ -622,134 +1247,845 @@ async def decode_bbl(request: Request):
 
 @app.post("/meta")
 async def get_meta(request: Request):
-    """只返回元数据，不返回完整的 frames 数据，用于快速预检"""
+    """只返回元数据，不返回完整的 frames 数据，用于快速预检
+    相当于不含 frames 的 /decode；默认只返回 meta（含所有 log / 段落的摘要表 meta.logs），可用 features= 追加 stats 等
+    summary_only=true 时只返回摘要表，不解码任何 log
+    """
     import traceback
 
     try:
-        content_type = request.headers.get('content-type', '')
-
-        if 'multipart/form-data' in content_type:
-            form = await request.form()
-            file = form.get('file')
-            if file:
-                bbl_bytes = await file.read()
-            else:
-                raise HTTPException(status_code=400, detail="No file in form data")
-        elif 'application/json' in content_type:
-            body = await request.json()
-            bbl_base64 = body.get('bbl_base64')
-            if not bbl_base64:
-                raise HTTPException(status_code=400, detail="Missing bbl_base64 field")
-            bbl_bytes = base64.b64decode(bbl_base64)
-        else:
-            bbl_bytes = await request.body()
-
-        if not bbl_bytes:
-            raise HTTPException(status_code=400, detail="Empty BBL data")
-
+        profile = profile_request(request)
+        bbl_bytes, options = await read_bbl_upload(request)
+        requested = resolve_features(options.get('features'), default=())
+        log = parse_index_option(options.get('log'), 'log')
+        segment = parse_index_option(options.get('segment'), 'segment')
+        summary_only = parse_bool_option(options.get('summary_only', False))
+
+        meta = lambda: parse_bbl_meta_only(bbl_bytes, features=requested, log=log, segment=segment,
+                                           summary_only=summary_only)
+        if profile:
+            return profiled_response(profile, bbl_bytes, meta, 'meta', log)
         # 快速解析，只获取元数据
-        result = parse_bbl_meta_only(bbl_bytes)
+        result = meta()
         return result
 
     except HTTPException:
         raise
+    except log_summary.SelectionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         error_trace = traceback.format_exc()
         raise HTTPException(status_code=500, detail=f"Failed to parse BBL meta: {str(e)}")
 
 
-def parse_bbl_meta_only(bbl_bytes):
-    """快速解析 BBL 文件，只返回元数据，不处理完整的 frames"""
-    from orangebox import Parser
-    import tempfile
-    import os
-
-    # 检测文件中所有 log
-    all_logs = find_all_logs(bbl_bytes)
-    total_logs = len(all_logs)
-    best_log_idx = 0
-    best_duration = 0
+@app.post("/filters/simulate")
+async def simulate_filters_endpoint(request: Request):
+    """评估候选滤波配置：candidates 为设置覆盖项列表，grid 为 {key: [取值...]}（笛卡尔积）"""
+    import traceback
 
-    if total_logs > 1:
-        # 快速扫描每个 log 的时长
-        for i, (start, end) in enumerate(all_logs):
-            try:
-                log_bytes = bbl_bytes[start:end]
-                _, field_names, frames = parse_single_log(log_bytes)
-                if len(frames) < 10:
-                    continue
-                field_idx = {name: j for j, name in enumerate(field_names)}
-                time_idx = field_idx.get('time', -1)
-                if time_idx >= 0 and len(frames) > 0:
-                    first_time = frames[0].data[time_idx]
-                    last_time = frames[-1].data[time_idx]
-                    duration = (last_time - first_time) / 1_000_000
-                    if duration > best_duration:
-                        best_duration = duration
-                        best_log_idx = i
-            except:
-                pass
-
-        start, end = all_logs[best_log_idx]
-        bbl_bytes = bbl_bytes[start:end]
-
-    # 解析选中的 log
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.BBL') as tmp:
-        tmp.write(bbl_bytes)
-        tmp_path = tmp.name
+    bbl_bytes, options = await read_bbl_upload(request)
+    candidates = parse_json_option(options.get('candidates'), 'candidates')
+    grid = parse_json_option(options.get('grid'), 'grid')
+    if candidates is not None and not isinstance(candidates, list):
+        raise HTTPException(status_code=400, detail="candidates must be a list of settings objects")
+    if grid is not None and not isinstance(grid, dict):
+        raise HTTPException(status_code=400, detail="grid must be an object of setting -> values")
 
     try:
-        parser = Parser.load(tmp_path)
-    finally:
-        os.unlink(tmp_path)
+        return simulate_filters(bbl_bytes, candidates, grid)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Failed to simulate filters: {str(e)}")
 
-    headers = parser.headers
-    field_names = parser.field_names
-    frames_list = list(parser.frames())
-    field_idx = {name: i for i, name in enumerate(field_names)}
 
-    # 计算采样率
-    looptime = safe_int(headers.get('looptime'), 125)
-    pid_process_denom = safe_int(headers.get('pid_process_denom'), 1)
-    sample_interval_us = looptime * pid_process_denom
-    sample_rate = int(1_000_000 / sample_interval_us)
+def parse_bbl_meta_only(bbl_bytes, features=(), log=None, segment=None, summary_only=False):
+    """快速解析 BBL 文件，只返回元数据（含 meta.logs 摘要表，及请求的非 frames 特征），不构建 frames
+    summary_only: 只做 I 帧扫描，返回 {logs_found, logs}，不解码任何 log
+    """
+    if summary_only:
+        summaries = scan_file(bbl_bytes)
+        return {'logs_found': len(summaries), 'logs': log_summary.describe(summaries)}
+    return parse_bbl_to_json(bbl_bytes, features=[f for f in PIPELINE.resolve(features) if f != 'frames'],
+                             log=log, segment=segment, summary=True)
 
-    # 计算时长
-    time_idx = field_idx.get('time', -1)
-    total_frames = len(frames_list)
 
-    if time_idx >= 0 and total_frames > 1:
-        # 收集时间戳用于检测段落
-        all_time_us = []
-        for frame in frames_list:
-            try:
-                all_time_us.append(int(frame.data[time_idx]))
-            except:
-                pass
-
-        # 检测段落
-        segments = find_flight_segments(all_time_us, None, sample_interval_us)
-        longest_segment = max(segments, key=lambda x: x[2])
-        duration_s = longest_segment[2]
-        total_segments = len(segments)
-        points = longest_segment[1] - longest_segment[0]
-    else:
-        duration_s = total_frames * sample_interval_us / 1_000_000
-        total_segments = 1
-        points = total_frames
+# ---------------------------------------------------------------------------
+# log 句柄：上传一次，meta / decode / frames 查询复用句柄中已解析的数据
+# ---------------------------------------------------------------------------
+
+LOG_STORE = log_store.LogStore(
+    max_bytes=safe_int(os.environ.get(LOG_STORE_MB_ENV), log_store.DEFAULT_MAX_MB) * 1024 * 1024,
+    ttl_s=safe_int(os.environ.get(LOG_STORE_TTL_ENV), log_store.DEFAULT_TTL_S))
+
+# 句柄中常驻的节点：与段落选择无关，所有查询共用
+WARM_NODES = ('headers', 'field_names', 'log_events', 'corruption', 'sample_interval_us', 'field_idx',
+              'time_full', 'segments')
+
+
+def warm_log_graph(log_bytes):
+    """解析 log，只保留 WARM_NODES 和按列存储的 float64 矩阵（S 帧空值为 0），丢掉 orangebox 帧列表"""
+    headers, field_names, frames_list, events, corruption = parse_single_log(log_bytes)
+    graph = feature_graph.FeatureGraph(PIPELINE, headers=headers, field_names=field_names, frames_list=frames_list,
+                                       log_events=events, corruption=corruption, segment_index=None)
+    warm = {name: graph.get(name) for name in WARM_NODES}
+    raw = graph.get('raw')
+    matrix = np.empty(raw.shape, dtype=np.float64, order='F')
+    for j in range(raw.shape[1]):
+        matrix[:, j] = numeric_column(raw, j)
+    return feature_graph.FeatureGraph(PIPELINE, raw=matrix, segment_index=None, **warm)
+
+
+def stored_log_graph(stored, log=None):
+    """句柄中选中 log 的常驻特征图，返回 (graph, log_idx, total_logs)；首次访问该 log 时解析"""
+    best_log_idx, total_logs = LOG_STORE.cached(
+        stored, ('select', log), lambda: select_log(stored.data, log, stored.summaries)[1:])
+
+    def parse():
+        start, end = find_all_logs(stored.data)[best_log_idx]
+        return warm_log_graph(stored.data[start:end])
+
+    return LOG_STORE.cached(stored, ('log', best_log_idx), parse), best_log_idx, total_logs
+
+
+def stored_to_json(stored, features=None, log=None, segment=None, summary=False):
+    """句柄上的 parse_bbl_to_json：段落相关的节点按 (log, segment) 缓存，换 features 重复查询不重复计算"""
+    requested = PIPELINE.resolve(features)
+    base, best_log_idx, total_logs = stored_log_graph(stored, log)
+
+    graph = LOG_STORE.cached(stored, ('segment', best_log_idx, segment), lambda: base.fork(segment_index=segment))
+    return graph_to_json(graph, requested, best_log_idx, total_logs, segment, stored.summaries if summary else None)
+
+
+def window_rows(segments, time_full, segment=None, start_s=None, end_s=None):
+    """时间范围内的帧序号：start_s / end_s 为相对 log 首帧的秒数，segment（meta.segments 的序号）限定在段落内"""
+    t0 = int(time_full[0])
+    lo, hi = -np.inf, np.inf
+    if segment is not None:
+        chosen = segments[log_summary.check_segment_index(segment, len(segments))]
+        lo, hi = time_full[chosen.start], time_full[chosen.end - 1]
+    if start_s is not None:
+        lo = max(lo, t0 + start_s * 1_000_000)
+    if end_s is not None:
+        hi = min(hi, t0 + end_s * 1_000_000)
+    return np.flatnonzero((time_full >= lo) & (time_full <= hi))
+
+
+def json_column(col):
+    """数值列转 JSON 列表：全为整数时输出 int"""
+    integral = np.all(np.isfinite(col)) and np.all(col == np.round(col))
+    return col.astype(np.int64).tolist() if integral else col.tolist()
+
+
+def stored_fields(field_idx, fields):
+    """fields 为字段名列表，默认 COLUMN_FIELDS 中 log 里存在的字段；未知字段抛 SelectionError"""
+    if fields is None:
+        return frame_fields(field_idx)
+    unknown = [f for f in fields if f not in field_idx]
+    if unknown:
+        raise log_summary.SelectionError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+
+def stored_frames(stored, log=None, segment=None, start_s=None, end_s=None, fields=None):
+    """句柄中选中 log 的全速率原始列：时间范围为相对 log 首帧的秒数（或 segment 对应的范围）
+    fields 为字段名列表，默认 COLUMN_FIELDS 中 log 里存在的字段
+    """
+    graph, best_log_idx, total_logs = stored_log_graph(stored, log)
+    raw, field_idx, time_full = graph.get('raw'), graph.get('field_idx'), graph.get('time_full')
+    fields = stored_fields(field_idx, fields)
+    if not len(time_full):
+        return {'log': best_log_idx + 1, 'frames': 0, 'time_s': [], 'columns': {f: [] for f in fields}}
+
+    t0 = int(time_full[0])
+    rows = window_rows(graph.get('segments'), time_full, segment, start_s, end_s)
+    if len(rows) > MAX_QUERY_FRAMES:
+        raise log_summary.SelectionError(
+            f"Range has {len(rows)} frames, at most {MAX_QUERY_FRAMES} per query; narrow start_s / end_s")
 
     return {
-        'meta': {
-            'fw': headers.get('Firmware revision', ''),
-            'board': headers.get('Board information', ''),
-            'craft': headers.get('Craft name', ''),
-            'duration_s': round(duration_s, 1),
-            'sample_rate_hz': sample_rate,
-            'points': points,
-            'logs_found': total_logs,
-            'segments_found': total_segments,
-        }
+        'log': best_log_idx + 1,
+        'logs_found': total_logs,
+        'frames': len(rows),
+        'time_s': np.round((time_full[rows] - t0) / 1_000_000, 6).tolist(),
+        'columns': {name: json_column(raw[rows, field_idx[name]]) for name in fields},
+    }
+
+
+def stored_envelope(stored, log=None, segment=None, start_s=None, end_s=None, fields=None,
+                    width=envelope.DEFAULT_WIDTH):
+    """句柄中选中 log 的 min / max / mean 包络：取 bin 数不超过 width 的最细层级，时间范围同 stored_frames
+    每个字段的金字塔首次查询时构建并缓存在句柄中，之后任意缩放只做切片
+    """
+    graph, best_log_idx, total_logs = stored_log_graph(stored, log)
+    raw, field_idx, time_full = graph.get('raw'), graph.get('field_idx'), graph.get('time_full')
+    fields = stored_fields(field_idx, fields)
+    rows = window_rows(graph.get('segments'), time_full, segment, start_s, end_s) if len(time_full) else []
+    if not len(rows):
+        return {'log': best_log_idx + 1, 'logs_found': total_logs, 'frames': 0, 'level': 0, 'bin_frames': 1,
+                'points': 0, 'time_s': [], 'columns': {f: {'min': [], 'max': [], 'mean': []} for f in fields}}
+
+    first, last = int(rows[0]), int(rows[-1]) + 1
+    level = envelope.level_for(last - first, width)
+    lo, hi = envelope.bin_range(first, last, level)
+    columns = {}
+    for name in fields:
+        values = raw[:, field_idx[name]]
+        pyramid = None
+        if level:
+            pyramid = LOG_STORE.cached(stored, ('envelope', best_log_idx, name), lambda: envelope.Pyramid(values))
+        mins, maxs, means = envelope.window(pyramid, values, level, lo, hi)
+        columns[name] = {'min': json_column(mins), 'max': json_column(maxs),
+                         'mean': np.round(means.astype(np.float64), 3).tolist()}
+    t0 = int(time_full[0])
+    return {
+        'log': best_log_idx + 1,
+        'logs_found': total_logs,
+        'frames': last - first,
+        'level': level,
+        'bin_frames': 1 << level,
+        'points': hi - lo,
+        # bin 首帧的时间；两端的 bin 可能延伸到范围之外
+        'time_s': np.round((time_full[lo << level:hi << level:1 << level] - t0) / 1_000_000, 6).tolist(),
+        'columns': columns,
+    }
+
+
+def get_stored_log(log_id):
+    try:
+        return LOG_STORE.get(log_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown or expired log handle")
+
+
+def parse_float_option(value, name):
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail=f"{name} must be a number")
+
+
+@app.post("/logs")
+async def upload_log(request: Request):
+    """保存上传的 BBL，返回句柄 id 和所有 log / 段落的摘要表；后续查询用 /logs/{id}/..."""
+    bbl_bytes, _ = await read_bbl_upload(request)
+    summaries = scan_file(bbl_bytes)
+    try:
+        stored = LOG_STORE.put(bbl_bytes, summaries)
+    except log_store.StoreFullError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return {
+        'id': stored.id,
+        'bytes': len(bbl_bytes),
+        'expires_in_s': LOG_STORE.expires_in(stored),
+        'logs_found': len(summaries),
+        'logs': log_summary.describe(summaries),
+    }
+
+
+@app.get("/logs/{log_id}/meta")
+async def stored_meta(log_id: str, request: Request):
+    """句柄上的 /meta：features / log / segment 为 query 参数"""
+    stored = get_stored_log(log_id)
+    options = request.query_params
+    requested = resolve_features(options.get('features'), default=())
+    try:
+        return stored_to_json(stored, [f for f in requested if f != 'frames'],
+                              parse_index_option(options.get('log'), 'log'),
+                              parse_index_option(options.get('segment'), 'segment'), summary=True)
+    except log_summary.SelectionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/logs/{log_id}/decode")
+async def stored_decode(log_id: str, request: Request):
+    """句柄上的 /decode：features / log / segment 为 query 参数"""
+    stored = get_stored_log(log_id)
+    options = request.query_params
+    requested = resolve_features(options.get('features'))
+    try:
+        result = stored_to_json(stored, requested, parse_index_option(options.get('log'), 'log'),
+                                parse_index_option(options.get('segment'), 'segment'))
+    except log_summary.SelectionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(content=json.dumps(result, ensure_ascii=False, separators=(',', ':')),
+                    media_type="application/json")
+
+
+@app.get("/logs/{log_id}/frames")
+async def stored_frames_endpoint(log_id: str, request: Request):
+    """句柄中选中 log 的全速率原始列：start_s / end_s（相对 log 首帧）、fields（逗号分隔字段名）、log / segment"""
+    stored = get_stored_log(log_id)
+    options = request.query_params
+    fields = parse_feature_option(options.get('fields'))
+    try:
+        result = stored_frames(stored, parse_index_option(options.get('log'), 'log'),
+                               parse_index_option(options.get('segment'), 'segment'),
+                               parse_float_option(options.get('start_s'), 'start_s'),
+                               parse_float_option(options.get('end_s'), 'end_s'), fields)
+    except log_summary.SelectionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(content=json.dumps(result, separators=(',', ':')), media_type="application/json")
+
+
+@app.get("/logs/{log_id}/envelope")
+async def stored_envelope_endpoint(log_id: str, request: Request):
+    """句柄中选中 log 的 min / max / mean 包络（图表缩放）：start_s / end_s、width（像素宽度）、fields、log / segment"""
+    stored = get_stored_log(log_id)
+    options = request.query_params
+    fields = parse_feature_option(options.get('fields'))
+    try:
+        width = int(options.get('width') or envelope.DEFAULT_WIDTH)
+    except ValueError:
+        width = 0
+    if not 1 <= width <= envelope.MAX_WIDTH:
+        raise HTTPException(status_code=400, detail=f"width must be an integer between 1 and {envelope.MAX_WIDTH}")
+    try:
+        result = stored_envelope(stored, parse_index_option(options.get('log'), 'log'),
+                                 parse_index_option(options.get('segment'), 'segment'),
+                                 parse_float_option(options.get('start_s'), 'start_s'),
+                                 parse_float_option(options.get('end_s'), 'end_s'), fields, width)
+    except log_summary.SelectionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(content=json.dumps(result, separators=(',', ':')), media_type="application/json")
+
+
+@app.delete("/logs/{log_id}")
+async def delete_stored_log(log_id: str):
+    if not LOG_STORE.delete(log_id):
+        raise HTTPException(status_code=404, detail="Unknown or expired log handle")
+    return {'deleted': log_id}
+
+
+# ---------------------------------------------------------------------------
+# 异步任务：POST /jobs 排队，后台进程池解码，GET /jobs/{id} 查询进度（长轮询 / SSE）
+# ---------------------------------------------------------------------------
+
+_JOB_RUNNER = None
+
+
+def job_runner():
+    """任务存储 + 进程池（首次使用时创建，并重新排队上次未完成的任务）"""
+    global _JOB_RUNNER
+    if _JOB_RUNNER is None:
+        root = os.environ.get(JOBS_DIR_ENV) or os.path.join(tempfile.gettempdir(), 'bbl-decoder-jobs')
+        workers = safe_int(os.environ.get(JOB_WORKERS_ENV), max(1, (os.cpu_count() or 2) // 2))
+        _JOB_RUNNER = jobs.JobRunner(jobs.JobStore(root), execute_job, workers)
+        _JOB_RUNNER.start()
+    return _JOB_RUNNER
+
+
+def execute_job(root, job_id, owner):
+    """在工作进程中执行一个任务：认领任务、读取上传、按任务选项解码、写入结果；进度写入任务记录"""
+    store = jobs.JobStore(root)
+    if not store.claim(job_id, owner):  # 已被其他服务进程认领或已结束
+        return
+    job = store.get(job_id)
+    report = jobs.ProgressReporter(store, job_id)
+    options = job['options']
+    try:
+        with open(store.input_path(job_id), 'rb') as f:
+            bbl_bytes = f.read()
+        result = parse_bbl_to_json(bbl_bytes, features=options.get('features'), log=options.get('log'),
+                                   segment=options.get('segment'), progress=report)
+        index_decoded(bbl_bytes, result)
+        report('serialize')
+        store.finish(job_id, json.dumps(result, ensure_ascii=False, separators=(',', ':')).encode())
+    except Exception as e:
+        store.finish(job_id, error=str(e))
+
+
+def job_view(job):
+    """GET /jobs/{id} 的响应：状态、当前阶段、进度（bytes_done / bytes_total / frames 等）"""
+    view = {
+        'id': job['id'],
+        'state': job['state'],
+        'stage': job['stage'],
+        'progress': job['progress'],
+        'bytes': job['bytes'],
+        'created': job['created'],
+        'updated': job['updated'],
+    }
+    if job['error']:
+        view['error'] = job['error']
+    if job['state'] == jobs.DONE:
+        view['result_url'] = f"/jobs/{job['id']}/result"
+    return view
+
+
+def get_job(job_id):
+    job = job_runner().store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: Request):
+    """保存上传并排队，立即返回任务 id；选项（features / log / segment）与 /decode 相同"""
+    bbl_bytes, options = await read_bbl_upload(request)
+    job_options = {
+        'features': resolve_features(options.get('features')),
+        'log': parse_index_option(options.get('log'), 'log'),
+        'segment': parse_index_option(options.get('segment'), 'segment'),
+    }
+    runner = job_runner()
+    job_id = runner.store.create(bbl_bytes, job_options)
+    runner.submit(job_id)
+    return dict(job_view(runner.store.get(job_id)),
+                status_url=f"/jobs/{job_id}", events_url=f"/jobs/{job_id}/events")
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str, wait: float = 0, since: float = 0):
+    """任务状态；长轮询：wait 秒内等到 updated > since 或任务结束再返回"""
+    job = get_job(job_id)
+    deadline = asyncio.get_running_loop().time() + min(max(wait, 0), JOB_MAX_WAIT_S)
+    while job['updated'] <= since and job['state'] not in jobs.FINISHED \
+            and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(JOB_POLL_S)
+        job = get_job(job_id)
+    return job_view(job)
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """SSE：每次进度更新推送一条 progress 事件，任务结束时推送 done / failed 事件后关闭"""
+    get_job(job_id)
+
+    async def stream():
+        last_update, last_sent = None, asyncio.get_running_loop().time()
+        while True:
+            job = get_job(job_id)
+            now = asyncio.get_running_loop().time()
+            if job['updated'] != last_update:
+                last_update, last_sent = job['updated'], now
+                event = job['state'] if job['state'] in jobs.FINISHED else 'progress'
+                yield f"event: {event}\ndata: {json.dumps(job_view(job))}\n\n"
+                if job['state'] in jobs.FINISHED:
+                    return
+            elif now - last_sent >= JOB_KEEPALIVE_S:
+                last_sent = now
+                yield ": keepalive\n\n"
+            await asyncio.sleep(JOB_POLL_S)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    """任务结果（与 /decode 相同的 JSON）；未完成时 202 + 状态，失败时 409"""
+    job = get_job(job_id)
+    if job['state'] == jobs.FAILED:
+        raise HTTPException(status_code=409, detail=f"Job failed: {job['error']}")
+    if job['state'] != jobs.DONE:
+        return Response(content=json.dumps(job_view(job)), status_code=202, media_type="application/json")
+    with open(job_runner().store.result_path(job_id), 'rb') as f:
+        return Response(content=f.read(), media_type="application/json")
+
+
+# ---------------------------------------------------------------------------
+# 断点续传上传：POST /uploads 声明长度，PATCH 按偏移追加，HEAD 查询偏移；收完后自动作为 /jobs 任务解码
+# ---------------------------------------------------------------------------
+
+_UPLOAD_STORE = None
+
+
+def upload_store():
+    """暂存目录在任务目录下（同一文件系统，收完后直接移入任务目录）"""
+    global _UPLOAD_STORE
+    if _UPLOAD_STORE is None:
+        _UPLOAD_STORE = uploads.UploadStore(
+            os.path.join(job_runner().store.root, 'uploads'),
+            max_bytes=safe_int(os.environ.get(UPLOAD_STAGING_MB_ENV), uploads.DEFAULT_STAGING_MB) * 1024 * 1024,
+            ttl_s=safe_int(os.environ.get(UPLOAD_TTL_ENV), uploads.DEFAULT_TTL_S))
+    return _UPLOAD_STORE
+
+
+def upload_error(e):
+    """uploads 的错误转 HTTPException：未知 404，偏移不一致 409（带 Upload-Offset），校验失败 460，暂存区满 413"""
+    if isinstance(e, uploads.UploadNotFoundError):
+        return HTTPException(status_code=404, detail=str(e))
+    if isinstance(e, uploads.OffsetMismatchError):
+        return HTTPException(status_code=409, detail=str(e), headers={'Upload-Offset': str(e.offset)})
+    if isinstance(e, uploads.ChecksumMismatchError):
+        return HTTPException(status_code=460, detail=str(e))
+    if isinstance(e, uploads.StagingFullError):
+        return HTTPException(status_code=413, detail=str(e))
+    return HTTPException(status_code=400, detail=str(e))
+
+
+def upload_view(store, record):
+    view = {
+        'id': record['id'],
+        'state': record['state'],
+        'offset': record['offset'],
+        'length': record['length'],
+        'expires_in_s': store.expires_in(record),
+        'upload_url': f"/uploads/{record['id']}",
+    }
+    if record['job']:
+        view.update(job=record['job'], status_url=f"/jobs/{record['job']}",
+                    events_url=f"/jobs/{record['job']}/events")
+    return view
+
+
+def upload_headers(record):
+    return {'Upload-Offset': str(record['offset']), 'Upload-Length': str(record['length']),
+            'Cache-Control': 'no-store'}
+
+
+def submit_upload(store, record):
+    """收完的上传：校验完整文件，压缩文件先解包，然后移入任务目录并排队，返回任务 id
+    要读整个文件，在线程池中调用；先 store.claim，已被并发的最后一块认领时返回 None，失败时撤销认领
+    """
+    if not store.claim(record['id']):
+        return None
+    try:
+        store.verify(record['id'])
+        runner = job_runner()
+        path = store.part_path(record['id'])
+        with open(path, 'rb') as f:
+            head = f.read(4)
+        if head[:2] == transport.GZIP_MAGIC or head in (transport.ZSTD_MAGIC, transport.ZIP_MAGIC):
+            with open(path, 'rb') as f:
+                job_id = runner.store.create(transport.unpack_file(f.read(), max_upload_bytes()), record['options'])
+        else:
+            job_id = runner.store.adopt(path, record['options'])
+    except BaseException:
+        store.release(record['id'])
+        raise
+    store.mark_done(record['id'], job_id)
+    runner.submit(job_id)
+    return job_id
+
+
+@app.post("/uploads", status_code=201)
+async def create_upload(request: Request):
+    """
+    新建断点续传上传：Upload-Length 头为文件总字节数，可选 Upload-Checksum 校验完整文件
+    选项（features / log / segment）与 /jobs 相同，收完后按这些选项解码
+    """
+    length = safe_int(request.headers.get('Upload-Length'), -1)
+    if length <= 0:
+        raise HTTPException(status_code=400, detail="Upload-Length header must be a positive integer")
+    if length > max_upload_bytes():
+        raise HTTPException(status_code=413, detail=f"Upload exceeds {max_upload_bytes() // (1024 * 1024)} MB")
+    options = request.query_params
+    job_options = {
+        'features': resolve_features(options.get('features')),
+        'log': parse_index_option(options.get('log'), 'log'),
+        'segment': parse_index_option(options.get('segment'), 'segment'),
     }
+    store = upload_store()
+    try:
+        record = store.create(length, job_options, uploads.parse_checksum(request.headers.get('Upload-Checksum')))
+    except uploads.UploadError as e:
+        raise upload_error(e)
+    return Response(content=json.dumps(upload_view(store, record)), status_code=201, media_type="application/json",
+                    headers=dict(upload_headers(record), Location=f"/uploads/{record['id']}"))
+
+
+@app.head("/uploads/{upload_id}")
+async def upload_offset(upload_id: str):
+    """已收到的偏移（Upload-Offset 头），连接中断后客户端从这里继续"""
+    try:
+        record = upload_store().require(upload_id)
+    except uploads.UploadError as e:
+        raise upload_error(e)
+    return Response(headers=upload_headers(record))
+
+
+@app.get("/uploads/{upload_id}")
+async def upload_status(upload_id: str):
+    store = upload_store()
+    try:
+        record = store.require(upload_id)
+    except uploads.UploadError as e:
+        raise upload_error(e)
+    return Response(content=json.dumps(upload_view(store, record)), media_type="application/json",
+                    headers=upload_headers(record))
+
+
+@app.patch("/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request):
+    """
+    追加分块：Upload-Offset 头必须等于已收到的偏移，body 为原始字节，可选 Upload-Checksum 校验本块
+    收完最后一块时自动创建 /jobs 任务，响应中带 job / status_url
+    """
+    offset = safe_int(request.headers.get('Upload-Offset'), -1)
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="Upload-Offset header must be a non-negative integer")
+    store = upload_store()
+    try:
+        checksum = uploads.parse_checksum(request.headers.get('Upload-Checksum'))
+        with store.writer(upload_id, offset, checksum) as write:
+            async for piece in request.stream():
+                write(piece)
+        record = store.require(upload_id)
+        if record['offset'] == record['length']:
+            # 并发的另一个请求正在提交时（返回 None）part 文件可能已被移走，直接返回收完时的记录
+            if await run_in_threadpool(submit_upload, store, record) is not None:
+                record = store.require(upload_id)
+    except uploads.UploadError as e:
+        raise upload_error(e)
+    except transport.TransportError as e:
+        raise transport_error(e)
+    return Response(content=json.dumps(upload_view(store, record)), media_type="application/json",
+                    headers=upload_headers(record))
+
+
+@app.get("/uploads/{upload_id}/meta")
+async def upload_prefix_meta(upload_id: str):
+    """已收到的连续前缀的摘要表（I 帧快速扫描）：上传未完成时就能看到 log / 段落；压缩上传不支持"""
+    store = upload_store()
+    try:
+        record = store.require(upload_id)
+    except uploads.UploadError as e:
+        raise upload_error(e)
+    if record['state'] != uploads.RECEIVING:
+        raise HTTPException(status_code=409, detail="Upload is complete; use the job result")
+
+    def scan():
+        # 线程池中运行：只读 magic 和逐个 log 的字节，不把整个前缀读进内存
+        with open(store.part_path(upload_id), 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            magic = f.read(4)
+            if magic[:2] == transport.GZIP_MAGIC or magic in (transport.ZSTD_MAGIC, transport.ZIP_MAGIC):
+                return size, None
+            return size, scan_file_prefix(f, size) if size else []
+
+    try:
+        offset, summaries = await run_in_threadpool(scan)
+    except FileNotFoundError:  # 扫描前最后一块刚好收完
+        raise HTTPException(status_code=409, detail="Upload is complete; use the job result")
+    if summaries is None:
+        raise HTTPException(status_code=409, detail="Prefix summary is not available for compressed uploads")
+    return {'offset': offset, 'length': record['length'], 'partial': True,
+            'logs_found': len(summaries), 'logs': log_summary.describe(summaries)}
+
+
+@app.delete("/uploads/{upload_id}")
+async def delete_upload(upload_id: str):
+    if not upload_store().delete(upload_id):
+        raise HTTPException(status_code=404, detail="Unknown or expired upload")
+    return {'deleted': upload_id}
+
+
+# ---------------------------------------------------------------------------
+# 批量解码：/decode/batch 多文件或 zip，进程池并行，每个 log 解完即输出一行 NDJSON
+# ---------------------------------------------------------------------------
+
+def iter_batch_files(files):
+    """展开上传的 (文件名, 文件对象)：zip 按成员逐个读取（只取 BATCH_EXTENSIONS），其他文件原样；yield (名称, 字节)"""
+    for name, fileobj in files:
+        if zipfile.is_zipfile(fileobj):
+            fileobj.seek(0)
+            with zipfile.ZipFile(fileobj) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir() and info.filename.lower().endswith(BATCH_EXTENSIONS):
+                        yield f"{name}/{info.filename}", archive.read(info)
+        else:
+            fileobj.seek(0)
+            yield name, fileobj.read()
+
+
+def next_batch_file(files, with_digest=False):
+    """iter_batch_files 的下一个文件，切分成各 log 的字节；返回 (名称, [log 字节], sha256 或 None)，没有更多文件时为 None
+    读 zip 成员、找 log 和算哈希都要遍历整个文件，在线程池中调用，不占用事件循环
+    """
+    item = next(files, None)
+    if item is None:
+        return None
+    name, data = item
+    digest = hashlib.sha256(data).hexdigest() if with_digest else None
+    return name, [data[start:end] for start, end in find_all_logs(data)], digest
+
+
+def decode_batch_item(log_bytes, features, sha256=None, log=1):
+    """工作进程中解码单个 log，返回紧凑 JSON 字符串（序列化也在工作进程中完成）
+    sha256 为所在文件的哈希（启用索引时），log 为文件中的 log 序号
+    """
+    result = parse_bbl_to_json(log_bytes, features=features)
+    if sha256 is not None:
+        index_decoded(log_bytes, result, sha256=sha256, log=log)
+    return json.dumps(result, ensure_ascii=False, separators=(',', ':'))
+
+
+async def read_batch_upload(request: Request):
+    """multipart 的所有文件字段，或原始 body（zip / 单个 BBL）；返回 ([(文件名, 文件对象)], 选项)"""
+    import io
+
+    request = await decoded_request(request)
+    options = dict(request.query_params)
+    if 'multipart/form-data' in request.headers.get('content-type', ''):
+        form = await request.form()
+        files = [(v.filename or k, v.file) for k, v in form.multi_items() if not isinstance(v, str)]
+        options.update({k: v for k, v in form.multi_items() if isinstance(v, str)})
+    else:
+        body = await request.body()
+        files = [('upload', io.BytesIO(body))] if body else []
+    if not files:
+        raise HTTPException(status_code=400, detail="No files in request")
+    return files, options
+
+
+@app.post("/decode/batch")
+async def decode_batch(request: Request):
+    """
+    批量解码：每个文件（zip 内每个成员）中的每个 log 输出一行 NDJSON，按完成顺序流式返回
+    {"file", "log", "logs_in_file", "result": <与 /decode 相同>} 或 {..., "error"}，最后一行 {"done": true, 统计}
+    同时在途的 log 数有上限，服务端内存只保留在途的部分
+    """
+    files, options = await read_batch_upload(request)
+    requested = resolve_features(options.get('features'))
+    runner = job_runner()
+    max_in_flight = runner.max_workers * BATCH_IN_FLIGHT_PER_WORKER
+
+    def line(item, future):
+        head = json.dumps(item, ensure_ascii=False, separators=(',', ':'))[:-1]
+        if future.exception() is not None:
+            return head + ',' + json.dumps({'error': str(future.exception())}, ensure_ascii=False)[1:] + '\n'
+        return head + ',"result":' + future.result() + '}\n'
+
+    async def stream():
+        pending = {}
+        counts = {'files': 0, 'logs': 0, 'errors': 0}
+
+        async def drain(limit):
+            while len(pending) > limit:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    counts['logs'] += 1
+                    counts['errors'] += future.exception() is not None
+                    yield line(pending.pop(future), future)
+
+        try:
+            items = iter_batch_files(files)
+            with_digest = log_index_db() is not None
+            while (item := await run_in_threadpool(next_batch_file, items, with_digest)) is not None:
+                name, logs, digest = item
+                counts['files'] += 1
+                for k in range(len(logs)):
+                    future = asyncio.wrap_future(runner.pool().submit(decode_batch_item, logs[k], requested,
+                                                                      digest, k + 1))
+                    logs[k] = None  # 已交给工作进程，不再保留
+                    pending[future] = {'file': name, 'log': k + 1, 'logs_in_file': len(logs)}
+                    async for text in drain(max_in_flight - 1):
+                        yield text
+                del item, logs
+            async for text in drain(0):
+                yield text
+            yield json.dumps(dict({'done': True}, **counts)) + '\n'
+        finally:
+            for future in pending:
+                future.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.post("/export")
+async def export_log(request: Request):
+    """
+    全分辨率导出：选中 log 的所有字段逐帧流式输出，format=csv（与 blackbox_decode 相同的 CSV）或 ndjson
+    fields（逗号分隔字段名）、start_s / end_s（相对 log 首帧的秒数）、log（默认最长的 log）
+    """
+    bbl_bytes, options = await read_bbl_upload(request)
+    fmt = options.get('format', 'csv')
+    if fmt not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(export.FORMATS)}")
+    chunks = iter_log_export(bbl_bytes, fmt, parse_index_option(options.get('log'), 'log'),
+                             parse_feature_option(options.get('fields')),
+                             parse_float_option(options.get('start_s'), 'start_s'),
+                             parse_float_option(options.get('end_s'), 'end_s'))
+    del bbl_bytes
+    try:
+        first = next(chunks, '')  # 选择 log / 校验字段，出错时还能返回 400
+    except (log_summary.SelectionError, export.ExportError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(itertools.chain([first], chunks), media_type=export.MEDIA_TYPES[fmt],
+                             headers={'Content-Disposition': f'attachment; filename="export.{fmt}"'})
+
+
+# ---------------------------------------------------------------------------
+# 元数据索引：设置 BBL_INDEX_DB 后完整解码结果写入 SQLite 索引，GET /index 查询（不读取 BBL）
+# ---------------------------------------------------------------------------
+
+_LOG_INDEX = None
+_INDEX_WRITER = None
+
+
+def log_index_db():
+    """BBL_INDEX_DB 指定的索引，未设置时返回 None"""
+    global _LOG_INDEX
+    path = os.environ.get(INDEX_DB_ENV)
+    if not path:
+        return None
+    if _LOG_INDEX is None or _LOG_INDEX.path != path:
+        _LOG_INDEX = log_index.LogIndex(path)
+    return _LOG_INDEX
+
+
+def index_record(result, sha256, log, log_bytes, source=None):
+    """解码结果的索引记录；不是整个 log 的默认解码（指定了段落、缺 cli / stats）时返回 None"""
+    if 'cli' not in result or 'stats' not in result or result['meta'].get('segment_used') != 'longest':
+        return None
+    return log_index.record(result, sha256, log, hashlib.sha256(log_bytes).hexdigest(), source)
+
+
+def index_decoded(bbl_bytes, result, sha256=None, log=None, background=False):
+    """启用索引时写入解码结果：服务进程经后台线程攒批写入（background），工作进程直接写入（一个事务）
+    sha256 / log 默认为 bbl_bytes 的哈希和结果中的 log_used；索引出错只打印警告，不影响解码结果
+    """
+    global _INDEX_WRITER
+    index = log_index_db()
+    if index is None:
+        return
+    try:
+        if log is None:
+            log = result['meta']['log_used']
+            start, end = find_all_logs(bbl_bytes)[log - 1]
+            log_bytes = memoryview(bbl_bytes)[start:end]
+        else:
+            log_bytes = bbl_bytes
+        rec = index_record(result, sha256 or hashlib.sha256(bbl_bytes).hexdigest(), log, log_bytes)
+        if rec is None:
+            return
+        if background:
+            if _INDEX_WRITER is None or _INDEX_WRITER.index is not index:
+                _INDEX_WRITER = log_index.IndexWriter(index)
+            _INDEX_WRITER.add(rec)
+        else:
+            index.add([rec])
+    except Exception as e:
+        print(f"[BBL Decoder] Index skipped: {e}", file=sys.stderr)
+
+
+@app.get("/index")
+async def query_index(request: Request):
+    """
+    元数据索引查询（log_index.LogIndex.query）：where（可重复，如 board_name=JHEF745V2、fw_version~4.5.*、
+    thr.gyro_rms_max>20）、throttle（thr. 条件的最低油门 %）、group_by / agg（分组聚合）、order、limit、full
+    """
+    index = log_index_db()
+    if index is None:
+        raise HTTPException(status_code=404, detail=f"Log index is not enabled (set {INDEX_DB_ENV})")
+    options = request.query_params
+    try:
+        limit = int(options.get('limit') or log_index.DEFAULT_LIMIT)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="limit must be an integer")
+    try:
+        return index.query(options.getlist('where'), parse_float_option(options.get('throttle'), 'throttle') or 0,
+                           parse_feature_option(options.get('group_by')) or [],
+                           parse_feature_option(options.get('agg')) or ['count'], options.get('order'), limit,
+                           parse_bool_option(options.get('full', False)))
+    except log_index.QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @app.get("/health")
@@ -766,7 +2102,17 @@ if __name__ == "__main__":
     import sys
     if len(sys.argv) < 2:
         print("Usage: python3 entry.py <bbl_file>")
+        print("       python3 entry.py bulk <dirs/files/globs...> --out DIR [--format json|npz|arrow|parquet]")
+        print("       python3 entry.py export <bbl_file> [--format csv|ndjson] [--fields ...] [-o FILE]")
+        print("       python3 entry.py index <index.sqlite> [--where FIELD<op>VALUE ...] [--group-by ... --agg ...]")
         sys.exit(1)
+    if sys.argv[1] == 'bulk':
+        import bulk_decode
+        sys.exit(bulk_decode.main(sys.argv[2:]))
+    if sys.argv[1] == 'export':
+        sys.exit(export.main(sys.argv[2:]))
+    if sys.argv[1] == 'index':
+        sys.exit(log_index.main(sys.argv[2:]))
 
     bbl_path = sys.argv[1]
     with open(bbl_path, 'rb') as f:
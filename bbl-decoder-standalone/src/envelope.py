@@ -0,0 +1,75 @@
+"""
+多分辨率包络金字塔：图表缩放用的 min / max / mean 细节层级，GET /logs/{id}/envelope 按时间窗口和像素宽度取层级
+- 第 L 层每个 bin 覆盖 2^L 个连续帧，逐层两两合并（每层分辨率减半），整列向量化构建，总计算量约为 2 倍列长
+- 第 0 层就是全速率原始列，不另存；金字塔按字段构建并缓存在句柄中（float32，约为原始列的 1.5 倍）；
+  超出 float32 24 位尾数的列（time / loopIteration 等微秒、计数列）用 float64，min / max / mean 不被舍入
+- bin 按帧数划分而不是按时间：bin 的时间取其首帧的 time，缺帧区间不会产生空 bin
+- 查询选择 bin 数不超过像素宽度的最细层级，响应大小只与像素宽度有关，与窗口长度无关
+"""
+
+import numpy as np
+
+# 未指定 width 时的像素宽度，以及 width 的上限
+DEFAULT_WIDTH = 1000
+MAX_WIDTH = 10000
+# float32 能精确表示的整数范围（24 位尾数）
+FLOAT32_EXACT = 1 << 24
+
+
+def _pairwise(values, op):
+    """相邻两项合并（op 为 np.minimum / np.maximum / np.add），奇数长度时最后一项单独成 bin"""
+    even = len(values) - len(values) % 2
+    merged = op(values[0:even:2], values[1:even:2])
+    if len(values) % 2:
+        merged = np.append(merged, values[-1:])
+    return merged
+
+
+class Pyramid:
+    """一列的包络金字塔：levels[L - 1] 为第 L 层的 (min, max, mean)，直到只剩一个 bin"""
+
+    def __init__(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self.frames = len(values)
+        self.levels = []
+        self.dtype = storage_dtype(values)
+        lo = hi = values.astype(self.dtype)
+        total = values
+        size = 1
+        while len(total) > 1:
+            lo = _pairwise(lo, np.minimum)
+            hi = _pairwise(hi, np.maximum)
+            total = _pairwise(total, np.add)
+            size *= 2
+            counts = np.minimum(size, self.frames - size * np.arange(len(total)))  # 最后一个 bin 可能不满
+            self.levels.append((lo, hi, (total / counts).astype(self.dtype)))
+
+
+def storage_dtype(values):
+    """金字塔的存储类型：所有值都能被 float32 精确表示且绝对值 < 2^24 时用 float32，否则 float64"""
+    if not len(values):
+        return np.float32
+    small = np.abs(values).max() < FLOAT32_EXACT  # NaN 时为 False
+    return np.float32 if small and np.array_equal(values.astype(np.float32), values) else np.float64
+
+
+def level_for(frames, width):
+    """bin 数不超过 width 的最细层级：最小的 L 使 ceil(frames / 2^L) <= width"""
+    level = 0
+    while (frames + (1 << level) - 1) >> level > width:
+        level += 1
+    return level
+
+
+def bin_range(first, last, level):
+    """帧区间 [first, last) 在第 level 层覆盖的 bin 区间 [lo, hi)（两端的 bin 可能只部分落在区间内）"""
+    return first >> level, (last + (1 << level) - 1) >> level
+
+
+def window(pyramid, values, level, lo, hi):
+    """第 level 层 bin [lo, hi) 的 (min, max, mean)；第 0 层直接取原始列 values"""
+    if level == 0:
+        col = np.asarray(values[lo:hi], dtype=np.float64)
+        return col, col, col
+    mins, maxs, means = pyramid.levels[level - 1]
+    return mins[lo:hi], maxs[lo:hi], means[lo:hi]
@@ -0,0 +1,112 @@
+"""
+全分辨率导出：逐帧输出所有解码字段（CSV / NDJSON），/export 和 python3 entry.py export 共用
+- 帧来自 resync.iter_frames，边解码边输出，已输出的帧不保留，内存占用与 log 长度无关
+- CSV 与 blackbox_decode 相同：逗号 + 空格分隔，time 列名为 "time (us)"，S 帧字段在第一个 S 帧之前为空
+- fields 选择列（默认全部字段），start_s / end_s 为相对 log 首帧的时间范围（秒）
+"""
+
+import argparse
+import contextlib
+import json
+import sys
+
+FORMATS = ('csv', 'ndjson')
+MEDIA_TYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+# 每个输出块包含的帧数
+CHUNK_FRAMES = 1024
+
+
+class ExportError(ValueError):
+    pass
+
+
+def select_columns(field_names, fields=None):
+    """fields（字段名列表，None 为全部）对应的列序号；未知字段抛 ExportError"""
+    if not fields:
+        return list(range(len(field_names)))
+    idx = {name: j for j, name in enumerate(field_names)}
+    unknown = [f for f in fields if f not in idx]
+    if unknown:
+        raise ExportError(f"Unknown field(s): {', '.join(unknown)}")
+    return [idx[f] for f in fields]
+
+
+def csv_header(names):
+    return ', '.join('time (us)' if name == 'time' else name for name in names) + '\n'
+
+
+def iter_export(frames, field_names, fmt='csv', fields=None, start_s=None, end_s=None):
+    """frames 为主帧迭代器，yield 文本块：CSV 先输出表头，之后每 CHUNK_FRAMES 帧一块"""
+    if fmt not in FORMATS:
+        raise ExportError(f"Unknown export format: {fmt} (available: {', '.join(FORMATS)})")
+    if 'time' not in field_names:
+        raise ExportError("Log has no time field")
+    columns = select_columns(field_names, fields)
+    names = [field_names[j] for j in columns]
+    time_j = field_names.index('time')
+    if fmt == 'csv':
+        yield csv_header(names)
+
+    lo = hi = None
+    lines = []
+    for frame in frames:
+        data = frame.data
+        time_us = data[time_j]
+        if lo is None:
+            lo = time_us + start_s * 1_000_000 if start_s is not None else time_us
+            hi = time_us + end_s * 1_000_000 if end_s is not None else float('inf')
+        if time_us < lo:
+            continue
+        if time_us > hi:
+            break
+        values = [data[j] for j in columns]
+        if fmt == 'csv':
+            lines.append(', '.join(map(str, values)))
+        else:
+            lines.append(json.dumps(dict(zip(names, [None if v == '' else v for v in values])),
+                                    separators=(',', ':')))
+        if len(lines) >= CHUNK_FRAMES:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def main(argv=None):
+    try:
+        from . import entry
+    except ImportError:  # 直接运行 python3 entry.py export
+        import entry
+
+    ap = argparse.ArgumentParser(prog='entry.py export', description='全分辨率导出 BBL 的所有字段（CSV / NDJSON）')
+    ap.add_argument('input', help='BBL 文件')
+    ap.add_argument('--format', default='csv', choices=FORMATS)
+    ap.add_argument('--fields', help='逗号分隔的字段名，默认全部')
+    ap.add_argument('--start-s', type=float, help='起始时间（相对 log 首帧，秒）')
+    ap.add_argument('--end-s', type=float, help='结束时间（相对 log 首帧，秒）')
+    ap.add_argument('--log', type=int, help='log 序号（1 起），默认最长的 log')
+    ap.add_argument('-o', '--output', help='输出文件，默认 stdout')
+    args = ap.parse_args(argv)
+
+    fields = [f.strip() for f in args.fields.split(',') if f.strip()] if args.fields else None
+    with open(args.input, 'rb') as f:
+        bbl_bytes = f.read()
+    out = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        # 解码日志打到 stderr，stdout 只有导出数据
+        with contextlib.redirect_stdout(sys.stderr):
+            chunks = entry.iter_log_export(bbl_bytes, args.format, args.log, fields, args.start_s, args.end_s)
+            for chunk in chunks:
+                out.write(chunk)
+    except ValueError as e:  # ExportError / SelectionError
+        ap.error(str(e))
+    except BrokenPipeError:  # | head
+        pass
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
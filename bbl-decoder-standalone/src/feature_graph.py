@@ -0,0 +1,117 @@
+"""
+特征依赖图：统计/事件/帧构建都是图中的节点，按需惰性计算并缓存中间结果
+客户端只请求需要的特征，计算量与请求成正比（共享的中间列只算一次）
+"""
+
+
+class FeatureRegistry:
+    """节点注册表。带 section 的节点是可供客户端选择的公开特征"""
+
+    def __init__(self):
+        self.nodes = {}
+
+    def node(self, name, deps=(), section=None, key=None):
+        """
+        注册节点，被装饰函数按 deps 顺序接收依赖节点的值
+        - section: 输出到结果中的哪个块（cli / stats / events / frames），None 为内部节点
+        - key: 块内的键名；为 None 时节点返回 dict，合并进该块
+        """
+        def decorator(fn):
+            if name in self.nodes:
+                raise ValueError(f"Duplicate feature node: {name}")
+            self.nodes[name] = (tuple(deps), fn, section, key)
+            return fn
+        return decorator
+
+    def public(self):
+        """所有公开特征名（按注册顺序）"""
+        return [name for name, (_, _, section, _) in self.nodes.items() if section]
+
+    def sections(self):
+        sections = []
+        for name in self.public():
+            section = self.nodes[name][2]
+            if section not in sections:
+                sections.append(section)
+        return sections
+
+    def resolve(self, requested):
+        """
+        把客户端请求展开为公开特征列表（保持注册顺序）
+        requested: None / 'all' 表示全部；也可以是特征名或块名（stats、events…）的列表
+        """
+        public = self.public()
+        if requested is None:
+            return public
+        if isinstance(requested, str):
+            requested = [requested]
+
+        wanted = set()
+        for item in requested:
+            item = str(item).strip()
+            if not item:
+                continue
+            if item == 'all':
+                wanted.update(public)
+            elif item in self.sections():
+                wanted.update(n for n in public if self.nodes[n][2] == item)
+            elif item in public:
+                wanted.add(item)
+            else:
+                available = self.sections() + [n for n in public if n not in self.sections()]
+                raise ValueError(f"Unknown feature: {item} (available: {', '.join(available)})")
+        return [n for n in public if n in wanted]
+
+
+class FeatureGraph:
+    """一次解析的求值上下文：输入值 + 已计算节点的缓存"""
+
+    def __init__(self, registry, **inputs):
+        self._registry = registry
+        self._cache = dict(inputs)
+        self._pending = set()
+
+    def get(self, name):
+        if name in self._cache:
+            return self._cache[name]
+        if name not in self._registry.nodes:
+            raise KeyError(f"Unknown feature node: {name}")
+        if name in self._pending:
+            raise RuntimeError(f"Feature dependency cycle at: {name}")
+
+        deps, fn, _, _ = self._registry.nodes[name]
+        self._pending.add(name)
+        try:
+            value = fn(*(self.get(d) for d in deps))
+        finally:
+            self._pending.discard(name)
+        self._cache[name] = value
+        return value
+
+    def items(self):
+        """输入值和已计算节点（name, value）"""
+        return list(self._cache.items())
+
+    def fork(self, **inputs):
+        """复制当前缓存的新求值上下文，inputs 覆盖 / 追加输入；用于在已解析的 log 上按不同选项重新计算下游节点"""
+        cache = dict(self._cache)
+        cache.update(inputs)
+        return FeatureGraph(self._registry, **cache)
+
+    def computed(self):
+        """已计算的节点名（调试用）"""
+        return [name for name in self._cache if name in self._registry.nodes]
+
+    def collect(self, names):
+        """计算公开特征并按 section/key 组装成结果块"""
+        blocks = {}
+        for name in names:
+            _, _, section, key = self._registry.nodes[name]
+            value = self.get(name)
+            if section == key:
+                blocks[section] = value
+            elif key is None:
+                blocks.setdefault(section, {}).update(value)
+            else:
+                blocks.setdefault(section, {})[key] = value
+        return blocks
@@ -0,0 +1,350 @@
+"""
+滤波器仿真：用本机实际的滤波前 gyro 噪声评估候选的 gyro / D-term 滤波配置
+滤波器均为线性时不变（动态滤波按本段平均油门 / 实测噪声峰近似），
+因此在频域计算：候选的 |H(f)|^2 乘以滤波前 gyro 的 PSD，一次批量评估所有候选
+滤波器公式与 Betaflight 一致：PT1/PT2/PT3、biquad 低通、陷波、动态陷波
+RPM 滤波不在仿真范围内（需要逐帧电机转速），结果按“未启用 RPM 滤波”解读
+"""
+
+import itertools
+
+import numpy as np
+
+# 候选数量上限，避免单次请求占用过多内存
+MAX_CANDIDATES = 2000
+# 噪声统计频段下限：低于此频率主要是操控信号
+NOISE_BAND_MIN_HZ = 100
+# 相位延迟的参考频率
+DELAY_REF_HZ = 100
+# Welch PSD 的 FFT 长度
+PSD_NFFT = 1024
+
+# Betaflight lowpass 类型编号（gyro_lpf1_type 等）
+FILTER_PT1, FILTER_BIQUAD, FILTER_PT2, FILTER_PT3 = 0, 1, 2, 3
+BIQUAD_Q = 1 / np.sqrt(2)
+
+# Betaflight debug_mode GYRO_SCALED：debug[0..2] 为滤波前 gyro
+DEBUG_GYRO_SCALED = 6
+
+# 可仿真的设置及默认值（与 CLI 名称一致）；列表值为 [a, b]
+FILTER_DEFAULTS = {
+    'gyro_lpf1_type': FILTER_PT1,
+    'gyro_lpf1_static_hz': 250,
+    'gyro_lpf1_dyn_hz': [250, 500],
+    'gyro_lpf1_dyn_expo': 5,
+    'gyro_lpf2_type': FILTER_PT1,
+    'gyro_lpf2_static_hz': 500,
+    'gyro_notch_hz': [0, 0],
+    'gyro_notch_cutoff': [0, 0],
+    'dyn_notch_count': 3,
+    'dyn_notch_q': 300,
+    'dyn_notch_min_hz': 100,
+    'dyn_notch_max_hz': 600,
+    'dterm_lpf1_type': FILTER_PT1,
+    'dterm_lpf1_static_hz': 75,
+    'dterm_lpf1_dyn_hz': [75, 150],
+    'dterm_lpf1_dyn_expo': 5,
+    'dterm_lpf2_type': FILTER_PT1,
+    'dterm_lpf2_static_hz': 150,
+    'dterm_notch_hz': 0,
+    'dterm_notch_cutoff': 0,
+}
+
+# 旧版本固件 header 名称
+FILTER_HEADER_ALIASES = {
+    'gyro_lpf1_static_hz': 'gyro_lowpass_hz',
+    'gyro_lpf2_static_hz': 'gyro_lowpass2_hz',
+    'dterm_lpf1_static_hz': 'dterm_lpf_hz',
+    'dterm_lpf2_static_hz': 'dterm_lpf2_hz',
+}
+
+
+def _setting_value(key, value):
+    """把 header / 请求中的值规范化为 float 或 [float, float]"""
+    default = FILTER_DEFAULTS[key]
+    if isinstance(value, str):
+        value = [v.strip() for v in value.split(',')] if ',' in value else value.strip()
+    if isinstance(default, list):
+        if not isinstance(value, (list, tuple)):
+            value = [value, 0]
+        if len(value) < 2:
+            value = list(value) + [0]
+        return [float(value[0]), float(value[1])]
+    if isinstance(value, (list, tuple)):
+        value = value[0]
+    return float(value)
+
+
+def settings_from_headers(headers):
+    """从 log header 读取当前滤波配置，缺失项使用默认值"""
+    settings = {}
+    for key in FILTER_DEFAULTS:
+        value = headers.get(key, headers.get(FILTER_HEADER_ALIASES.get(key, ''), None))
+        try:
+            settings[key] = _setting_value(key, FILTER_DEFAULTS[key] if value in (None, '') else value)
+        except (ValueError, TypeError):
+            settings[key] = _setting_value(key, FILTER_DEFAULTS[key])
+    return settings
+
+
+def _grid_values(key, values):
+    """grid 中单个键的取值列表；列表型设置（如 [min, max]）单独给出时视为一个取值"""
+    if not isinstance(values, (list, tuple)):
+        return [values]
+    if isinstance(FILTER_DEFAULTS[key], list) and values and not isinstance(values[0], (list, tuple, str)):
+        return [values]
+    return list(values)
+
+
+def expand_candidates(candidates=None, grid=None):
+    """
+    候选列表：candidates 为若干设置覆盖项（dict），grid 为 {key: [取值...]} 的笛卡尔积
+    返回覆盖项列表；未知的键或非法值抛出 ValueError
+    """
+    overrides = [dict(c) for c in (candidates or [])]
+    if grid:
+        unknown = [k for k in grid if k not in FILTER_DEFAULTS]
+        if unknown:
+            raise ValueError(f"Unknown filter setting: {unknown[0]}")
+        keys = list(grid.keys())
+        values = [_grid_values(k, grid[k]) for k in keys]
+        total = int(np.prod([len(v) for v in values]))
+        if total > MAX_CANDIDATES:
+            raise ValueError(f"Grid expands to {total} candidates (max {MAX_CANDIDATES})")
+        overrides.extend(dict(zip(keys, combo)) for combo in itertools.product(*values))
+    if len(overrides) > MAX_CANDIDATES:
+        raise ValueError(f"Too many candidates: {len(overrides)} (max {MAX_CANDIDATES})")
+
+    for override in overrides:
+        for key, value in list(override.items()):
+            if key not in FILTER_DEFAULTS:
+                raise ValueError(f"Unknown filter setting: {key}")
+            try:
+                override[key] = _setting_value(key, value)
+            except (ValueError, TypeError):
+                raise ValueError(f"Invalid value for {key}: {value!r}")
+    return overrides
+
+
+def prefilter_gyro(columns_by_name, headers):
+    """
+    选择滤波前 gyro：优先 gyroUnfilt，其次 debug_mode=GYRO_SCALED 的 debug[0..2]，
+    都没有时退回已滤波的 gyroADC（仿真结果偏乐观）
+    columns_by_name: 字段名 -> 列（可调用，按需取列）
+    返回 (gyro (3, n) 或 None, source)
+    """
+    sources = [('gyroUnfilt', [f'gyroUnfilt[{i}]' for i in range(3)])]
+    try:
+        debug_mode = int(headers.get('debug_mode', -1))
+    except (ValueError, TypeError):
+        debug_mode = -1
+    if debug_mode == DEBUG_GYRO_SCALED:
+        sources.append(('debug_gyro_scaled', [f'debug[{i}]' for i in range(3)]))
+    sources.append(('gyroADC', [f'gyroADC[{i}]' for i in range(3)]))
+
+    for source, fields in sources:
+        cols = [columns_by_name(f) for f in fields]
+        if all(c is not None for c in cols):
+            return np.stack(cols), source
+    return None, None
+
+
+def welch_psd(x, sample_rate, nfft=PSD_NFFT):
+    """
+    单边 PSD（Welch，Hann 窗，50% 重叠），沿最后一维，
+    返回 (freqs, psd)，满足 sum(psd) * df ≈ 方差
+    """
+    x = np.asarray(x, dtype=np.float64)
+    n = x.shape[-1]
+    nfft = int(min(nfft, 2 ** int(np.floor(np.log2(max(n, 16))))))
+    hop = nfft // 2
+    window = np.hanning(nfft)
+    segments = np.lib.stride_tricks.sliding_window_view(x, nfft, axis=-1)[..., ::hop, :]
+    segments = segments - segments.mean(axis=-1, keepdims=True)
+    spectrum = np.fft.rfft(segments * window, axis=-1)
+    psd = (np.abs(spectrum) ** 2).mean(axis=-2) / (sample_rate * np.sum(window ** 2))
+    psd[..., 1:-1] *= 2
+    return np.fft.rfftfreq(nfft, 1 / sample_rate), psd
+
+
+def _pt_response(ftype, cutoff, fs, z1):
+    """PT1/PT2/PT3：cutoff (C,)，z1 = e^{-jw} (F,)，返回 (C, F)"""
+    order = {FILTER_PT1: 1, FILTER_PT2: 2, FILTER_PT3: 3}[ftype]
+    correction = 1 / np.sqrt(2 ** (1 / order) - 1) if order > 1 else 1.0
+    rc = 1 / (2 * np.pi * correction * np.maximum(cutoff, 1e-6))
+    dt = 1 / fs
+    k = (dt / (rc + dt))[:, None]
+    return (k / (1 - (1 - k) * z1[None, :])) ** order
+
+
+def _biquad_response(b, a, z1):
+    b0, b1, b2 = (v[:, None] for v in b)
+    a0, a1, a2 = (v[:, None] for v in a)
+    z2 = z1 * z1
+    return (b0 + b1 * z1 + b2 * z2) / (a0 + a1 * z1 + a2 * z2)
+
+
+def _biquad_lowpass(cutoff, fs, z1):
+    omega = 2 * np.pi * np.minimum(cutoff, fs * 0.49) / fs
+    sn, cs = np.sin(omega), np.cos(omega)
+    alpha = sn / (2 * BIQUAD_Q)
+    b0 = (1 - cs) / 2
+    return _biquad_response((b0, 1 - cs, b0), (1 + alpha, -2 * cs, 1 - alpha), z1)
+
+
+def notch_response(center, q, fs, z1):
+    """陷波：center/q 为 (C,)；center <= 0 的候选为直通"""
+    center = np.asarray(center, dtype=np.float64)
+    q = np.maximum(np.asarray(q, dtype=np.float64), 1e-3)
+    omega = 2 * np.pi * np.clip(center, 1.0, fs * 0.49) / fs
+    sn, cs = np.sin(omega), np.cos(omega)
+    alpha = sn / (2 * q)
+    one = np.ones_like(omega)
+    h = _biquad_response((one, -2 * cs, one), (1 + alpha, -2 * cs, 1 - alpha), z1)
+    return np.where((center > 0)[:, None], h, 1.0)
+
+
+def notch_q(center, cutoff):
+    """Betaflight filterGetNotchQ：由中心频率和截止频率求 Q"""
+    center = np.asarray(center, dtype=np.float64)
+    cutoff = np.asarray(cutoff, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        q = center * cutoff / (center * center - cutoff * cutoff)
+    return np.where((center > cutoff) & (cutoff > 0), q, 0.0)
+
+
+def lowpass_response(ftype, cutoff, fs, z1):
+    """按候选各自的类型计算低通响应；cutoff <= 0 为关闭"""
+    ftype = np.asarray(ftype).astype(int)
+    cutoff = np.asarray(cutoff, dtype=np.float64)
+    h = np.ones((len(cutoff), len(z1)), dtype=np.complex128)
+    for t in (FILTER_PT1, FILTER_BIQUAD, FILTER_PT2, FILTER_PT3):
+        sel = (ftype == t) & (cutoff > 0)
+        if not sel.any():
+            continue
+        if t == FILTER_BIQUAD:
+            h[sel] = _biquad_lowpass(cutoff[sel], fs, z1)
+        else:
+            h[sel] = _pt_response(t, cutoff[sel], fs, z1)
+    return h
+
+
+def dyn_lowpass_cutoff(static_hz, dyn_hz, expo, throttle):
+    """Betaflight 动态低通：dyn_min > 0 时按油门曲线在 [min, max] 间变化，否则用静态截止频率"""
+    dyn_min, dyn_max = dyn_hz[:, 0], dyn_hz[:, 1]
+    expof = expo / 10
+    curve = throttle * (1 - throttle) * expof + throttle
+    dynamic = (dyn_max - dyn_min) * curve + dyn_min
+    return np.where((dyn_min > 0) & (dyn_max > dyn_min), dynamic, static_hz)
+
+
+def _dyn_notch_centers(freqs, psd, min_hz, max_hz, count):
+    """
+    动态陷波近似：在每个候选的 [min, max] 内取 PSD 最高的 count 个局部峰
+    psd: (A, F)；返回 (C, A, K) 的中心频率，无效位置为 0
+    """
+    k_max = int(max(1, np.max(count))) if len(count) else 1
+    peaks = np.zeros_like(psd, dtype=bool)
+    peaks[:, 1:-1] = (psd[:, 1:-1] >= psd[:, :-2]) & (psd[:, 1:-1] >= psd[:, 2:])
+    in_band = (freqs[None, :] >= min_hz[:, None]) & (freqs[None, :] <= max_hz[:, None])  # (C, F)
+    score = np.where(peaks[None, :, :] & in_band[:, None, :], psd[None, :, :], -1.0)  # (C, A, F)
+    top = np.argsort(-score, axis=-1)[..., :k_max]
+    centers = np.where(np.take_along_axis(score, top, axis=-1) > 0, freqs[top], 0.0)
+    return np.where(np.arange(k_max)[None, None, :] < count[:, None, None], centers, 0.0)
+
+
+def simulate(gyro, sample_rate, headers, overrides, throttle=0.5, gyro_rate=None, pid_rate=None):
+    """
+    批量评估候选滤波配置
+    gyro: 滤波前 gyro (A, n)；overrides: expand_candidates() 的结果，第 0 个候选固定为当前配置
+    返回 (meta, results)
+    """
+    current = settings_from_headers(headers)
+    settings = [current] + [dict(current, **o) for o in overrides]
+    c = len(settings)
+
+    def col(key):
+        return np.array([s[key] for s in settings], dtype=np.float64)
+
+    gyro_rate = gyro_rate or sample_rate
+    pid_rate = pid_rate or gyro_rate
+    freqs, psd = welch_psd(gyro, sample_rate)
+    df = freqs[1] - freqs[0]
+    eval_freqs = np.append(freqs, DELAY_REF_HZ)
+    z1_gyro = np.exp(-2j * np.pi * eval_freqs / gyro_rate)
+    z1_pid = np.exp(-2j * np.pi * eval_freqs / pid_rate)
+
+    # 各级响应相乘；参考频率处的相位逐级累加，避免总相位超过 180° 时回绕
+    n_axes = psd.shape[0]
+    h_gyro = np.ones((c, n_axes, len(eval_freqs)), dtype=np.complex128)
+    phase_gyro = np.zeros((c, n_axes))
+
+    def add_gyro_stage(h, phase, stage):
+        stage = stage if stage.ndim == 3 else stage[:, None, :]
+        return h * stage, phase + np.angle(stage[..., -1])
+
+    # gyro 滤波链：lpf1（可动态）-> lpf2 -> 两个静态陷波 -> 动态陷波
+    lpf1_cut = dyn_lowpass_cutoff(col('gyro_lpf1_static_hz'), col('gyro_lpf1_dyn_hz'),
+                                  col('gyro_lpf1_dyn_expo'), throttle)
+    stages = [
+        lowpass_response(col('gyro_lpf1_type'), lpf1_cut, gyro_rate, z1_gyro),
+        lowpass_response(col('gyro_lpf2_type'), col('gyro_lpf2_static_hz'), gyro_rate, z1_gyro),
+    ]
+    notch_hz, notch_cut = col('gyro_notch_hz'), col('gyro_notch_cutoff')
+    for i in range(2):
+        stages.append(notch_response(notch_hz[:, i], notch_q(notch_hz[:, i], notch_cut[:, i]), gyro_rate, z1_gyro))
+    centers = _dyn_notch_centers(freqs, psd, col('dyn_notch_min_hz'), col('dyn_notch_max_hz'),
+                                 col('dyn_notch_count').astype(int))
+    dyn_q = np.repeat(col('dyn_notch_q') / 100, n_axes)
+    for k in range(centers.shape[-1]):
+        stages.append(notch_response(centers[:, :, k].ravel(), dyn_q, gyro_rate, z1_gyro).reshape(c, n_axes, -1))
+    for stage in stages:
+        h_gyro, phase_gyro = add_gyro_stage(h_gyro, phase_gyro, stage)
+
+    # D-term 滤波链（运行在 PID 频率），输入为 gyro 滤波后的微分
+    dterm_cut = dyn_lowpass_cutoff(col('dterm_lpf1_static_hz'), col('dterm_lpf1_dyn_hz'),
+                                   col('dterm_lpf1_dyn_expo'), throttle)
+    d_notch_hz = col('dterm_notch_hz')
+    h_d_chain, phase_d = h_gyro, phase_gyro
+    for stage in (
+        lowpass_response(col('dterm_lpf1_type'), dterm_cut, pid_rate, z1_pid),
+        lowpass_response(col('dterm_lpf2_type'), col('dterm_lpf2_static_hz'), pid_rate, z1_pid),
+        notch_response(d_notch_hz, notch_q(d_notch_hz, col('dterm_notch_cutoff')), pid_rate, z1_pid),
+    ):
+        h_d_chain, phase_d = add_gyro_stage(h_d_chain, phase_d, stage)
+
+    band = freqs >= NOISE_BAND_MIN_HZ
+    power_gyro = np.abs(h_gyro[..., :-1]) ** 2 * psd[None]
+    gyro_noise = np.sqrt(np.sum(power_gyro[..., band], axis=-1) * df)  # (C, A)
+    omega2 = (2 * np.pi * freqs) ** 2
+    d_power = np.sum((np.abs(h_d_chain[..., :-1]) ** 2 * psd[None] * omega2)[..., band], axis=-1)
+    d_noise = np.sqrt(d_power.sum(axis=-1))
+    d_noise_rel = d_noise / d_noise[0] if d_noise[0] > 0 else np.ones(c)
+    to_ms = 1000 / (2 * np.pi * DELAY_REF_HZ)
+    gyro_delay = -phase_gyro.mean(axis=1) * to_ms
+    dterm_delay = -phase_d.mean(axis=1) * to_ms
+
+    prefilter = np.sqrt(np.sum(psd[:, band], axis=-1) * df)
+    meta = {
+        'sample_rate_hz': round(float(sample_rate), 1),
+        'gyro_rate_hz': round(float(gyro_rate), 1),
+        'pid_rate_hz': round(float(pid_rate), 1),
+        'noise_band_hz': [NOISE_BAND_MIN_HZ, round(float(freqs[-1]), 1)],
+        'delay_ref_hz': DELAY_REF_HZ,
+        'throttle': round(float(throttle), 3),
+        'prefilter_noise': [round(float(v), 2) for v in prefilter],
+        'rpm_filter': 'not simulated',
+        'candidates': c,
+    }
+    results = []
+    for i in range(c):
+        results.append({
+            'candidate': 'current' if i == 0 else i,
+            'settings': overrides[i - 1] if i else {},
+            'gyro_noise': [round(float(v), 2) for v in gyro_noise[i]],
+            'gyro_noise_total': round(float(np.sqrt(np.sum(gyro_noise[i] ** 2))), 2),
+            'gyro_delay_ms': round(float(gyro_delay[i]), 3) + 0.0,
+            'dterm_noise_rel': round(float(d_noise_rel[i]), 3),
+            'dterm_delay_ms': round(float(dterm_delay[i]), 3) + 0.0,
+        })
+    return meta, results
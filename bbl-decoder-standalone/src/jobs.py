@@ -0,0 +1,276 @@
+"""
+异步解码任务：POST /jobs 保存上传并排队，后台进程池解码，GET /jobs/{id} 查询状态和进度
+- 任务状态、进度和结果持久化在本地目录（SQLite + 上传 / 结果文件），服务重启后未完成的任务重新排队
+- 解码在独立进程中执行（不受 GIL 和请求超时限制），进度由工作进程直接写入 SQLite
+- 多个服务进程可共享任务目录：工作进程开始前原子地认领任务（queued -> running，记录 owner），同一任务只执行一次；
+  owner 定期写心跳，启动时只把 owner 已退出或心跳超时的 running 任务重新排队
+"""
+
+import json
+import os
+import secrets
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+FINISHED = (DONE, FAILED)
+# 进度写入 SQLite 的最小间隔（秒），阶段切换总是立即写入
+PROGRESS_INTERVAL_S = 0.2
+# 已结束任务的保留时间（秒），超过后删除记录和文件
+DEFAULT_RETENTION_S = 24 * 3600
+# running 任务的心跳间隔（秒）；超过 STALE_S 没有心跳的任务视为 owner 已退出
+HEARTBEAT_S = 10
+STALE_S = 6 * HEARTBEAT_S
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    stage TEXT,
+    progress TEXT,
+    options TEXT,
+    bytes INTEGER,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    owner TEXT,
+    heartbeat REAL
+)
+"""
+# 旧版本创建的 jobs 表没有的列
+_MIGRATIONS = {'owner': 'TEXT', 'heartbeat': 'REAL'}
+
+
+def owner_id():
+    """当前服务进程的标识（主机名:pid），记录在认领的任务上"""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def owner_alive(owner):
+    """owner 进程是否还在：同一主机上按 pid 检查，其他主机无法判断（只看心跳）"""
+    host, _, pid = (owner or '').rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobStore:
+    """jobs.sqlite + <id>.bbl（上传）+ <id>.json（结果），每次操作单独连接，可跨进程使用"""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.db_path = os.path.join(root, 'jobs.sqlite')
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(_SCHEMA)
+            columns = {row['name'] for row in db.execute('PRAGMA table_info(jobs)')}
+            for name, kind in _MIGRATIONS.items():
+                if name not in columns:
+                    db.execute(f'ALTER TABLE jobs ADD COLUMN {name} {kind}')
+
+    @contextmanager
+    def _connect(self):
+        """一个事务（退出时提交）；连接用完立即关闭，不能留到 fork 出的工作进程里（子进程回收时会破坏 SQLite 的文件锁）"""
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.row_factory = sqlite3.Row
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def input_path(self, job_id):
+        return os.path.join(self.root, f'{job_id}.bbl')
+
+    def result_path(self, job_id):
+        return os.path.join(self.root, f'{job_id}.json')
+
+    def create(self, data, options):
+        job_id = secrets.token_urlsafe(12)
+        with open(self.input_path(job_id), 'wb') as f:
+            f.write(data)
+        self._insert(job_id, options, len(data))
+        return job_id
+
+    def adopt(self, path, options):
+        """把磁盘上已有的上传文件（同一文件系统，如 /uploads 的暂存文件）移入任务目录，不经过内存"""
+        job_id = secrets.token_urlsafe(12)
+        size = os.path.getsize(path)
+        os.replace(path, self.input_path(job_id))
+        self._insert(job_id, options, size)
+        return job_id
+
+    def _insert(self, job_id, options, size):
+        now = time.time()
+        with self._connect() as db:
+            db.execute('INSERT INTO jobs (id, state, stage, progress, options, bytes, created, updated) '
+                       'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                       (job_id, QUEUED, None, '{}', json.dumps(options), size, now, now))
+
+    def get(self, job_id):
+        """任务记录（dict），不存在时返回 None"""
+        with self._connect() as db:
+            row = db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['options'] = json.loads(job['options'] or '{}')
+        job['progress'] = json.loads(job['progress'] or '{}')
+        return job
+
+    def update(self, job_id, **fields):
+        if 'progress' in fields:
+            fields['progress'] = json.dumps(fields['progress'])
+        fields['updated'] = time.time()
+        columns = ', '.join(f'{k} = ?' for k in fields)
+        with self._connect() as db:
+            db.execute(f'UPDATE jobs SET {columns} WHERE id = ?', (*fields.values(), job_id))
+
+    def finish(self, job_id, result_bytes=None, error=None):
+        """写结果文件并标记完成（或失败），删除上传文件"""
+        if error is None:
+            tmp = self.result_path(job_id) + '.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(result_bytes)
+            os.replace(tmp, self.result_path(job_id))
+            self.update(job_id, state=DONE, stage=None)
+        else:
+            self.update(job_id, state=FAILED, error=error)
+        try:
+            os.unlink(self.input_path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def claim(self, job_id, owner):
+        """原子地把 queued 任务标记为 running 并记录 owner；任务已被其他进程认领（或已结束）时返回 False"""
+        now = time.time()
+        with self._connect() as db:
+            cursor = db.execute('UPDATE jobs SET state = ?, owner = ?, heartbeat = ?, error = NULL, updated = ? '
+                                'WHERE id = ? AND state = ?', (RUNNING, owner, now, now, job_id, QUEUED))
+        return cursor.rowcount == 1
+
+    def heartbeat(self, owner):
+        """刷新 owner 名下所有 running 任务的心跳"""
+        with self._connect() as db:
+            db.execute('UPDATE jobs SET heartbeat = ? WHERE owner = ? AND state = ?', (time.time(), owner, RUNNING))
+
+    def requeue_orphans(self, stale_s=STALE_S):
+        """owner 已退出或心跳超时的 running 任务重新排队，返回任务数"""
+        deadline = time.time() - stale_s
+        with self._connect() as db:
+            rows = db.execute('SELECT id, owner, heartbeat FROM jobs WHERE state = ?', (RUNNING,)).fetchall()
+            orphans = [row['id'] for row in rows
+                       if row['heartbeat'] is None or row['heartbeat'] < deadline or not owner_alive(row['owner'])]
+            db.executemany('UPDATE jobs SET state = ?, owner = NULL, updated = ? WHERE id = ? AND state = ?',
+                           [(QUEUED, time.time(), job_id, RUNNING) for job_id in orphans])
+        return len(orphans)
+
+    def pending(self):
+        """排队中的任务 id（按创建顺序），重启后重新提交"""
+        with self._connect() as db:
+            rows = db.execute('SELECT id FROM jobs WHERE state = ? ORDER BY created', (QUEUED,)).fetchall()
+        return [row['id'] for row in rows]
+
+    def purge(self, retention_s=DEFAULT_RETENTION_S):
+        """删除超过保留时间的已结束任务"""
+        deadline = time.time() - retention_s
+        with self._connect() as db:
+            rows = db.execute('SELECT id FROM jobs WHERE state IN (?, ?) AND updated < ?',
+                              (DONE, FAILED, deadline)).fetchall()
+            db.execute('DELETE FROM jobs WHERE state IN (?, ?) AND updated < ?', (DONE, FAILED, deadline))
+        for row in rows:
+            for path in (self.result_path(row['id']), self.input_path(row['id'])):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+        return len(rows)
+
+
+class ProgressReporter:
+    """工作进程中的进度回调：reporter(stage, **fields)，同一阶段内按 PROGRESS_INTERVAL_S 节流写入"""
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+        self.stage = None
+        self.progress = {}
+        self._last = 0.0
+
+    def __call__(self, stage, **fields):
+        now = time.monotonic()
+        changed = stage != self.stage
+        self.progress.update(fields)
+        if changed or now - self._last >= PROGRESS_INTERVAL_S:
+            self.stage = stage
+            self._last = now
+            self.store.update(self.job_id, stage=stage, progress=self.progress)
+
+
+class JobRunner:
+    """进程池 + 任务提交；worker(db_root, job_id, owner) 为模块级函数（可被子进程导入），先 store.claim 再执行"""
+
+    def __init__(self, store, worker, max_workers):
+        self.store = store
+        self.worker = worker
+        self.max_workers = max_workers
+        self.owner = owner_id()
+        self._pool = None
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+    def start(self):
+        """清理过期任务，把无主的 running 任务重新排队，提交所有排队中的任务（进程池在首次提交时创建）
+        其他服务进程已提交的任务也会再提交一次，由 claim 保证只执行一次
+        """
+        self.store.purge()
+        self.store.requeue_orphans()
+        for job_id in self.store.pending():
+            self.submit(job_id)
+        self._heartbeat = threading.Thread(target=self._beat, name='bbl-job-heartbeat', daemon=True)
+        self._heartbeat.start()
+
+    def _beat(self):
+        while not self._stop.wait(HEARTBEAT_S):
+            try:
+                self.store.heartbeat(self.owner)
+            except sqlite3.Error:
+                pass  # 数据库暂时被锁，下一次再写
+
+    def pool(self):
+        """共享的进程池（/jobs 任务和 /decode/batch 共用）"""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    def submit(self, job_id):
+        future = self.pool().submit(self.worker, self.store.root, job_id, self.owner)
+        future.add_done_callback(lambda f: self._on_done(job_id, f))
+
+    def _on_done(self, job_id, future):
+        """工作进程崩溃（或任务函数本身抛错）时标记失败；只处理未被其他进程认领的任务"""
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            return
+        job = self.store.get(job_id)
+        if job is not None and job['state'] not in FINISHED and job['owner'] in (None, self.owner):
+            self.store.finish(job_id, error=f"Worker failed: {error}")
+
+    def shutdown(self):
+        self._stop.set()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,429 @@
+"""
+日志元数据索引（SQLite）：每个已解码 log 的 meta、按 CLI 分组的 headers、stats 和内容哈希，查询 / 聚合不再读取 BBL
+- 以 (文件 sha256, log 序号) 为键，重复解码同一 log 时覆盖；只收录默认段落（最长段落）且含 cli / stats 的完整解码结果
+- 写入按批次在一个事务中完成：服务端由 IndexWriter 后台线程攒批，entry.py bulk 在主进程攒批
+- 查询：logs 列、set.<header>、thr.<油门分档统计> 的过滤条件 + 按 logs 列分组聚合（python3 entry.py index / GET /index）
+"""
+
+import argparse
+import json
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from .throttle_stats import THROTTLE_EDGES_PCT
+except ImportError:  # 直接运行 python3 entry.py index
+    from throttle_stats import THROTTLE_EDGES_PCT
+
+# 后台写入：攒够该条数或间隔该秒数后写入一次
+WRITE_BATCH = 256
+WRITE_INTERVAL_S = 1.0
+# 查询默认 / 最多返回的行数
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 10000
+AGGREGATES = ('count', 'avg', 'min', 'max', 'sum')
+AXES = 'rpy'
+
+# logs 表的标量列（列名 -> SQLite 类型），均可用于过滤、分组和排序
+LOG_COLUMNS = {
+    'sha256': 'TEXT', 'log': 'INTEGER', 'log_sha256': 'TEXT', 'source': 'TEXT', 'indexed': 'REAL',
+    'fw': 'TEXT', 'fw_type': 'TEXT', 'fw_version': 'TEXT', 'board': 'TEXT', 'board_name': 'TEXT', 'craft': 'TEXT',
+    'started': 'TEXT', 'duration_s': 'REAL', 'total_frames': 'INTEGER', 'sample_rate_hz': 'REAL',
+    'segments': 'INTEGER', 'corrupt_bytes': 'INTEGER',
+    'gyro_rms_r': 'REAL', 'gyro_rms_p': 'REAL', 'gyro_rms_y': 'REAL', 'gyro_rms_max': 'REAL',
+    'gyro_peak_hz_r': 'REAL', 'gyro_peak_hz_p': 'REAL', 'gyro_peak_hz_y': 'REAL',
+    'motor_imbalance': 'REAL', 'vbat_min': 'REAL', 'vbat_max': 'REAL', 'amp_avg': 'REAL', 'amp_max': 'REAL',
+}
+# logs 的索引：板子 + 固件版本是机队查询最常用的组合（也覆盖只按板子过滤）
+INDEXES = (('board_name', 'fw_version'), ('fw_version',), ('craft',), ('started',), ('gyro_rms_max',), ('duration_s',))
+# throttle_bins 表：每个油门档一行，多轴统计按轴展开并加 _max
+BIN_COLUMNS = {
+    'thr_lo': 'REAL', 'thr_hi': 'REAL', 'frames': 'INTEGER',
+    'gyro_rms_r': 'REAL', 'gyro_rms_p': 'REAL', 'gyro_rms_y': 'REAL', 'gyro_rms_max': 'REAL',
+    'pid_err_rms_r': 'REAL', 'pid_err_rms_p': 'REAL', 'pid_err_rms_y': 'REAL', 'pid_err_rms_max': 'REAL',
+    'dterm_rms_r': 'REAL', 'dterm_rms_p': 'REAL', 'dterm_rms_max': 'REAL',
+    'motor_sat': 'REAL', 'motor_spread': 'REAL', 'vbat': 'REAL', 'amp': 'REAL', 'sag_v': 'REAL',
+}
+NUMERIC_TYPES = ('REAL', 'INTEGER')
+
+# logs 只放标量列（行小，全表扫描 / 分组快），完整 meta / stats JSON 在 documents；header 名在 header_keys 中编号
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY,
+    {', '.join(f'{name} {kind}' for name, kind in LOG_COLUMNS.items())},
+    UNIQUE (sha256, log)
+);
+{''.join(f'CREATE INDEX IF NOT EXISTS logs_{"_".join(cols)} ON logs ({", ".join(cols)});' for cols in INDEXES)}
+CREATE TABLE IF NOT EXISTS documents (
+    log_id INTEGER PRIMARY KEY,
+    meta TEXT,
+    stats TEXT
+);
+CREATE TABLE IF NOT EXISTS header_keys (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    grp TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS headers (
+    key_id INTEGER NOT NULL,
+    value,
+    log_id INTEGER NOT NULL,
+    PRIMARY KEY (key_id, value, log_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS headers_log ON headers (log_id);
+CREATE TABLE IF NOT EXISTS throttle_bins (
+    log_id INTEGER NOT NULL,
+    bin INTEGER NOT NULL,
+    {', '.join(f'{name} {kind}' for name, kind in BIN_COLUMNS.items())},
+    PRIMARY KEY (bin, log_id)
+) WITHOUT ROWID;
+"""
+
+_FILTER = re.compile(r'^\s*(.+?)\s*(!=|>=|<=|=|>|<|~)\s*(.*?)\s*$')
+
+
+class QueryError(ValueError):
+    pass
+
+
+def _number(text):
+    """header 值 / 过滤值：整数或小数转为数值，其他保持字符串"""
+    if isinstance(text, str):
+        for kind in (int, float):
+            try:
+                return kind(text)
+            except ValueError:
+                pass
+    return text
+
+
+def _axes(prefix, values):
+    """{r, p, y} 或 [r, p, y] -> {prefix_r: .., prefix_max: ..}"""
+    if isinstance(values, dict):
+        values = [values.get(a) for a in AXES]
+    if not isinstance(values, list):
+        return {}
+    row = {f'{prefix}_{AXES[i]}': v for i, v in enumerate(values[:len(AXES)])}
+    present = [v for v in values if v is not None]
+    row[f'{prefix}_max'] = max(present) if present else None
+    return row
+
+
+def parse_cli(cli):
+    """cli 块（'set key = value' 行）-> [(分组, key, value)]，数值 header 存为数值"""
+    headers = []
+    for group, text in (cli or {}).items():
+        for line in (text or '').splitlines():
+            if line.startswith('set ') and ' = ' in line:
+                key, value = line[4:].split(' = ', 1)
+                headers.append((group, key, _number(value)))
+    return headers
+
+
+def record(result, sha256, log, log_sha256=None, source=None):
+    """解码结果（/decode 的 JSON）-> 索引记录：logs 行、headers 行、throttle_bins 行"""
+    meta, stats = result['meta'], result.get('stats', {})
+    fw = meta.get('fw') or ''
+    version = re.search(r'\d+\.\d+\.\d+', fw)
+    board = meta.get('board') or ''
+    headers = parse_cli(result.get('cli'))
+    started = next((v for _, k, v in headers if k == 'Log start datetime'), None)
+    vbat, amp = stats.get('vbat') or [None, None], stats.get('amp') or [None, None]
+    row = {
+        'sha256': sha256, 'log': log, 'log_sha256': log_sha256, 'source': source, 'indexed': time.time(),
+        'fw': fw, 'fw_type': fw.split()[0] if fw else None, 'fw_version': version.group() if version else None,
+        'board': board, 'board_name': board.split()[-1] if board else None, 'craft': meta.get('craft') or None,
+        # 没有 RTC 时间的 log（0000-01-01）不记开始时间
+        'started': started if isinstance(started, str) and not started.startswith('0000') else None,
+        'duration_s': meta.get('duration_s'), 'total_frames': meta.get('total_frames'),
+        # meta.sample_rate_hz 是降采样后输出帧的频率，这里记 log 本身的记录频率
+        'sample_rate_hz': (meta.get('timing') or {}).get('sample_rate_hz'), 'segments': meta.get('segments_found'),
+        'corrupt_bytes': (meta.get('corruption') or {}).get('skipped_bytes'),
+        'motor_imbalance': stats.get('motor_imbalance'), 'vbat_min': vbat[0], 'vbat_max': vbat[1],
+        'amp_avg': amp[0], 'amp_max': amp[1],
+    }
+    row.update(_axes('gyro_rms', stats.get('gyro_rms')))
+    row.update(_axes('gyro_peak_hz', stats.get('gyro_peak_hz')))
+    row.pop('gyro_peak_hz_max', None)
+
+    bins = []
+    table = stats.get('throttle_bins') or {}
+    edges = table.get('thr_pct') or []
+    for b, frames in enumerate(table.get('frames') or []):
+        if not frames:
+            continue
+        bin_row = {'bin': b, 'thr_lo': edges[b], 'thr_hi': edges[b + 1], 'frames': frames}
+        for name, values in table.items():
+            if name in ('thr_pct', 'frames') or b >= len(values):
+                continue
+            bin_row.update(_axes(name, values[b]) if isinstance(values[b], list) else {name: values[b]})
+        bins.append({k: v for k, v in bin_row.items() if k == 'bin' or k in BIN_COLUMNS})
+    return {'log': row, 'headers': headers, 'bins': bins,
+            'meta': json.dumps({k: v for k, v in meta.items() if k != 'logs'}, ensure_ascii=False),
+            'stats': json.dumps(stats, ensure_ascii=False)}
+
+
+class LogIndex:
+    """index.sqlite：logs（每个 log 一行）+ documents（完整 meta / stats）+ headers（CLI 分组的 header）
+    + throttle_bins（油门分档统计），每次操作单独连接，可跨进程使用
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """连接用完立即关闭：不能留到 fork 出的工作进程里（子进程回收时会破坏 SQLite 的文件锁）"""
+        db = sqlite3.connect(self.path, timeout=30)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def add(self, records):
+        """在一个事务中写入一批记录，同一 (sha256, log) 的旧记录被替换"""
+        if not records:
+            return 0
+        with self._connect() as db:
+            with db:
+                keys = {row['key']: row['id'] for row in db.execute('SELECT id, key FROM header_keys')}
+                for rec in records:
+                    row = rec['log']
+                    old = db.execute('SELECT id FROM logs WHERE sha256 = ? AND log = ?',
+                                     (row['sha256'], row['log'])).fetchone()
+                    if old is not None:
+                        for table in ('headers', 'documents'):
+                            db.execute(f'DELETE FROM {table} WHERE log_id = ?', (old['id'],))
+                        bins = range(len(THROTTLE_EDGES_PCT) - 1)
+                        db.execute(f'DELETE FROM throttle_bins WHERE bin IN ({", ".join("?" * len(bins))}) '
+                                   f'AND log_id = ?', (*bins, old['id']))
+                        db.execute('DELETE FROM logs WHERE id = ?', (old['id'],))
+                    names = list(row)
+                    log_id = db.execute(f'INSERT INTO logs ({", ".join(names)}) VALUES ({", ".join("?" * len(names))})',
+                                        [row[n] for n in names]).lastrowid
+                    db.execute('INSERT INTO documents (log_id, meta, stats) VALUES (?, ?, ?)',
+                               (log_id, rec['meta'], rec['stats']))
+                    for group, key, _ in rec['headers']:
+                        if key not in keys:
+                            keys[key] = db.execute('INSERT INTO header_keys (key, grp) VALUES (?, ?)',
+                                                   (key, group)).lastrowid
+                    db.executemany('INSERT OR REPLACE INTO headers (key_id, value, log_id) VALUES (?, ?, ?)',
+                                   [(keys[key], value, log_id) for _, key, value in rec['headers']])
+                    for bin_row in rec['bins']:
+                        names = list(bin_row)
+                        db.execute(f'INSERT INTO throttle_bins (log_id, {", ".join(names)}) '
+                                   f'VALUES (?, {", ".join("?" * len(names))})', [log_id] + [bin_row[n] for n in names])
+            db.execute('PRAGMA optimize')  # 更新查询规划用的统计信息（只在表变化较大时分析）
+        return len(records)
+
+    def count(self):
+        with self._connect() as db:
+            return db.execute('SELECT COUNT(*) FROM logs').fetchone()[0]
+
+    def query(self, where=(), throttle=0, group_by=(), aggregates=('count',), order=None, limit=DEFAULT_LIMIT,
+              full=False):
+        """
+        where: 'field op value' 列表（op 为 = != > >= < <= ~，~ 为 glob），条件之间为 AND
+        - logs 列：board_name=JHEF745V2、fw_version~4.5.*、gyro_rms_max>20
+        - set.<header>：set.gyro_lpf1_dyn_hz=250,500、set.dyn_notch_count>=2
+        - thr.<分档统计>：存在一个下沿 >= throttle（%）的油门档，满足所有 thr. 条件
+        group_by 为 logs 列时按组聚合（aggregates：count、avg:列、min:列、max:列、sum:列）
+        order 为输出列名，前缀 - 为降序；返回 {'matched': 匹配的 log 数, 'rows' / 'groups': [...]}
+        """
+        if not 1 <= limit <= MAX_LIMIT:
+            raise QueryError(f"limit must be between 1 and {MAX_LIMIT}")
+        clauses, params = _where(where, throttle)
+        sql_where = f' WHERE {" AND ".join(clauses)}' if clauses else ''
+        with self._connect() as db:
+            matched = db.execute(f'SELECT COUNT(*) FROM logs{sql_where}', params).fetchone()[0]
+            if group_by:
+                for name in group_by:
+                    _log_column(name)
+                selected = list(group_by) + [_aggregate(spec) for spec in aggregates]
+                outputs = list(group_by) + [_aggregate_name(spec) for spec in aggregates]
+                sql = (f'SELECT {", ".join(f"{s} AS {o}" for s, o in zip(selected, outputs))} FROM logs{sql_where} '
+                       # +列：不按分组列的索引顺序回表（随机读），顺序扫描后排序更快
+                       f'GROUP BY {", ".join("+" + g for g in group_by)}'
+                       f'{_order(order, outputs, default=outputs[-1])} LIMIT ?')
+                rows = db.execute(sql, params + [limit]).fetchall()
+                return {'matched': matched, 'groups': [dict(r) for r in rows]}
+
+            outputs = list(LOG_COLUMNS)
+            sql = f'SELECT id, {", ".join(outputs)} FROM logs{sql_where}{_order(order, outputs)} LIMIT ?'
+            rows = [dict(r) for r in db.execute(sql, params + [limit]).fetchall()]
+            documents = {}
+            if full and rows:
+                ids = [row['id'] for row in rows]
+                documents = {r['log_id']: r for r in db.execute(
+                    f'SELECT * FROM documents WHERE log_id IN ({", ".join("?" * len(ids))})', ids)}
+        for row in rows:
+            doc = documents.get(row.pop('id'))
+            if doc is not None:
+                row['meta'], row['stats'] = json.loads(doc['meta']), json.loads(doc['stats'])
+        return {'matched': matched, 'rows': rows}
+
+
+def _log_column(name):
+    if name not in LOG_COLUMNS:
+        raise QueryError(f"Unknown field: {name} (available: {', '.join(LOG_COLUMNS)}, set.<header>, thr.<stat>)")
+    return name
+
+
+def _comparison(column, op, value, numeric):
+    """单个条件的 SQL 和参数；数值列的比较值必须是数值"""
+    if op == '~':
+        return f'{column} GLOB ?', [str(value)]
+    if numeric and not isinstance(value, (int, float)):
+        raise QueryError(f"{column} is numeric; got {value!r}")
+    return f'{column} {op} ?', [value]
+
+
+def _where(where, throttle):
+    """过滤条件 -> (SQL 条件列表, 参数)
+    set. / thr. 子查询：有 logs 列条件时按候选行逐个检查（EXISTS，候选已被索引缩小），否则先求出 log_id 集合（IN）
+    """
+    clauses, params = [], []
+    subqueries = []  # (表, 条件, 参数)
+    bin_clauses, bin_params = [], []
+    for item in where:
+        m = _FILTER.match(item)
+        if not m:
+            raise QueryError(f"Invalid filter: {item!r} (expected field op value, op in = != > >= < <= ~)")
+        field, op, text = m.groups()
+        value = _number(text)
+        if field.startswith('set.'):
+            sql, args = _comparison('value', op, value, numeric=False)
+            if op not in ('=', '!=', '~') and isinstance(value, (int, float)):
+                sql += " AND typeof(value) IN ('integer', 'real')"  # SQLite 中文本总是大于数值
+            subqueries.append(('headers', f'key_id = (SELECT id FROM header_keys WHERE key = ?) AND {sql}',
+                               [field[4:]] + args))
+        elif field.startswith('thr.'):
+            name = field[4:]
+            if name not in BIN_COLUMNS:
+                raise QueryError(f"Unknown throttle bin stat: {name} (available: {', '.join(BIN_COLUMNS)})")
+            sql, args = _comparison(name, op, value, BIN_COLUMNS[name] in NUMERIC_TYPES)
+            bin_clauses.append(sql)
+            bin_params += args
+        else:
+            sql, args = _comparison(_log_column(field), op, value, LOG_COLUMNS[field] in NUMERIC_TYPES)
+            clauses.append(sql)
+            params += args
+    if bin_clauses:
+        # 油门档按 bin 序号选择（主键前缀），只读取这些档的行
+        bins = [b for b, lo in enumerate(THROTTLE_EDGES_PCT[:-1]) if lo >= throttle] or [-1]
+        subqueries.append(('throttle_bins', f'bin IN ({", ".join(map(str, bins))}) AND {" AND ".join(bin_clauses)}',
+                           bin_params))
+    correlated = bool(clauses)
+    for table, sql, args in subqueries:
+        if correlated:
+            clauses.append(f'EXISTS (SELECT 1 FROM {table} WHERE log_id = logs.id AND {sql})')
+        else:
+            clauses.append(f'id IN (SELECT log_id FROM {table} WHERE {sql})')
+        params += args
+    return clauses, params
+
+
+def _aggregate_name(spec):
+    return spec if spec == 'count' else spec.replace(':', '_')
+
+
+def _aggregate(spec):
+    """'count' 或 '<函数>:<logs 列>'"""
+    if spec == 'count':
+        return 'COUNT(*)'
+    fn, _, column = spec.partition(':')
+    if fn not in AGGREGATES or fn == 'count' or not column:
+        raise QueryError(f"Invalid aggregate: {spec!r} (count, or one of {', '.join(AGGREGATES[1:])}:<field>)")
+    if LOG_COLUMNS.get(_log_column(column)) not in NUMERIC_TYPES and fn in ('avg', 'sum'):
+        raise QueryError(f"{fn} needs a numeric field, {column} is text")
+    return f'ROUND(AVG({column}), 3)' if fn == 'avg' else f'{fn.upper()}({column})'
+
+
+def _order(order, outputs, default=None):
+    if not order:
+        return f' ORDER BY {default} DESC' if default else ''
+    name = order.lstrip('-')
+    if name not in outputs:
+        raise QueryError(f"Cannot order by {name} (available: {', '.join(outputs)})")
+    return f' ORDER BY {name}{" DESC" if order.startswith("-") else ""}'
+
+
+class IndexWriter:
+    """服务端的后台写入线程：add() 只入队，攒够 WRITE_BATCH 条或 WRITE_INTERVAL_S 秒后在一个事务中写入"""
+
+    def __init__(self, index, batch=WRITE_BATCH, interval_s=WRITE_INTERVAL_S):
+        self.index = index
+        self.batch = batch
+        self.interval_s = interval_s
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, name='log-index-writer', daemon=True).start()
+
+    def add(self, rec):
+        self._queue.put(rec)
+
+    def flush(self):
+        """等待已入队的记录全部写入"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            records = [self._queue.get()]
+            deadline = time.monotonic() + self.interval_s
+            while len(records) < self.batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    records.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                self.index.add(records)
+            except sqlite3.Error as e:
+                print(f"[BBL Decoder] Index write failed ({len(records)} log(s)): {e}", file=sys.stderr)
+            finally:
+                for _ in records:
+                    self._queue.task_done()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog='entry.py index', description='查询日志元数据索引（过滤 / 分组聚合）')
+    ap.add_argument('db', help='索引文件（entry.py bulk 输出目录的 index.sqlite，或服务端的 BBL_INDEX_DB）')
+    ap.add_argument('-w', '--where', action='append', default=[],
+                    help="过滤条件，可重复：board_name=JHEF745V2、fw_version~4.5.*、set.dyn_notch_count>=2、thr.gyro_rms_max>20")
+    ap.add_argument('--throttle', type=float, default=0, help='thr. 条件只看下沿不低于该油门（%%）的档位')
+    ap.add_argument('-g', '--group-by', help='逗号分隔的 logs 列，按组聚合')
+    ap.add_argument('-a', '--agg', default='count', help='逗号分隔：count、avg:列、min:列、max:列、sum:列')
+    ap.add_argument('--order', help='排序列，前缀 - 为降序（--order=-gyro_rms_max）')
+    ap.add_argument('--limit', type=int, default=DEFAULT_LIMIT)
+    ap.add_argument('--full', action='store_true', help='输出完整的 meta / stats')
+    args = ap.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        ap.error(f'{args.db} does not exist')
+    split = lambda value: [v.strip() for v in value.split(',') if v.strip()] if value else []
+    started = time.perf_counter()
+    try:
+        result = LogIndex(args.db).query(args.where, args.throttle, split(args.group_by), split(args.agg),
+                                         args.order, args.limit, args.full)
+    except QueryError as e:
+        ap.error(str(e))
+    result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+上传一次、多次查询的 log 句柄：POST /logs 保存上传内容，返回句柄 id
+- 句柄下缓存解析结果（每个 log 的数值矩阵、时间列、段落等），后续 meta / decode / frames 查询不再重新解析
+- 总大小有上限（按上传字节 + 缓存数组估算），超出时按最近访问时间淘汰；空闲超过 TTL 的句柄过期
+- 只在本进程内存中保存，重启或多实例部署时句柄不共享
+"""
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# 总大小上限和空闲过期时间（环境变量 BBL_LOG_STORE_MB / BBL_LOG_STORE_TTL_S 可覆盖）
+DEFAULT_MAX_MB = 512
+DEFAULT_TTL_S = 1800
+# object 数组每个元素的估算字节数（指针 + 小整数对象）
+OBJECT_ITEM_BYTES = 36
+
+
+class StoreFullError(ValueError):
+    pass
+
+
+class StoredLog:
+    """一个句柄：上传的原始字节 + 按 key 缓存的派生数据"""
+
+    def __init__(self, log_id, data, summaries):
+        self.id = log_id
+        self.data = data
+        self.summaries = summaries
+        self.cache = {}
+        self.created = self.accessed = time.monotonic()
+        self.lock = threading.Lock()
+
+    def nbytes(self):
+        """上传字节 + 缓存中数组的估算大小（fork 共享的数组只算一次）；缓存的特征图会继续计算节点，每次重新估算"""
+        seen = set()
+        return len(self.data) + sum(estimate_nbytes(v, seen) for v in list(self.cache.values()))
+
+
+def estimate_nbytes(value, seen=None):
+    """缓存值的内存估算：numpy 数组按 nbytes（object 数组按元素数），容器逐项累加，seen 中的对象不重复计"""
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, np.ndarray):
+        return value.size * OBJECT_ITEM_BYTES if value.dtype == object else value.nbytes
+    if isinstance(value, dict):
+        return sum(estimate_nbytes(v, seen) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_nbytes(v, seen) for v in value)
+    if isinstance(getattr(value, 'levels', None), list):  # envelope.Pyramid
+        return estimate_nbytes(value.levels, seen)
+    if hasattr(value, 'items') and callable(value.items):  # FeatureGraph
+        return sum(estimate_nbytes(v, seen) for _, v in value.items())
+    return 0
+
+
+class LogStore:
+
+    def __init__(self, max_bytes=DEFAULT_MAX_MB * 1024 * 1024, ttl_s=DEFAULT_TTL_S):
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self._logs = OrderedDict()  # 按最近访问排序
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        return sum(log.nbytes() for log in self._logs.values())
+
+    def put(self, data, summaries=None):
+        """保存上传内容，返回 StoredLog；单个上传就超过上限时抛 StoreFullError"""
+        if len(data) > self.max_bytes:
+            raise StoreFullError(f"Upload exceeds the log store limit ({self.max_bytes // (1024 * 1024)} MB)")
+        log = StoredLog(secrets.token_urlsafe(12), data, summaries)
+        with self._lock:
+            self._logs[log.id] = log
+            self._evict(keep=log.id)
+        return log
+
+    def get(self, log_id):
+        """按 id 取句柄并刷新访问时间；不存在或已过期时抛 KeyError"""
+        with self._lock:
+            self._expire()
+            log = self._logs[log_id]
+            log.accessed = time.monotonic()
+            self._logs.move_to_end(log_id)
+            return log
+
+    def delete(self, log_id):
+        with self._lock:
+            return self._logs.pop(log_id, None) is not None
+
+    def cached(self, log, key, build):
+        """句柄下按 key 缓存 build() 的结果；同一句柄的并发请求只构建一次"""
+        with log.lock:
+            if key in log.cache:
+                return log.cache[key]
+            value = build()
+            log.cache[key] = value
+            with self._lock:
+                self._evict(keep=log.id)
+            return value
+
+    def expires_in(self, log):
+        return max(0, round(log.accessed + self.ttl_s - time.monotonic()))
+
+    def stats(self):
+        with self._lock:
+            self._expire()
+            return {'handles': len(self._logs), 'mb': round(self.nbytes / (1024 * 1024), 1),
+                    'max_mb': self.max_bytes // (1024 * 1024), 'ttl_s': self.ttl_s}
+
+    def _expire(self):
+        deadline = time.monotonic() - self.ttl_s
+        for log_id in [k for k, log in self._logs.items() if log.accessed < deadline]:
+            del self._logs[log_id]
+
+    def _evict(self, keep=None):
+        """先清过期句柄，再按最近访问从旧到新淘汰，直到总大小不超过上限（keep 最后才淘汰）"""
+        self._expire()
+        sizes = {log_id: log.nbytes() for log_id, log in self._logs.items()}
+        total = sum(sizes.values())
+        for log_id in list(self._logs):
+            if total <= self.max_bytes:
+                break
+            if log_id == keep:
+                continue
+            del self._logs[log_id]
+            total -= sizes[log_id]
+        if total > self.max_bytes and keep in self._logs:
+            # 仅剩的句柄缓存过大：丢掉派生缓存，保留原始上传
+            self._logs[keep].cache.clear()
@@ -0,0 +1,169 @@
+"""
+多 log / 多段落的快速摘要（/meta 的 logs 表，/decode 的 log 选择器以它为准；segment 选择器以完整解码的 meta.segments 为准）
+- 只解码 I 帧：I 帧不依赖前一帧，位置来自 resync.iframe_candidates 的向量化扫描，
+  试解码通过、且迭代号 / 时间与上一个 I 帧一致的才采用。代价约为完整解码的 1 / (I 帧间隔 * P 帧比例)
+- 段落切分与完整解码相同（segmentation.find_flight_segments），在 I 帧序列上进行；
+  没有 S 帧的解锁状态和事件，未解锁部分靠电机怠速裁掉
+- 帧数由 loopIteration 跨度和 P 帧比例估算
+"""
+
+import os
+import tempfile
+from collections import namedtuple
+
+import numpy as np
+
+try:
+    from . import detectors, resync, segmentation
+except ImportError:  # 直接运行 python3 entry.py
+    import detectors
+    import resync
+    import segmentation
+
+# 摇杆活跃度：setpoint 合成角速度的 RMS 达到该值（deg/s）时为 100 分
+ACTIVITY_FULL_SCALE_DPS = 300.0
+# I 帧之间 dt/diter 允许偏离名义周期的倍数（超过 segmentation.TIME_GAP_US 的时间跳跃不受限）
+RATE_FACTOR = 4
+
+# span: log 在文件中的 (起始, 结束) 字节；row: logs 表中的一行
+LogSummary = namedtuple('LogSummary', ['span', 'row'])
+
+
+class SelectionError(ValueError):
+    pass
+
+
+def _us_per_iter(headers):
+    try:
+        return int(headers.get('looptime', 125)) * int(headers.get('pid_process_denom', 1))
+    except (TypeError, ValueError):
+        return 125
+
+
+def scan_iframes(parser):
+    """解码当前 log 的所有 I 帧，返回 (I 帧字段名, (n, k) float64 矩阵, loopIteration 数组)"""
+    from orangebox.types import FrameType
+
+    reader, ctx = parser.reader, parser._ctx
+    names = [f.name for f in reader.field_defs.get(FrameType.INTRA, [])]
+    if 'time' not in names or 'loopIteration' not in names:
+        return names, np.zeros((0, len(names))), np.zeros(0, dtype=np.int64)
+    time_j = names.index('time')
+    markers = {ord(t.value) for t in FrameType}
+    us_per_iter = _us_per_iter(parser.headers)
+
+    rows, iters = [], []
+    last_iter = last_time = None
+    positions, candidate_iters, _ = resync.iframe_candidates(reader._frame_data, getattr(ctx, 'i_interval', 0) or 1)
+    for pos, iteration in zip(positions, candidate_iters):
+        if last_iter is not None and iteration <= last_iter:
+            continue
+        data = resync.decode_iframe_at(parser, pos, markers)
+        if data is None:
+            continue
+        time_us = data[time_j]
+        if last_iter is not None:
+            dt, diter = time_us - last_time, iteration - last_iter
+            if dt <= 0 or (dt <= segmentation.TIME_GAP_US and
+                           not us_per_iter / RATE_FACTOR <= dt / diter <= us_per_iter * RATE_FACTOR):
+                continue
+        rows.append(data)
+        iters.append(iteration)
+        last_iter, last_time = iteration, time_us
+    matrix = np.array(rows, dtype=np.float64).reshape(len(rows), len(names))
+    return names, matrix, np.array(iters, dtype=np.int64)
+
+
+def summarize_log(log_bytes, span=None):
+    """单个 log 的摘要（I 帧扫描），解析失败时 row 带 error"""
+    from orangebox import Parser
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.BBL') as tmp:
+        tmp.write(log_bytes)
+        tmp_path = tmp.name
+    try:
+        parser = Parser.load(tmp_path)
+        headers = parser.headers
+        names, matrix, iters = scan_iframes(parser)
+        ctx = parser._ctx
+        frames_per_iter = ctx.p_interval_num / max(1, ctx.p_interval_denom)
+    except Exception as e:
+        return LogSummary(span, {'duration_s': 0.0, 'frames': 0, 'segments': [], 'error': str(e)})
+    finally:
+        os.unlink(tmp_path)
+
+    if len(matrix) < 2:
+        return LogSummary(span, {'duration_s': 0.0, 'frames': len(matrix), 'segments': []})
+
+    col = {name: j for j, name in enumerate(names)}
+    time_us = matrix[:, col['time']].astype(np.int64)
+    motor = _stack(matrix, col, [f'motor[{i}]' for i in range(4)])
+    rc_throttle = matrix[:, col['rcCommand[3]']] if 'rcCommand[3]' in col else None
+    setpoint = _stack(matrix, col, [f'setpoint[{i}]' for i in range(3)])
+    if setpoint is None:
+        setpoint = _stack(matrix, col, [f'gyroADC[{i}]' for i in range(3)])
+    throttle = None
+    if rc_throttle is not None or motor is not None:
+        throttle = detectors.normalize_throttle(rc_throttle, motor, headers)
+
+    segments = segmentation.find_flight_segments(time_us, motor, detectors.motor_output_range(headers))
+    table = segmentation.describe_segments(segments, time_us)
+    for row, seg in zip(table, segments):
+        row['frames'] = _frame_count(iters[seg.start:seg.end], frames_per_iter)
+        if throttle is not None:
+            part = throttle[seg.start:seg.end]
+            row['throttle'] = {'mean': round(float(part.mean()), 3), 'p95': round(float(np.percentile(part, 95)), 3)}
+        if setpoint is not None:
+            row['activity'] = activity_score(setpoint[:, seg.start:seg.end])
+
+    row = {
+        'duration_s': round(float(time_us[-1] - time_us[0]) / 1_000_000, 1),
+        'frames': _frame_count(iters, frames_per_iter),
+        'segments': table,
+    }
+    return LogSummary(span, row)
+
+
+def _stack(matrix, col, names):
+    if not all(name in col for name in names):
+        return None
+    return np.stack([matrix[:, col[name]] for name in names])
+
+
+def _frame_count(iters, frames_per_iter):
+    """按 loopIteration 跨度估算的主帧数（首尾 I 帧之间）"""
+    if not len(iters):
+        return 0
+    return int(round((iters[-1] - iters[0]) * frames_per_iter)) + 1
+
+
+def activity_score(setpoint):
+    """摇杆活跃度 0..100：三轴 setpoint 合成角速度的 RMS / ACTIVITY_FULL_SCALE_DPS"""
+    if setpoint.shape[1] == 0:
+        return 0
+    rms = float(np.sqrt(np.mean(np.sum(setpoint * setpoint, axis=0))))
+    return int(round(min(1.0, rms / ACTIVITY_FULL_SCALE_DPS) * 100))
+
+
+def scan_logs(bbl_bytes, spans):
+    """文件中每个 log（spans 为 find_all_logs 的结果）的摘要"""
+    return [summarize_log(bbl_bytes[start:end], (start, end)) for start, end in spans]
+
+
+def describe(summaries):
+    """meta.logs：每个 log 一行，序号从 1 开始"""
+    return [dict({'index': i + 1}, **s.row) for i, s in enumerate(summaries)]
+
+
+def check_log_index(log, total):
+    """log 选择器（1 起）转 0 起的序号"""
+    if not 1 <= log <= total:
+        raise SelectionError(f"log must be between 1 and {total}")
+    return log - 1
+
+
+def check_segment_index(segment, total):
+    """segment 选择器（1 起，meta.segments 的序号）转 0 起的序号"""
+    if not 1 <= segment <= total:
+        raise SelectionError(f"segment must be between 1 and {total}")
+    return segment - 1
@@ -0,0 +1,332 @@
+"""
+按请求的性能剖析：X-Profile 请求头触发，只作用于该请求的解码
+- cpu: cProfile 确定性剖析（summary / pstats），或栈采样（speedscope）
+- mem: tracemalloc，报告峰值附近的分配位置
+不带请求头时这里的代码完全不会执行
+"""
+
+import cProfile
+import marshal
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+PROFILE_MODES = ('cpu', 'mem')
+PROFILE_FORMATS = ('summary', 'pstats', 'speedscope')
+TOP_N = 30
+SAMPLE_INTERVAL_S = 0.001
+TRACEMALLOC_FRAMES = 10
+# 已追踪内存比上一次快照增长超过该比例时重新拍快照，最后保留的就是峰值附近的快照
+PEAK_SNAPSHOT_GROWTH = 1.25
+
+
+class ProfileError(ValueError):
+    pass
+
+
+def check_options(mode, fmt):
+    """校验 X-Profile / X-Profile-Format，返回 (mode, fmt)"""
+    mode = (mode or '').strip().lower()
+    fmt = (fmt or 'summary').strip().lower()
+    if mode not in PROFILE_MODES:
+        raise ProfileError(f"X-Profile must be one of: {', '.join(PROFILE_MODES)}")
+    if fmt not in PROFILE_FORMATS:
+        raise ProfileError(f"X-Profile-Format must be one of: {', '.join(PROFILE_FORMATS)}")
+    if mode == 'mem' and fmt != 'summary':
+        raise ProfileError("mem profiling only supports the summary format")
+    return mode, fmt
+
+
+def _func_label(filename, lineno, name):
+    if filename == '~':  # 内置函数
+        return name
+    return f"{_short_path(filename)}:{lineno}({name})"
+
+
+def _short_path(filename):
+    """去掉 site-packages / 仓库前缀，报告里只保留可读的相对路径"""
+    for marker in ('site-packages' + os.sep, 'src' + os.sep):
+        idx = filename.rfind(marker)
+        if idx >= 0:
+            return filename[idx + len(marker):]
+    return os.path.basename(filename)
+
+
+# ---------------------------------------------------------------------------
+# cpu：cProfile
+# ---------------------------------------------------------------------------
+
+def cprofile_summary(profiler, top=TOP_N):
+    """按自身耗时和累计耗时各取 top 个函数"""
+    stats = pstats.Stats(profiler).stats
+    rows = []
+    for (filename, lineno, name), (cc, nc, tt, ct, _) in stats.items():
+        rows.append({
+            'function': _func_label(filename, lineno, name),
+            'calls': nc,
+            'primitive_calls': cc,
+            'self_s': round(tt, 4),
+            'cumulative_s': round(ct, 4),
+        })
+    return {
+        'total_s': round(sum(r['self_s'] for r in rows), 4),
+        'by_self': sorted(rows, key=lambda r: -r['self_s'])[:top],
+        'by_cumulative': sorted(rows, key=lambda r: -r['cumulative_s'])[:top],
+    }
+
+
+def pstats_bytes(profiler):
+    """与 Profile.dump_stats 相同的 marshal 格式，可用 pstats / snakeviz 打开"""
+    profiler.create_stats()
+    return marshal.dumps(profiler.stats)
+
+
+# ---------------------------------------------------------------------------
+# cpu：栈采样（speedscope）
+# ---------------------------------------------------------------------------
+
+class StackSampler:
+    """后台线程按固定间隔采样目标线程的调用栈"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL_S):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = []   # [(栈元组，根在前), 权重秒]
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, frame.f_lineno if not stack else code.co_firstlineno))
+                frame = frame.f_back
+            self.samples.append((tuple(reversed(stack)), now - last))
+            last = now
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def summary(self, top=TOP_N):
+        total = sum(w for _, w in self.samples) or 1.0
+        own, inclusive = Counter(), Counter()
+        for stack, weight in self.samples:
+            name, filename, lineno = stack[-1]
+            own[_func_label(filename, lineno, name)] += weight
+            for label in {_func_label(f, l, n) for n, f, l in stack}:
+                inclusive[label] += weight
+        return {
+            'samples': len(self.samples),
+            'sampled_s': round(total, 4),
+            'by_self': [{'function': k, 'self_pct': round(v / total * 100, 1)} for k, v in own.most_common(top)],
+            'by_cumulative': [{'function': k, 'cumulative_pct': round(v / total * 100, 1)}
+                              for k, v in inclusive.most_common(top)],
+        }
+
+    def speedscope(self, name):
+        """speedscope 的 sampled 格式（https://www.speedscope.app）"""
+        frames, index = [], {}
+        samples, weights = [], []
+        for stack, weight in self.samples:
+            ids = []
+            for fn, filename, lineno in stack:
+                key = (fn, filename, lineno)
+                if key not in index:
+                    index[key] = len(frames)
+                    frames.append({'name': fn, 'file': _short_path(filename), 'line': lineno})
+                ids.append(index[key])
+            samples.append(ids)
+            weights.append(round(weight, 6))
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'bbl-decoder',
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled', 'name': name, 'unit': 'seconds',
+                'startValue': 0, 'endValue': round(sum(weights), 6),
+                'samples': samples, 'weights': weights,
+            }],
+        }
+
+
+# ---------------------------------------------------------------------------
+# mem：tracemalloc
+# ---------------------------------------------------------------------------
+
+class PeakSnapshotter:
+    """后台线程盯住已追踪内存，每创新高 PEAK_SNAPSHOT_GROWTH 倍就拍一次快照"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.snapshot = None
+        self.snapshot_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        taken = 0
+        while not self._stop.wait(self.interval):
+            current = tracemalloc.get_traced_memory()[0]
+            if current > max(taken, 1 << 20) * PEAK_SNAPSHOT_GROWTH:
+                self.snapshot = tracemalloc.take_snapshot()
+                # 拍快照本身也会分配内存，以拍完后的值作为下次比较基准
+                taken = max(current, tracemalloc.get_traced_memory()[0])
+                self.snapshot_mb = current / (1024 * 1024)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def _snapshot_top(snapshot, top):
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+        tracemalloc.Filter(False, __file__),
+    ])
+    sites = []
+    for stat in snapshot.statistics('lineno')[:top]:
+        frame = stat.traceback[0]
+        sites.append({
+            'site': f"{_short_path(frame.filename)}:{frame.lineno}",
+            'size_mb': round(stat.size / (1024 * 1024), 3),
+            'blocks': stat.count,
+        })
+    tracebacks = []
+    for stat in snapshot.statistics('traceback')[:5]:
+        tracebacks.append({
+            'size_mb': round(stat.size / (1024 * 1024), 3),
+            'stack': [f"{_short_path(f.filename)}:{f.lineno}" for f in stat.traceback],
+        })
+    return sites, tracebacks
+
+
+def run_mem(fn, top=TOP_N):
+    already = tracemalloc.is_tracing()
+    if not already:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    tracemalloc.reset_peak()
+    try:
+        with PeakSnapshotter() as watcher:
+            result = fn()
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = watcher.snapshot or tracemalloc.take_snapshot()
+    finally:
+        if not already:
+            tracemalloc.stop()
+    sites, tracebacks = _snapshot_top(snapshot, top)
+    return result, {
+        'peak_mb': round(peak / (1024 * 1024), 2),
+        'retained_mb': round(current / (1024 * 1024), 2),
+        'snapshot_mb': round(watcher.snapshot_mb, 2),
+        'top_sites': sites,
+        'top_tracebacks': tracebacks,
+    }
+
+
+# ---------------------------------------------------------------------------
+# 入口
+# ---------------------------------------------------------------------------
+
+def run(mode, fmt, fn, name='decode', top=TOP_N):
+    """
+    在剖析器下执行 fn()，返回 (fn 的返回值, 摘要 dict, 下载内容)
+    下载内容为 None（summary）或 (bytes, media_type, 文件名)
+    """
+    t = time.perf_counter()
+    artifact = None
+    if mode == 'mem':
+        result, report = run_mem(fn, top)
+    elif fmt == 'speedscope':
+        with StackSampler(threading.get_ident()) as sampler:
+            result = fn()
+        report = sampler.summary(top)
+        artifact = (_json_bytes(sampler.speedscope(name)), 'application/json', f'{name}.speedscope.json')
+    else:
+        profiler = cProfile.Profile()
+        result = profiler.runcall(fn)
+        report = cprofile_summary(profiler, top)
+        if fmt == 'pstats':
+            artifact = (pstats_bytes(profiler), 'application/octet-stream', f'{name}.pstats')
+    report = dict({'mode': mode, 'format': fmt, 'wall_s': round(time.perf_counter() - t, 4)}, **report)
+    return result, report, artifact
+
+
+def _json_bytes(obj):
+    import json
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+
+def frame_type_counts(log_bytes):
+    """
+    单独用 orangebox 再解析一遍选中的 log，按帧类型计数（I/P/S/G/H/E），
+    并统计各类事件以及被 _patch_orangebox 跳过的事件。只在剖析请求中调用，不影响剖析结果
+    """
+    from orangebox import Parser
+    from orangebox.types import EventType
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.BBL') as tmp:
+        tmp.write(log_bytes)
+        tmp_path = tmp.name
+    try:
+        parser = Parser.load(tmp_path)
+        frame_types, events = Counter(), Counter()
+        skipped = []
+        parse_frame, parse_event = parser._parse_frame, parser._parse_event_frame
+
+        def counting_parse_frame(fdefs, reader):
+            frame_types[parser._ctx.frame_type.value] += 1
+            return parse_frame(fdefs, reader)
+
+        def counting_parse_event(reader):
+            byte = None
+            try:
+                byte = reader.value()
+                name = EventType(byte).name
+            except IndexError:
+                name = 'truncated'
+            except ValueError:
+                name = f"unknown({byte})"
+            frame_types['E'] += 1
+            events[name] += 1
+            ok = parse_event(reader)
+            if not ok:
+                skipped.append(name)
+            return ok
+
+        parser._parse_frame = counting_parse_frame
+        parser._parse_event_frame = counting_parse_event
+        emitted = sum(1 for _ in parser.frames())
+        stats = parser._ctx.stats
+    finally:
+        os.unlink(tmp_path)
+
+    return {
+        'frames': dict(sorted(frame_types.items())),
+        'events': dict(events.most_common()),
+        'events_skipped': dict(Counter(skipped).most_common()),
+        'emitted_frames': emitted,
+        'invalid_frames': stats['invalid'],
+        'dropped_frames': stats['skipped'],
+    }
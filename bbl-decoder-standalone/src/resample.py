@@ -0,0 +1,111 @@
+"""
+均匀网格重采样：按实际 time 列把各通道线性插值到精确等间隔的网格上
+不依赖 header 推算的帧间隔（P 帧比例、SD 卡写入卡顿、丢帧都会让它失真）
+- 帧间隔超过中位数 GAP_FACTOR 倍的区间视为缺帧，落在其中的网格点记入 gap 掩码（[起始点, 点数] 游程）
+- 帧间隔抖动统计：中位数 / 均值 / 标准差 / 分位数 / 不规则比例
+全部是 numpy 向量运算，可直接用于全速率列
+"""
+
+import numpy as np
+
+# 帧间隔超过中位数的该倍数视为缺帧区间
+GAP_FACTOR = 2.5
+# 帧间隔偏离中位数超过该比例算一次不规则间隔
+IRREGULAR_TOLERANCE = 0.1
+
+
+def nominal_frame_interval_us(headers, sample_interval_us):
+    """header 推算的帧间隔：PID 周期 * P 帧比例（P interval 为 'num/denom' 或 denom）"""
+    value = str(headers.get('P interval', '1')).strip()
+    try:
+        if '/' in value:
+            num, denom = (int(x) for x in value.split('/', 1))
+        else:
+            num, denom = 1, int(value)
+        if num > 0 and denom > 0:
+            return sample_interval_us * denom / num
+    except ValueError:
+        pass
+    return float(sample_interval_us)
+
+
+def timing_stats(time_us, nominal_us=None):
+    """实际帧间隔统计；sample_rate_hz 由中位间隔得出，缺帧区间不计入抖动"""
+    time_us = np.asarray(time_us, dtype=np.int64)
+    header_hz = round(1_000_000 / nominal_us, 1) if nominal_us else None
+    dt = np.diff(time_us)
+    dt = dt[dt > 0]
+    if dt.size == 0:
+        return {'sample_rate_hz': header_hz or 0, 'header_rate_hz': header_hz, 'dt_us': None,
+                'irregular_ratio': 0.0, 'gaps': 0, 'gap_s': 0.0}
+
+    median = float(np.median(dt))
+    gaps = dt > GAP_FACTOR * median
+    regular = dt[~gaps]
+    p1, p99 = np.percentile(regular, [1, 99])
+    return {
+        'sample_rate_hz': round(1_000_000 / median, 1),
+        'header_rate_hz': header_hz,
+        'dt_us': {
+            'median': round(median, 1),
+            'mean': round(float(regular.mean()), 1),
+            'std': round(float(regular.std()), 1),
+            'p1': round(float(p1), 1),
+            'p99': round(float(p99), 1),
+            'max': int(dt.max()),
+        },
+        'irregular_ratio': round(float(np.mean(np.abs(regular - median) > IRREGULAR_TOLERANCE * median)), 4),
+        'gaps': int(gaps.sum()),
+        # 缺失的时长：gap 区间减去一个正常帧间隔
+        'gap_s': round(float((dt[gaps] - median).sum()) / 1_000_000, 3),
+    }
+
+
+class UniformGrid:
+    """从首帧开始、间隔 dt_us 的等间隔网格；每个网格点对应的源区间和插值系数只算一次，所有通道共用"""
+
+    def __init__(self, time_us, dt_us, gap_us=None):
+        t = np.asarray(time_us, dtype=np.float64)
+        self.dt_us = float(dt_us)
+        if t.size < 2:
+            self.times = t.copy()
+            self._idx = np.zeros(t.size, dtype=np.int64)
+            self._frac = np.zeros(t.size)
+            self.mask = np.zeros(t.size, dtype=bool)
+            return
+
+        count = int((t[-1] - t[0]) // self.dt_us) + 1
+        self.times = t[0] + self.dt_us * np.arange(count)
+        idx = np.clip(np.searchsorted(t, self.times, side='right') - 1, 0, t.size - 2)
+        left = t[idx]
+        span = t[idx + 1] - left
+        with np.errstate(divide='ignore', invalid='ignore'):
+            frac = np.where(span > 0, (self.times - left) / span, 0.0)
+        self._idx = idx
+        self._frac = np.clip(frac, 0.0, 1.0)
+        # 恰好落在 gap 左端真实帧上的网格点不算缺失
+        self.mask = (span > gap_us) & (self.times > left) if gap_us else np.zeros(count, dtype=bool)
+
+    def __len__(self):
+        return len(self.times)
+
+    def sample(self, values):
+        """线性插值到网格：values 为 (n,) 或 (k, n)，返回 (points,) 或 (k, points) 的 float64"""
+        values = np.asarray(values, dtype=np.float64)
+        if values.shape[-1] < 2:
+            return values[..., self._idx]
+        lo = values[..., self._idx]
+        hi = values[..., self._idx + 1]
+        return lo + (hi - lo) * self._frac
+
+    def gap_runs(self):
+        """gap 掩码的游程编码：[[起始网格点, 点数], ...]"""
+        edges = np.diff(np.concatenate(([0], self.mask.astype(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        return np.stack([starts, ends - starts], axis=1).tolist()
+
+
+def gap_threshold_us(timing):
+    dt = timing.get('dt_us')
+    return GAP_FACTOR * dt['median'] if dt else None
@@ -0,0 +1,286 @@
+"""
+容错逐帧解码：替代 orangebox Parser.frames() 的主循环
+- 遇到损坏（非法帧标记、未知事件、解码异常、迭代号/时间戳不合理）时不逐字节爬行，
+  而是跳到下一个可信的 I 帧（帧标记 + I 帧间隔整数倍的 loopIteration + 与上一个好帧一致的时间戳）
+- 跳过的字节区间记入损坏索引（meta.corruption），告警按类别计数而不是逐条打印
+- 干净的 log 逐帧与 orangebox 一致（bench/diff_decoder.py 校验）
+"""
+
+import bisect
+from collections import Counter
+
+import numpy as np
+
+# meta 中最多列出的损坏区间，其余只计入总数
+MAX_RANGES = 50
+# P 帧相对上一帧的时间上限：diter * 名义周期 * 倍数 + 余量（容忍调度抖动和偶发的长循环）
+P_TIME_FACTOR = 8
+P_TIME_SLACK_US = 20_000
+# 重同步候选 I 帧与上一个好帧之间 dt/diter 允许偏离名义周期的倍数
+RESYNC_RATE_FACTOR = 4
+# 候选 I 帧：读完整帧后下一字节也必须是合法帧标记，连续尝试的候选数上限
+MAX_CANDIDATE_TRIES = 64
+# 每解码这么多帧调用一次进度回调
+PROGRESS_FRAMES = 8192
+
+EVENT_INFLIGHT_ADJUSTMENT = 13
+EVENT_LOGGING_RESUME = 14
+EVENT_DISARM = 15
+# orangebox 不解析负载（或不认识）的 Betaflight 事件：事件号 -> 负载中无符号变长整数的个数
+VB_PAYLOAD_EVENTS = {EVENT_LOGGING_RESUME: 2, EVENT_DISARM: 1}
+
+
+class CorruptionIndex:
+    """损坏区间和告警计数，偏移量相对于选中 log 的帧数据起点（header 之后）"""
+
+    def __init__(self, header_size=0):
+        self.header_size = header_size
+        self.ranges = []
+        self.range_count = 0
+        self.skipped_bytes = 0
+        self.frames_lost = 0
+        self.warnings = Counter()
+
+    def skip(self, start, end, reason, frames_lost=0):
+        self.warnings[reason] += 1
+        if end <= start:
+            return
+        self.range_count += 1
+        self.skipped_bytes += end - start
+        self.frames_lost += max(0, int(frames_lost))
+        if len(self.ranges) < MAX_RANGES:
+            self.ranges.append([self.header_size + start, self.header_size + end, reason])
+
+    def to_meta(self):
+        meta = {
+            'regions': self.range_count,
+            'skipped_bytes': self.skipped_bytes,
+            'frames_lost_est': self.frames_lost,
+            'ranges': self.ranges,
+            'warnings': dict(self.warnings.most_common()),
+        }
+        if self.range_count > len(self.ranges):
+            meta['ranges_truncated'] = True
+        return meta
+
+    def summary(self):
+        warnings = ', '.join(f"{k}={v}" for k, v in self.warnings.most_common())
+        return f"{self.range_count} corrupt region(s), {self.skipped_bytes} bytes skipped ({warnings})"
+
+
+def _uvb_at(data, starts):
+    """向量化读取 starts 处的无符号变长整数，返回 (值, 字节数)；字节数 0 表示越界或超过 5 字节"""
+    n = len(data)
+    values = np.zeros(len(starts), dtype=np.int64)
+    lengths = np.zeros(len(starts), dtype=np.int64)
+    done = np.zeros(len(starts), dtype=bool)
+    for k in range(5):
+        idx = starts + k
+        inside = idx < n
+        b = data[np.minimum(idx, n - 1)].astype(np.int64)
+        active = ~done & inside
+        values[active] |= (b[active] & 0x7F) << (7 * k)
+        ended = active & (b < 0x80)
+        lengths[ended] = k + 1
+        done |= ended | ~inside
+    return values, lengths
+
+
+def iframe_candidates(buf, i_interval):
+    """帧数据中所有可能是 I 帧起点的位置：'I' 标记后紧跟两个可解码的变长整数，
+    且第一个（loopIteration）是 I 帧间隔的整数倍。返回 (位置, 迭代号, 时间)"""
+    data = np.frombuffer(buf, dtype=np.uint8)
+    pos = np.flatnonzero(data == ord('I'))
+    iteration, n1 = _uvb_at(data, pos + 1)
+    time_us, n2 = _uvb_at(data, pos + 1 + n1)
+    ok = (n1 > 0) & (n2 > 0) & (iteration % max(1, i_interval) == 0)
+    return pos[ok].tolist(), iteration[ok].tolist(), time_us[ok].tolist()
+
+
+def _read_event_payload(event, reader):
+    """读取 orangebox 不解析的事件负载，使下一个字节落在帧标记上；返回 (事件名, 数据)"""
+    from orangebox.decoders import _signed_vb, _unsigned_vb
+
+    if event == EVENT_INFLIGHT_ADJUSTMENT:
+        function = next(reader)
+        if function & 0x80:
+            value = bytes(next(reader) for _ in range(4))  # float 新值（小端）
+            value = float(np.frombuffer(value, dtype='<f4')[0])
+        else:
+            value = _signed_vb(reader)
+        return 'INFLIGHT_ADJUSTMENT', {'function': function & 0x7F, 'value': value}
+    if event == EVENT_LOGGING_RESUME:
+        return 'LOGGING_RESUME', {'iteration': _unsigned_vb(reader), 'time_us': _unsigned_vb(reader)}
+    return 'DISARM', {'reason': _unsigned_vb(reader)}
+
+
+def decode_iframe_at(parser, pos, markers):
+    """试解码 pos 处的候选 I 帧（不改变解码状态）：完整读完且下一字节是合法帧标记或结尾时返回字段值，否则 None"""
+    from orangebox.types import FrameType
+
+    ctx, reader = parser._ctx, parser.reader
+    buf = reader._frame_data
+    saved = (ctx.frame_type, ctx.field_index, getattr(ctx, 'current_frame', ()))
+    try:
+        reader.seek(pos + 1)
+        ctx.frame_type = FrameType.INTRA
+        frame = parser._parse_frame(reader.field_defs[FrameType.INTRA], reader)
+        end = reader.tell()
+        return frame.data if end >= len(buf) or buf[end] in markers else None
+    except Exception:
+        return None
+    finally:
+        ctx.frame_type, ctx.field_index, ctx.current_frame = saved
+
+
+def decode_frames(parser, us_per_iter, progress=None):
+    """
+    用 orangebox 的字段解码器逐帧解析当前 log，返回 (frames_list, events, CorruptionIndex)
+    events: [{'type': 事件名, 'frame': 事件之后第一个主帧的序号, 'data': ...}, ...]
+    us_per_iter: 每个 loopIteration 的名义微秒数（looptime * pid_process_denom）
+    progress: 可选回调 progress('decode', bytes_done=, bytes_total=, frames=)
+    """
+    index = CorruptionIndex(parser.reader._header_size)
+    events = []
+    frames = list(iter_frames(parser, us_per_iter, index, events, progress))
+    return frames, events, index
+
+
+def iter_frames(parser, us_per_iter, index, events, progress=None):
+    """decode_frames 的生成器版本：逐个 yield 主帧（已附加最近的 S / G 帧字段），不保留已输出的帧
+    事件追加到 events，损坏区间记录到 index（CorruptionIndex）；/export 流式输出用
+    """
+    from orangebox.types import EventType, Frame, FrameType
+
+    reader = parser.reader
+    ctx = parser._ctx
+    field_defs = reader.field_defs
+    buf = reader._frame_data
+    size = len(buf)
+    markers = {ord(t.value): t for t in FrameType}
+    known_events = {e.value for e in EventType}
+    i_interval = getattr(ctx, 'i_interval', 0) or 1
+
+    has_slow = FrameType.SLOW in field_defs
+    has_gps = FrameType.GPS in field_defs
+    empty_slow = [""] * len(field_defs[FrameType.SLOW]) if has_slow else []
+    empty_gps = [""] * (len(field_defs[FrameType.GPS]) - 1) if has_gps else []
+
+    count = 0
+    last_slow = last_gps = None
+    last_time = last_iter = None
+    candidates = None
+
+    def plausible(ftype, iteration, time_us):
+        if last_iter is None:
+            return ftype == FrameType.INTRA
+        diter, dt = iteration - last_iter, time_us - last_time
+        if diter <= 0 or dt <= 0:
+            return False
+        if ftype == FrameType.INTER:
+            return diter <= i_interval and dt <= diter * us_per_iter * P_TIME_FACTOR + P_TIME_SLACK_US
+        return True
+
+    def resync(start, reason):
+        """从 start 之后找下一个可信 I 帧，记录跳过的区间，返回新位置（找不到时为 size）"""
+        nonlocal candidates
+        if candidates is None:
+            candidates = iframe_candidates(buf, i_interval)
+        positions, iters, times = candidates
+        k = bisect.bisect_right(positions, start)
+        tries = 0
+        while k < len(positions) and tries < MAX_CANDIDATE_TRIES:
+            pos, iteration, time_us = positions[k], iters[k], times[k]
+            k += 1
+            if last_iter is not None:
+                diter, dt = iteration - last_iter, time_us - last_time
+                if diter <= 0 or not (us_per_iter / RESYNC_RATE_FACTOR <= dt / diter <= us_per_iter * RESYNC_RATE_FACTOR):
+                    continue
+            tries += 1
+            if parses_cleanly(pos):
+                lost = (iteration - last_iter) / max(1, ctx.p_interval_denom) - 1 if last_iter is not None else 0
+                index.skip(start, pos, reason, lost)
+                return pos
+        index.skip(start, size, reason)
+        return size
+
+    def parses_cleanly(pos):
+        return decode_iframe_at(parser, pos, markers) is not None
+
+    pos = 0
+    while pos < size:
+        ftype = markers.get(buf[pos])
+        if ftype is None:
+            pos = resync(pos, 'invalid_marker')
+            continue
+        reader.seek(pos + 1)
+        ctx.frame_type = ftype
+
+        if ftype == FrameType.EVENT:
+            event = buf[pos + 1] if pos + 1 < size else None
+            if event is None or (event not in known_events and event not in VB_PAYLOAD_EVENTS):
+                pos = resync(pos, 'unknown_event' if event is not None else 'truncated')
+                continue
+            try:
+                if event in VB_PAYLOAD_EVENTS or event == EVENT_INFLIGHT_ADJUSTMENT:
+                    next(reader)
+                    name, data = _read_event_payload(event, reader)
+                    events.append({'type': name, 'frame': count, 'data': data})
+                elif parser._parse_event_frame(reader):
+                    parsed = parser._events[-1]
+                    events.append({'type': parsed.type.name, 'frame': count, 'data': parsed.data})
+                else:
+                    index.warnings['event_parse_error'] += 1
+            except Exception:
+                pos = resync(pos, 'truncated' if reader.tell() >= size else 'event_parse_error')
+                continue
+            ctx.read_frame_count += 1
+            if parser._end_of_log:
+                break
+            pos = reader.tell()
+            continue
+
+        if ftype not in field_defs:
+            pos = resync(pos, 'no_field_defs')
+            continue
+        try:
+            frame = parser._parse_frame(field_defs[ftype], reader)
+        except Exception:
+            pos = resync(pos, 'truncated' if reader.tell() >= size else 'decode_error')
+            continue
+        end = reader.tell()
+
+        if ftype == FrameType.SLOW:
+            last_slow = frame
+        elif ftype == FrameType.GPS:
+            last_gps = frame
+        elif ftype == FrameType.GPS_HOME:
+            ctx.add_frame(frame)
+        else:
+            time_us = ctx.get_current_value_by_name(ftype, "time")
+            iteration = ctx.get_current_value_by_name(ftype, "loopIteration")
+            if not plausible(ftype, iteration, time_us):
+                pos = resync(pos, 'implausible_frame')
+                continue
+            if end < size and buf[end] not in markers:
+                # 帧后紧跟非法标记：这一帧本身多半已损坏，丢弃
+                pos = resync(pos, 'invalid_marker')
+                continue
+            ctx.last_iter = iteration
+            extra = list(last_slow.data) if last_slow else empty_slow
+            if has_gps:
+                extra = extra + (list(last_gps.data[1:]) if last_gps else empty_gps)
+            frame = Frame(ftype, frame.data + tuple(extra))
+            ctx.add_frame(frame)
+            yield frame
+            count += 1
+            last_time, last_iter = time_us, iteration
+            if progress is not None and count % PROGRESS_FRAMES == 0:
+                progress('decode', bytes_done=end, bytes_total=size, frames=count)
+        ctx.read_frame_count += 1
+        pos = end
+
+    for kind, n in getattr(parser, 'warning_counts', {}).items():
+        index.warnings[kind] += n
+    if progress is not None:
+        progress('decode', bytes_done=size, bytes_total=size, frames=count)
@@ -0,0 +1,150 @@
+"""
+飞行段落切分：时间跳跃 + 解锁状态（S 帧 flightModeFlags）+ 事件（disarm / log end / resume）+ 电机怠速
+- 未解锁的帧和持续 IDLE_MIN_S 以上的地面怠速被裁掉，两次起飞之间的怠速会把飞行分开；
+  怠速中短于 IDLE_GAP_S 的电机噪声尖峰不打断怠速
+- 边界检测全部是对全速率列的 np.diff / 布尔游程运算
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+# 时间跳跃阈值：超过 1 秒（或时间倒退）认为是新段落
+TIME_GAP_US = 1_000_000
+# 最大电机输出（按电机输出范围归一化）低于该值视为怠速
+IDLE_LEVEL = 0.10
+# 怠速持续超过该时长才裁掉 / 切分（空中短暂收油时 airmode 仍会让电机高于怠速）
+IDLE_MIN_S = 0.5
+# 怠速之间短于该时长的非怠速帧（地面上电机输出的噪声尖峰）并入怠速，真正的起飞持续远超过它
+IDLE_GAP_S = 0.1
+# 段落最短时长和帧数
+MIN_SEGMENT_S = 1.0
+MIN_SEGMENT_FRAMES = 10
+# flightModeFlags 中 ARM 开关的位（Betaflight 记录的是 box 激活掩码，BOXARM = 0）
+ARM_FLAG = 1 << 0
+# 这些事件所在的帧是段落边界
+SPLIT_EVENTS = ('DISARM', 'LOG_END', 'LOGGING_RESUME')
+
+Segment = namedtuple('Segment', ['start', 'end', 'duration', 'end_reason'])
+
+
+def armed_mask(flags, known=None):
+    """ARM 位；第一个 S 帧之前（known 为 False）沿用第一个已知值。log 中从未出现 ARM 位时返回 None（无解锁信息）"""
+    if flags is None or not len(flags):
+        return None
+    armed = (flags.astype(np.int64) & ARM_FLAG) != 0
+    if known is not None and known.any():
+        first = int(np.argmax(known))
+        armed[:first] = armed[first]
+    return armed if armed.any() else None
+
+
+def _runs(mask):
+    """布尔数组中 True 游程的 (起点, 终点) 数组"""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def _fill_runs(n, starts, ends):
+    """[starts, ends) 游程置 True 的长度 n 布尔数组（起止差分 + 累加，游程可以相邻）"""
+    delta = np.bincount(starts, minlength=n + 1) - np.bincount(ends, minlength=n + 1)
+    return np.cumsum(delta[:n]) > 0
+
+
+def long_idle_mask(time_us, motor, motor_range, min_s=IDLE_MIN_S, gap_s=IDLE_GAP_S):
+    """持续 min_s 以上、所有电机都接近怠速的帧；两段怠速之间短于 gap_s 的非怠速帧先并入怠速"""
+    lo, hi = motor_range
+    idle = (motor.max(axis=0) - lo) / (hi - lo) < IDLE_LEVEL
+    n = len(time_us)
+    starts, ends = _runs(~idle)
+    inner = (starts > 0) & (ends < n)  # 两侧都是怠速
+    starts, ends = starts[inner], ends[inner]
+    short = (time_us[ends] - time_us[starts - 1]) < gap_s * 1_000_000
+    idle |= _fill_runs(n, starts[short], ends[short])
+    starts, ends = _runs(idle)
+    long = (time_us[ends - 1] - time_us[starts]) >= min_s * 1_000_000
+    return _fill_runs(n, starts[long], ends[long])
+
+
+def find_flight_segments(time_us, motor=None, motor_range=None, armed=None, events=()):
+    """
+    返回 [Segment(start, end, duration_s, end_reason), ...]，end 为开区间
+    motor: (4, n) 全速率电机列；armed: armed_mask() 的结果；events: [{'type', 'frame'}, ...]
+    找不到有效飞行段时退回只按时间跳跃切分（再不行就是整个 log）
+    """
+    time_us = np.asarray(time_us, dtype=np.int64)
+    n = len(time_us)
+    if n < MIN_SEGMENT_FRAMES:
+        return [Segment(0, n, 0.0, 'log_end')]
+
+    # cut[i]：第 i 帧与前一帧之间是边界
+    dt = np.diff(time_us)
+    time_cut = np.zeros(n, dtype=bool)
+    time_cut[1:] = (dt > TIME_GAP_US) | (dt < 0)
+    event_cut = np.zeros(n, dtype=bool)
+    for event in events:
+        if event['type'] in SPLIT_EVENTS and 0 < event['frame'] < n:
+            event_cut[event['frame']] = True
+    cut = time_cut | event_cut
+
+    idle = long_idle_mask(time_us, motor, motor_range) if motor is not None and motor_range else None
+    active = np.ones(n, dtype=bool)
+    if armed is not None:
+        active &= armed
+    if idle is not None:
+        active &= ~idle
+
+    segments = _split(time_us, active, cut)
+    if not segments:
+        segments = _split(time_us, np.ones(n, dtype=bool), time_cut, min_s=0)
+    if not segments:
+        segments = [(0, n)]
+
+    result = []
+    for start, end in segments:
+        if end >= n:
+            reason = 'log_end'
+        elif time_cut[end]:
+            reason = 'time_gap'
+        elif event_cut[end] or (armed is not None and not armed[end]):
+            reason = 'disarm'
+        elif idle is not None and idle[end]:
+            reason = 'idle'
+        else:
+            reason = 'split'
+        result.append(Segment(int(start), int(end), (time_us[end - 1] - time_us[start]) / 1_000_000, reason))
+    return result
+
+
+def _split(time_us, active, cut, min_s=MIN_SEGMENT_S):
+    """active 的游程再按 cut 切开，返回满足最短时长 / 帧数的 [(start, end), ...]"""
+    n = len(time_us)
+    prev_inactive = np.concatenate(([True], ~active[:-1]))
+    next_inactive = np.concatenate((~active[1:], [True]))
+    next_cut = np.concatenate((cut[1:], [True]))
+    starts = np.flatnonzero(active & (prev_inactive | cut))
+    ends = np.flatnonzero(active & (next_inactive | next_cut)) + 1
+    keep = ((ends - starts) >= MIN_SEGMENT_FRAMES) & \
+           ((time_us[np.minimum(ends, n) - 1] - time_us[starts]) >= min_s * 1_000_000)
+    return list(zip(starts[keep].tolist(), ends[keep].tolist()))
+
+
+def describe_segments(segments, time_us, used=None):
+    """meta.segments：每段相对 log 首帧的起止时间、时长、帧数和结束原因"""
+    if not len(time_us):
+        return []
+    t0 = time_us[0]
+    table = []
+    for i, seg in enumerate(segments):
+        row = {
+            'index': i + 1,
+            'start_s': round(float(time_us[seg.start] - t0) / 1_000_000, 2),
+            'end_s': round(float(time_us[seg.end - 1] - t0) / 1_000_000, 2),
+            'duration_s': round(float(seg.duration), 1),
+            'frames': seg.end - seg.start,
+            'end_reason': seg.end_reason,
+        }
+        if used is not None and seg == used:
+            row['used'] = True
+        table.append(row)
+    return table
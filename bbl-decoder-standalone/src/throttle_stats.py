@@ -0,0 +1,124 @@
+"""
+按油门分档的时域统计引擎
+所有全速率样本按油门分档后，用 np.bincount 一次聚合全部统计量（没有逐帧循环）
+新增统计量只需用 @bin_stat 注册一个取值函数
+"""
+
+import numpy as np
+
+# 油门分档边界（百分比）：怠速/悬停/中段/高段/满油门
+THROTTLE_EDGES_PCT = [0, 20, 40, 60, 80, 100]
+
+# 已注册的统计量：(name, requires, reduce, digits, fn)
+_BIN_STATS = []
+
+
+def bin_stat(name, requires, reduce='mean', digits=1):
+    """
+    注册一个分档统计量
+    - requires: 需要的列名，缺任何一列时自动跳过
+    - reduce: 'mean' 取均值，'rms' 取均方根
+    - fn(cols) 返回 (n,) 或 (k, n) 的逐样本数值
+    """
+    def decorator(fn):
+        _BIN_STATS.append((name, tuple(requires), reduce, digits, fn))
+        return fn
+    return decorator
+
+
+@bin_stat('gyro_rms', ('gyro',), reduce='rms')
+def _gyro_rms(cols):
+    return cols['gyro']
+
+
+@bin_stat('pid_err_rms', ('gyro', 'setpoint'), reduce='rms')
+def _pid_error_rms(cols):
+    n_axes = min(len(cols['gyro']), len(cols['setpoint']))
+    return cols['setpoint'][:n_axes] - cols['gyro'][:n_axes]
+
+
+@bin_stat('dterm_rms', ('axisD',), reduce='rms')
+def _dterm_rms(cols):
+    return cols['axisD']
+
+
+@bin_stat('motor_sat', ('motor',), digits=3)
+def _motor_saturation(cols):
+    """任一电机输出到顶（>= 上限的 99%）的样本比例"""
+    lo, hi = cols['motor_range']
+    return (cols['motor'] >= lo + (hi - lo) * 0.99).any(axis=0)
+
+
+@bin_stat('motor_spread', ('motor',), digits=3)
+def _motor_spread(cols):
+    """电机输出极差（归一化到 0..1），反映混控修正力度"""
+    lo, hi = cols['motor_range']
+    return (cols['motor'].max(axis=0) - cols['motor'].min(axis=0)) / (hi - lo)
+
+
+@bin_stat('vbat', ('vbat',), digits=2)
+def _vbat(cols):
+    return cols['vbat'] / 100
+
+
+@bin_stat('amp', ('amp',))
+def _amp(cols):
+    return cols['amp'] / 100
+
+
+@bin_stat('sag_v', ('vbat',), digits=2)
+def _voltage_sag(cols):
+    """相对静置电压（全程 95 分位）的压降"""
+    vbat = cols['vbat'] / 100
+    return np.percentile(vbat, 95) - vbat
+
+
+def _has_column(cols, name):
+    col = cols.get(name)
+    return col is not None and np.size(col) > 0
+
+
+def throttle_binned_stats(cols, throttle, edges_pct=THROTTLE_EDGES_PCT):
+    """
+    cols: 列名 -> ndarray（(n,) 或 (k, n)），另可含 motor_range 等标量
+    throttle: 归一化油门 (n,)
+    返回紧凑表格：每个统计量一个列表，按档位排列，空档为 None
+    """
+    throttle = np.asarray(throttle, dtype=np.float64)
+    n = throttle.size
+    n_bins = len(edges_pct) - 1
+    edges = np.asarray(edges_pct[1:-1], dtype=np.float64) / 100
+    bin_idx = np.digitize(throttle, edges)
+    counts = np.bincount(bin_idx, minlength=n_bins)
+
+    table = {'thr_pct': list(edges_pct), 'frames': counts.tolist()}
+    for name, requires, reduce, digits, fn in _BIN_STATS:
+        if not all(_has_column(cols, r) for r in requires):
+            continue
+        values = np.asarray(fn(cols), dtype=np.float64)
+        scalar = values.ndim == 1
+        values = np.atleast_2d(values)
+        if values.shape[1] != n:
+            continue
+        if reduce == 'rms':
+            values = values * values
+
+        # 所有行偏移到不同的档位区间，一次 bincount 完成 (k, bins) 聚合
+        rows = values.shape[0]
+        flat_idx = (bin_idx + n_bins * np.arange(rows)[:, None]).ravel()
+        sums = np.bincount(flat_idx, weights=values.ravel(), minlength=rows * n_bins).reshape(rows, n_bins)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            agg = sums / counts
+        if reduce == 'rms':
+            agg = np.sqrt(agg)
+
+        per_bin = []
+        for b in range(n_bins):
+            if counts[b] == 0:
+                per_bin.append(None)
+            elif scalar:
+                per_bin.append(round(float(agg[0, b]), digits))
+            else:
+                per_bin.append([round(float(v), digits) for v in agg[:, b]])
+        table[name] = per_bin
+    return table
@@ -0,0 +1,225 @@
+"""
+压缩传输：上传支持 Content-Encoding: gzip / zstd 以及 .gz / .zst / .zip 文件，响应按 Accept-Encoding 压缩
+- 请求体边接收边解压（不先缓存压缩数据），解压后的大小有上限（防压缩炸弹）
+- 上传的文件按魔数识别 gzip / zstd / zip，不依赖文件名；zip 中须恰好有一个 BBL 成员
+- 响应压缩为 ASGI 中间件：gzip / br / zstd，级别偏向低延迟；流式响应逐块 flush，不影响渐进式输出
+- zstd 依赖 zstandard（Python 3.14+ 为标准库 compression.zstd），br 依赖 brotli，均为可选依赖
+"""
+
+import io
+import zipfile
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+# 解压后的上传大小上限（环境变量 BBL_MAX_UPLOAD_MB 可覆盖）
+DEFAULT_MAX_UPLOAD_MB = 1024
+# 响应压缩级别：延迟优先（gzip 3 约为 6 的 1/3 耗时，体积只大 ~10%）
+GZIP_LEVEL = 3
+ZSTD_LEVEL = 3
+BROTLI_QUALITY = 4
+# 小于该字节数的响应不压缩
+MIN_RESPONSE_BYTES = 1024
+# 同等 q 值时的优先顺序
+RESPONSE_ENCODINGS = ('zstd', 'br', 'gzip')
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/', 'application/vnd.apache.arrow.stream',
+                      'application/msgpack', 'application/x-npz')
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+ZIP_MAGIC = b'PK\x03\x04'
+BBL_EXTENSIONS = ('.bbl', '.bfl', '.txt')
+_CHUNK = 1 << 20
+
+
+class TransportError(ValueError):
+    pass
+
+
+class UnsupportedEncodingError(TransportError):
+    pass
+
+
+class UploadTooLargeError(TransportError):
+    pass
+
+
+def _zstd():
+    try:
+        from compression import zstd  # Python 3.14+
+        return zstd
+    except ImportError:
+        pass
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+
+def _stdlib_zstd(zstd):
+    return zstd.__name__ == 'compression.zstd'
+
+
+def _brotli():
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+class Decompressor:
+    """增量解压：feed(块) 返回解压后的字节，累计超过 max_bytes 时抛 UploadTooLargeError"""
+
+    def __init__(self, encoding, max_bytes):
+        self.max_bytes = max_bytes
+        self.total = 0
+        encoding = encoding.strip().lower()
+        if encoding in ('gzip', 'x-gzip', 'deflate'):
+            self._obj = zlib.decompressobj(32 + zlib.MAX_WBITS)  # 自动识别 gzip / zlib 头
+        elif encoding == 'zstd':
+            zstd = _zstd()
+            if zstd is None:
+                raise UnsupportedEncodingError("zstd uploads require zstandard (pip install zstandard)")
+            self._obj = zstd.ZstdDecompressor() if _stdlib_zstd(zstd) else zstd.ZstdDecompressor().decompressobj()
+        else:
+            raise UnsupportedEncodingError(f"Unsupported Content-Encoding: {encoding} (supported: gzip, zstd)")
+
+    def feed(self, data):
+        if not data:  # 请求体结束时的空块（zstandard 的 decompressobj 在帧结束后不能再调用）
+            return b''
+        try:
+            out = self._obj.decompress(data)
+        except Exception as e:
+            raise TransportError(f"Corrupt compressed upload: {e}")
+        self.total += len(out)
+        if self.total > self.max_bytes:
+            raise UploadTooLargeError(f"Decompressed upload exceeds {self.max_bytes // (1024 * 1024)} MB")
+        return out
+
+
+def decompress(data, encoding, max_bytes):
+    """一次性解压（按 _CHUNK 分块喂入，超过上限时尽早停止）"""
+    d = Decompressor(encoding, max_bytes)
+    view = memoryview(data)
+    return b''.join(d.feed(view[i:i + _CHUNK]) for i in range(0, len(view), _CHUNK))
+
+
+def content_encodings(headers):
+    """请求的 Content-Encoding 列表（按应用顺序），identity 不计"""
+    value = headers.get('content-encoding', '')
+    return [e.strip().lower() for e in value.split(',') if e.strip() and e.strip().lower() != 'identity']
+
+
+def unpack_file(data, max_bytes):
+    """上传的文件按魔数解包：gzip / zstd 解压，zip 取唯一的 BBL 成员，其他原样返回"""
+    if data[:2] == GZIP_MAGIC:
+        return decompress(data, 'gzip', max_bytes)
+    if data[:4] == ZSTD_MAGIC:
+        return decompress(data, 'zstd', max_bytes)
+    if data[:4] == ZIP_MAGIC:
+        try:
+            archive = zipfile.ZipFile(io.BytesIO(data))
+        except zipfile.BadZipFile as e:
+            raise TransportError(f"Corrupt zip upload: {e}")
+        with archive:
+            members = [i for i in archive.infolist() if not i.is_dir() and i.filename.lower().endswith(BBL_EXTENSIONS)]
+            if len(members) != 1:
+                raise TransportError(f"Zip upload must contain exactly one BBL file (found {len(members)}); "
+                                     f"use /decode/batch for several files")
+            if members[0].file_size > max_bytes:
+                raise UploadTooLargeError(f"Decompressed upload exceeds {max_bytes // (1024 * 1024)} MB")
+            return archive.read(members[0])
+    return data
+
+
+def choose_encoding(accept_encoding):
+    """按 Accept-Encoding（q 值，同等时按 RESPONSE_ENCODINGS 顺序）选择可用的响应编码，不压缩时返回 None"""
+    weights = {}
+    for part in accept_encoding.split(','):
+        name, *params = [p.strip() for p in part.split(';')]
+        q = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if name:
+            weights[name.lower()] = q
+    available = [e for e in RESPONSE_ENCODINGS
+                 if (e == 'gzip' or (e == 'zstd' and _zstd()) or (e == 'br' and _brotli()))
+                 and weights.get(e, weights.get('*', 0)) > 0]
+    if not available:
+        return None
+    return max(available, key=lambda e: weights.get(e, weights.get('*', 0)))
+
+
+class _Compressor:
+    """compress(块, final)：非 final 时 flush 到块边界，客户端可以立即解出已发送的部分"""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'gzip':
+            self._obj = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        elif encoding == 'br':
+            self._obj = _brotli().Compressor(quality=BROTLI_QUALITY)
+        else:
+            zstd = _zstd()
+            if _stdlib_zstd(zstd):
+                self._obj = zstd.ZstdCompressor(level=ZSTD_LEVEL)
+            else:
+                self._obj = zstd.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, data, final):
+        obj = self._obj
+        if self.encoding == 'gzip':
+            return obj.compress(data) + obj.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+        if self.encoding == 'br':
+            return obj.process(data) + (obj.finish() if final else obj.flush())
+        if _stdlib_zstd(_zstd()):
+            return obj.compress(data, obj.FLUSH_FRAME if final else obj.FLUSH_BLOCK)
+        import zstandard
+        return obj.compress(data) + obj.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH if final
+                                              else zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+
+class CompressionMiddleware:
+    """按 Accept-Encoding 压缩可压缩类型的响应；已带 Content-Encoding、太小或 SSE 的响应原样发送"""
+
+    def __init__(self, app, minimum_size=MIN_RESPONSE_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get('accept-encoding', ''))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        compressor = None
+
+        async def send_compressed(message):
+            nonlocal compressor
+            if message['type'] == 'http.response.start':
+                headers = MutableHeaders(scope=message)
+                length = headers.get('content-length')
+                content_type = headers.get('content-type', '')
+                if ('content-encoding' not in headers
+                        and content_type.startswith(COMPRESSIBLE_TYPES)
+                        and not content_type.startswith('text/event-stream')
+                        and (length is None or int(length) >= self.minimum_size)):
+                    compressor = _Compressor(encoding)
+                    del headers['content-length']
+                    headers['content-encoding'] = encoding
+                    headers.add_vary_header('Accept-Encoding')
+            elif message['type'] == 'http.response.body' and compressor is not None:
+                final = not message.get('more_body', False)
+                message = dict(message, body=compressor.compress(message.get('body', b''), final))
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
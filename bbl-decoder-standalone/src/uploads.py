@@ -0,0 +1,252 @@
+"""
+断点续传上传（tus 风格的简化协议）：POST /uploads 声明总长度，PATCH /uploads/{id} 按 Upload-Offset 追加分块，
+HEAD / GET 查询服务端已收到的偏移，连接中断后从该偏移继续；收完后自动作为 /jobs 任务解码
+- 分块暂存在本地目录（<id>.part + <id>.json），多进程部署共享；总暂存大小有上限，创建时按声明的长度预留
+- 分块可带 Upload-Checksum（<算法> <摘要>，摘要为 base64 或 hex），创建时的 Upload-Checksum 校验完整文件
+- 不带校验的分块边收边写，连接中断时已写入的部分保留；带校验的分块校验通过后才写入
+- 收完后只提交一次：提交前原子地创建 <id>.submit 标记（O_EXCL），并发的最后一个 PATCH 只有一个能认领
+- 超过 TTL 未更新的上传被清理
+"""
+
+import base64
+import binascii
+import fcntl
+import hashlib
+import json
+import os
+import secrets
+import time
+from contextlib import contextmanager
+
+# 暂存区总大小上限和未完成上传的保留时间（环境变量 BBL_UPLOAD_STAGING_MB / BBL_UPLOAD_TTL_S 可覆盖）
+DEFAULT_STAGING_MB = 2048
+DEFAULT_TTL_S = 24 * 3600
+CHECKSUM_ALGORITHMS = ('sha256', 'sha1', 'md5')
+RECEIVING, DONE = 'receiving', 'done'
+
+
+class UploadError(ValueError):
+    pass
+
+
+class UploadNotFoundError(UploadError):
+    pass
+
+
+class OffsetMismatchError(UploadError):
+    """Upload-Offset 与服务端已收到的偏移不一致（或另一个请求正在写入），offset 为当前偏移"""
+
+    def __init__(self, message, offset):
+        super().__init__(message)
+        self.offset = offset
+
+
+class ChecksumMismatchError(UploadError):
+    pass
+
+
+class StagingFullError(UploadError):
+    pass
+
+
+def parse_checksum(value):
+    """Upload-Checksum 头 '<算法> <摘要>'，返回 (算法, 摘要字节)；未指定时为 None"""
+    if not value:
+        return None
+    try:
+        algorithm, digest = value.strip().split(None, 1)
+    except ValueError:
+        raise UploadError("Upload-Checksum must be '<algorithm> <digest>'")
+    algorithm = algorithm.lower()
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise UploadError(f"Unsupported checksum algorithm: {algorithm} (supported: {', '.join(CHECKSUM_ALGORITHMS)})")
+    size = hashlib.new(algorithm).digest_size
+    digest = digest.strip()
+    try:
+        raw = bytes.fromhex(digest) if len(digest) == size * 2 else base64.b64decode(digest, validate=True)
+    except (ValueError, binascii.Error):
+        raise UploadError("Upload-Checksum digest must be hex or base64")
+    if len(raw) != size:
+        raise UploadError(f"Upload-Checksum digest has the wrong length for {algorithm}")
+    return algorithm, raw
+
+
+class UploadStore:
+    """暂存目录：<id>.part（已收到的前缀）+ <id>.json（长度、选项、校验、状态），每次操作直接读写文件，可跨进程使用"""
+
+    def __init__(self, root, max_bytes=DEFAULT_STAGING_MB * 1024 * 1024, ttl_s=DEFAULT_TTL_S):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        os.makedirs(root, exist_ok=True)
+
+    def part_path(self, upload_id):
+        return os.path.join(self.root, f'{upload_id}.part')
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.root, f'{upload_id}.json')
+
+    def _submit_path(self, upload_id):
+        return os.path.join(self.root, f'{upload_id}.submit')
+
+    def _write_meta(self, record):
+        tmp = self._meta_path(record['id']) + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(record, f)
+        os.replace(tmp, self._meta_path(record['id']))
+
+    def _records(self):
+        for name in os.listdir(self.root):
+            if name.endswith('.json'):
+                record = self.get(name[:-len('.json')])
+                if record is not None:
+                    yield record
+
+    def create(self, length, options, checksum=None):
+        """新建上传并预留 length 字节；暂存区放不下时抛 StagingFullError"""
+        self.purge()
+        reserved = sum(r['length'] for r in self._records() if r['state'] == RECEIVING)
+        if reserved + length > self.max_bytes:
+            raise StagingFullError(f"Upload staging area is full ({self.max_bytes // (1024 * 1024)} MB); retry later")
+        now = time.time()
+        record = {'id': secrets.token_urlsafe(12), 'state': RECEIVING, 'length': length, 'options': options,
+                  'checksum': [checksum[0], checksum[1].hex()] if checksum else None, 'job': None,
+                  'created': now, 'updated': now}
+        open(self.part_path(record['id']), 'wb').close()
+        self._write_meta(record)
+        return dict(record, offset=0)
+
+    def _load(self, upload_id):
+        if not upload_id or '/' in upload_id or upload_id.startswith('.'):
+            return None
+        try:
+            with open(self._meta_path(upload_id), encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def get(self, upload_id):
+        """上传记录（dict，offset 为已收到的字节数），不存在时返回 None"""
+        record = self._load(upload_id)
+        if record is None:
+            return None
+        if record['state'] == DONE:
+            record['offset'] = record['length']
+        else:
+            try:
+                record['offset'] = os.path.getsize(self.part_path(upload_id))
+            except FileNotFoundError:
+                return None
+        return record
+
+    def require(self, upload_id):
+        record = self.get(upload_id)
+        if record is None:
+            raise UploadNotFoundError("Unknown or expired upload")
+        return record
+
+    @contextmanager
+    def writer(self, upload_id, offset, checksum=None):
+        """PATCH 的写入上下文：yield write(块)，加排他锁并检查 offset；带 checksum 时先缓存，退出时校验后写入"""
+        record = self.require(upload_id)
+        if record['state'] != RECEIVING:
+            raise OffsetMismatchError("Upload is already complete", record['offset'])
+        with open(self.part_path(upload_id), 'ab') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise OffsetMismatchError("Another request is writing to this upload", record['offset'])
+            current = os.fstat(f.fileno()).st_size
+            if offset != current:
+                raise OffsetMismatchError(f"Upload-Offset {offset} does not match the received offset {current}",
+                                          current)
+            pending = []
+            received = [current]
+
+            def write(data):
+                if received[0] + len(data) > record['length']:
+                    raise UploadError(f"Chunk exceeds the declared Upload-Length ({record['length']})")
+                received[0] += len(data)
+                if checksum:
+                    pending.append(data)
+                else:
+                    f.write(data)
+
+            try:
+                yield write
+            finally:
+                f.flush()  # 连接中断时，不带校验的已写入部分保留，客户端从 HEAD 返回的偏移继续
+            if checksum:
+                algorithm, expected = checksum
+                digest = hashlib.new(algorithm)
+                for data in pending:
+                    digest.update(data)
+                if digest.digest() != expected:
+                    raise ChecksumMismatchError("Chunk checksum mismatch; resend it from the same offset")
+                for data in pending:
+                    f.write(data)
+        record['updated'] = time.time()
+        self._write_meta({k: v for k, v in record.items() if k != 'offset'})
+
+    def verify(self, upload_id):
+        """完整文件的校验（创建时指定了 Upload-Checksum 时）；不一致时删除上传并抛 ChecksumMismatchError"""
+        record = self.require(upload_id)
+        if not record['checksum']:
+            return
+        algorithm, expected = record['checksum']
+        digest = hashlib.new(algorithm)
+        with open(self.part_path(upload_id), 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        if digest.hexdigest() != expected:
+            self.delete(upload_id)
+            raise ChecksumMismatchError("Upload checksum mismatch; the upload was discarded")
+
+    def claim(self, upload_id):
+        """原子地认领收完的上传（创建 <id>.submit 标记，跨进程有效）；已被其他请求认领时返回 False"""
+        try:
+            os.close(os.open(self._submit_path(upload_id), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return False
+        return True
+
+    def release(self, upload_id):
+        """提交失败时撤销认领，客户端可以重发最后一块"""
+        try:
+            os.unlink(self._submit_path(upload_id))
+        except FileNotFoundError:
+            pass
+
+    def mark_done(self, upload_id, job_id):
+        """收完并交给任务后保留记录（含 job id），客户端丢失最后一个响应时仍能查到任务"""
+        record = self._load(upload_id)
+        if record is None:
+            raise UploadNotFoundError("Unknown or expired upload")
+        record.update(state=DONE, job=job_id, updated=time.time())
+        self._write_meta(record)
+        try:
+            os.unlink(self.part_path(upload_id))
+        except FileNotFoundError:
+            pass
+
+    def delete(self, upload_id):
+        found = False
+        for path in (self.part_path(upload_id), self._meta_path(upload_id)):
+            try:
+                os.unlink(path)
+                found = True
+            except FileNotFoundError:
+                pass
+        self.release(upload_id)
+        return found
+
+    def expires_in(self, record):
+        return max(0, round(record['updated'] + self.ttl_s - time.time()))
+
+    def purge(self):
+        """删除超过 TTL 未更新的上传（含已完成的记录）"""
+        deadline = time.time() - self.ttl_s
+        expired = [r['id'] for r in self._records() if r['updated'] < deadline]
+        for upload_id in expired:
+            self.delete(upload_id)
+        return len(expired)
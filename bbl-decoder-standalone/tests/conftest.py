@@ -0,0 +1,8 @@
+"""src/ 和 bench/ 的模块按顶层模块导入（与直接运行 python3 src/entry.py 相同）"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for _sub in ('src', 'bench'):
+    sys.path.insert(0, os.path.join(ROOT, _sub))
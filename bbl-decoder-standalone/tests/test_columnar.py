@@ -0,0 +1,46 @@
+"""columnar.negotiate：Accept 头的 q 值排序、JSON 回退、未安装依赖时的 406"""
+
+import pytest
+
+import columnar
+
+ARROW = 'application/vnd.apache.arrow.stream'
+
+
+@pytest.fixture
+def installed(monkeypatch):
+    """固定可用格式，不依赖测试环境里装了哪些可选包"""
+    formats = {'npz', 'arrow', 'msgpack'}
+    monkeypatch.setattr(columnar, 'available', lambda fmt: fmt in formats)
+    return formats
+
+
+@pytest.mark.parametrize('accept', [None, '', 'application/json', '*/*', 'text/html, */*;q=0.1'])
+def test_json_by_default(installed, accept):
+    assert columnar.negotiate(accept) is None
+
+
+def test_binary_media_types(installed):
+    assert columnar.negotiate(ARROW) == 'arrow'
+    assert columnar.negotiate('application/x-msgpack') == 'msgpack'
+    assert columnar.negotiate('Application/X-NPZ') == 'npz'
+
+
+def test_q_values_rank_and_ties_keep_order(installed):
+    assert columnar.negotiate(f'application/json;q=0.5, {ARROW}') == 'arrow'
+    assert columnar.negotiate(f'{ARROW};q=0.5, application/json') is None
+    assert columnar.negotiate(f'application/x-npz, {ARROW}') == 'npz'
+    assert columnar.negotiate(f'{ARROW};q=0, application/x-npz;q=0.2') == 'npz'
+    assert columnar.negotiate(f'{ARROW};q=oops, application/json') is None
+
+
+def test_unknown_types_fall_back_to_json(installed):
+    assert columnar.negotiate('text/csv, image/png') is None
+
+
+def test_missing_dependency(installed):
+    installed.discard('arrow')
+    assert columnar.negotiate(f'{ARROW}, application/x-npz;q=0.5') == 'npz'
+    assert columnar.negotiate(f'{ARROW}, application/json;q=0.5') is None
+    with pytest.raises(columnar.ColumnarError, match='pyarrow'):
+        columnar.negotiate(ARROW)
@@ -0,0 +1,45 @@
+"""detectors.detect_prop_wash：频段外的电机噪声不计入桨洗幅度和主频"""
+
+import numpy as np
+
+import detectors
+
+RATE = 2000
+
+
+def chop_log(wash_hz=60.0, wash_amp=30.0, noise_hz=200.0, noise_amp=40.0, seconds=3.0):
+    """1 秒处收油；之后 wash_hz 的衰减振荡叠加全程 noise_hz 的电机噪声"""
+    t = np.arange(int(seconds * RATE)) / RATE
+    throttle = np.where(t < 1.0, 0.8, 0.2)
+    after = np.clip(t - 1.0, 0, None)
+    wash = wash_amp * np.sin(2 * np.pi * wash_hz * after) * np.exp(-after / 0.1) * (t >= 1.0)
+    noise = noise_amp * np.sin(2 * np.pi * noise_hz * t)
+    gyro = np.stack([wash + noise, noise * 0.5, np.zeros_like(t)])
+    return (t * 1_000_000).astype(np.int64), throttle, gyro
+
+
+def test_frequency_and_magnitude_come_from_the_band():
+    time_us, throttle, gyro = chop_log()
+    events, total = detectors.detect_prop_wash(time_us, throttle, gyro)
+    assert total == 1
+    event = events[0]
+    assert event['axis'] == 'r'
+    assert abs(event['freq_hz'] - 60) <= 4
+    # 振荡 RMS（30 幅度、100ms 衰减、250ms 窗口）约 9；200Hz 噪声不计入
+    assert 5 < event['rms'] < 12
+    _, _, noise_only = chop_log(wash_amp=0.0)
+    quiet, _ = detectors.detect_prop_wash(time_us, throttle, noise_only)
+    assert quiet[0]['rms'] < 1
+
+
+def test_dominant_frequency_stays_in_band():
+    time_us, throttle, gyro = chop_log(wash_amp=5.0, noise_hz=140.0, noise_amp=80.0)
+    events, _ = detectors.detect_prop_wash(time_us, throttle, gyro)
+    lo, hi = detectors.PROPWASH_BAND_HZ
+    assert all(lo <= e['freq_hz'] <= hi for e in events)
+
+
+def test_chop_near_end_of_log():
+    time_us, throttle, gyro = chop_log(seconds=1.15)
+    events, total = detectors.detect_prop_wash(time_us, throttle, gyro)
+    assert total == 1 and np.isfinite(events[0]['rms'])
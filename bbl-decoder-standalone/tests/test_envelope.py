@@ -0,0 +1,38 @@
+"""envelope.Pyramid：各层 min / max / mean 与直接按 bin 计算一致，大数值列不被 float32 舍入"""
+
+import numpy as np
+
+import envelope
+
+
+def brute(values, level):
+    size = 1 << level
+    bins = [values[i:i + size] for i in range(0, len(values), size)]
+    return [b.min() for b in bins], [b.max() for b in bins], [b.mean() for b in bins]
+
+
+def test_levels_match_direct_computation():
+    values = np.random.default_rng(0).integers(-2000, 2000, size=1001).astype(np.float64)
+    pyramid = envelope.Pyramid(values)
+    assert pyramid.dtype == np.float32
+    for level in (1, 3, 10):
+        mins, maxs, means = pyramid.levels[level - 1]
+        want = brute(values, level)
+        assert np.array_equal(mins, want[0]) and np.array_equal(maxs, want[1])
+        assert np.allclose(means, want[2], atol=1e-3)
+
+
+def test_large_integer_columns_keep_full_precision():
+    time_us = 3_600_000_000 + np.arange(0, 5000 * 125, 125, dtype=np.float64)  # 1 小时之后的 time (us)
+    pyramid = envelope.Pyramid(time_us)
+    assert pyramid.dtype == np.float64
+    mins, maxs, means = envelope.window(pyramid, time_us, 4, 0, 3)
+    assert mins.tolist() == [time_us[0], time_us[16], time_us[32]]
+    assert maxs.tolist() == [time_us[15], time_us[31], time_us[47]]
+    assert means[0] == time_us[:16].mean()
+
+
+def test_level_for_and_bin_range():
+    assert envelope.level_for(1000, 1000) == 0
+    assert envelope.level_for(1001, 1000) == 1
+    assert envelope.bin_range(5, 20, 2) == (1, 5)
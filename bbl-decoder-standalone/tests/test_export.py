@@ -0,0 +1,71 @@
+"""export.iter_export：时间范围相对首帧、两端包含，CSV / NDJSON 格式和分块"""
+
+import json
+from collections import namedtuple
+
+import pytest
+
+import export
+
+Frame = namedtuple('Frame', ['type', 'data'])
+FIELDS = ['loopIteration', 'time', 'gyroADC[0]', 'flightModeFlags']
+
+
+def frames(n=10, t0=5_000_000, dt=100_000):
+    """n 帧，间隔 0.1 秒；前两帧的 S 帧字段为空"""
+    return [Frame('P', (i, t0 + i * dt, i * 10, '' if i < 2 else 1)) for i in range(n)]
+
+
+def rows(chunks, fmt='csv'):
+    lines = ''.join(chunks).splitlines()
+    if fmt == 'csv':
+        return lines[0], [line.split(', ') for line in lines[1:]]
+    return None, [json.loads(line) for line in lines]
+
+
+def test_time_range_is_relative_to_first_frame_and_inclusive():
+    header, out = rows(export.iter_export(iter(frames()), FIELDS, start_s=0.2, end_s=0.5))
+    assert header == 'loopIteration, time (us), gyroADC[0], flightModeFlags'
+    assert [int(r[0]) for r in out] == [2, 3, 4, 5]
+
+
+def test_open_ended_ranges():
+    _, out = rows(export.iter_export(iter(frames()), FIELDS, start_s=0.75))
+    assert [int(r[0]) for r in out] == [8, 9]
+    _, out = rows(export.iter_export(iter(frames()), FIELDS, end_s=0))
+    assert [int(r[0]) for r in out] == [0]
+    _, out = rows(export.iter_export(iter(frames()), FIELDS, start_s=2))
+    assert out == []
+
+
+def test_stops_reading_after_end():
+    consumed = []
+
+    def source():
+        for frame in frames():
+            consumed.append(frame)
+            yield frame
+
+    list(export.iter_export(source(), FIELDS, end_s=0.3))
+    assert len(consumed) == 5  # 第一个超出范围的帧之后不再解码
+
+
+def test_ndjson_fields_and_empty_values():
+    _, out = rows(export.iter_export(iter(frames(3)), FIELDS, 'ndjson', fields=['time', 'flightModeFlags']), 'ndjson')
+    assert out[0] == {'time': 5_000_000, 'flightModeFlags': None}
+    assert out[2] == {'time': 5_200_000, 'flightModeFlags': 1}
+
+
+def test_chunks(monkeypatch):
+    monkeypatch.setattr(export, 'CHUNK_FRAMES', 4)
+    chunks = list(export.iter_export(iter(frames()), FIELDS))
+    assert [chunk.count('\n') for chunk in chunks] == [1, 4, 4, 2]
+
+
+def test_errors():
+    with pytest.raises(export.ExportError):
+        list(export.iter_export(iter(frames()), FIELDS, fields=['nope']))
+    with pytest.raises(export.ExportError):
+        list(export.iter_export(iter(frames()), FIELDS, fmt='xml'))
+    with pytest.raises(export.ExportError):
+        list(export.iter_export(iter(frames()), ['loopIteration']))
@@ -0,0 +1,70 @@
+"""jobs.JobStore：认领只成功一次，重启时只重新排队 owner 已退出或心跳超时的任务"""
+
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import jobs
+
+
+def dead_owner():
+    proc = subprocess.Popen([sys.executable, '-c', 'pass'])
+    proc.wait()
+    return f'{socket.gethostname()}:{proc.pid}'
+
+
+def test_claim_is_exclusive(tmp_path):
+    store = jobs.JobStore(str(tmp_path))
+    job_id = store.create(b'bbl', {'log': 1})
+    results = []
+    barrier = threading.Barrier(8)
+
+    def claim(k):
+        barrier.wait()
+        results.append(store.claim(job_id, f'host:{k}'))
+
+    threads = [threading.Thread(target=claim, args=(k,)) for k in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(True) == 1
+    job = store.get(job_id)
+    assert job['state'] == jobs.RUNNING and job['options'] == {'log': 1}
+    assert store.pending() == []
+
+
+def test_claim_rejects_finished_jobs(tmp_path):
+    store = jobs.JobStore(str(tmp_path))
+    job_id = store.create(b'bbl', {})
+    assert store.claim(job_id, jobs.owner_id())
+    store.finish(job_id, b'{}')
+    assert not store.claim(job_id, jobs.owner_id())
+    assert store.get(job_id)['state'] == jobs.DONE
+
+
+def test_requeue_orphans(tmp_path):
+    store = jobs.JobStore(str(tmp_path))
+    live, dead, stale, queued = (store.create(b'bbl', {}) for _ in range(4))
+    store.claim(live, jobs.owner_id())
+    store.claim(dead, dead_owner())
+    store.claim(stale, 'other-host:1')
+    store.update(stale, heartbeat=time.time() - jobs.STALE_S - 1)
+
+    assert store.requeue_orphans() == 2
+    assert store.get(live)['state'] == jobs.RUNNING
+    assert store.get(dead)['owner'] is None
+    assert store.pending() == [dead, stale, queued]
+    assert store.requeue_orphans() == 0
+
+
+def test_heartbeat_keeps_remote_owner(tmp_path):
+    store = jobs.JobStore(str(tmp_path))
+    job_id = store.create(b'bbl', {})
+    store.claim(job_id, 'other-host:1')
+    store.update(job_id, heartbeat=time.time() - jobs.STALE_S - 1)
+    store.heartbeat('other-host:1')
+    assert store.requeue_orphans() == 0
+    assert store.get(job_id)['state'] == jobs.RUNNING
@@ -0,0 +1,16 @@
+"""entry.profiled_response：帧类型计数失败时只在 frame_counts 中报告错误"""
+
+import entry
+import synth_bbl
+
+
+def test_frame_counts_error_is_reported():
+    out = entry.profiled_response(('cpu', 'summary'), b'not a blackbox log', lambda: 42, 'decode')
+    assert out['result'] == 42
+    assert set(out['profile']['frame_counts']) == {'error'}
+
+
+def test_frame_counts_on_valid_log():
+    bbl_bytes, _ = synth_bbl.generate_bytes(duration_s=4, seed=1)
+    out = entry.profiled_response(('cpu', 'summary'), bbl_bytes, lambda: 42, 'decode')
+    assert 'error' not in out['profile']['frame_counts']
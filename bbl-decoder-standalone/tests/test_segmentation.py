@@ -0,0 +1,62 @@
+"""segmentation：地面怠速裁剪、怠速中的噪声尖峰、时间跳跃 / 解锁 / 事件切分"""
+
+import numpy as np
+
+import segmentation
+
+RATE = 1000  # 帧 / 秒
+RANGE = (0, 1000)
+
+
+def profile(*parts):
+    """parts: [(秒数, 电机输出), ...] 拼成 (time_us, motor)，1 kHz"""
+    level = np.concatenate([np.full(int(s * RATE), m) for s, m in parts])
+    time_us = np.arange(len(level), dtype=np.int64) * (1_000_000 // RATE)
+    return time_us, np.tile(level, (4, 1))
+
+
+def spans(segments):
+    return [(s.start, s.end, s.end_reason) for s in segments]
+
+
+def test_long_idle_mask_ignores_spikes_and_short_dips():
+    time_us, motor = profile((1, 0), (0.05, 500), (1, 0), (2, 600), (0.2, 0), (2, 600))
+    idle = segmentation.long_idle_mask(time_us, motor, RANGE)
+    assert idle[:2050].all()           # 50 ms 尖峰并入两侧怠速
+    assert not idle[2050:6250].any()   # 200 ms 空中收油不算地面怠速
+
+
+def test_ground_idle_splits_flights():
+    time_us, motor = profile((1, 0), (3, 600), (2, 0), (3, 600), (1, 0))
+    segments = segmentation.find_flight_segments(time_us, motor, RANGE)
+    assert spans(segments) == [(1000, 4000, 'idle'), (6000, 9000, 'idle')]
+    assert segments[0].duration == 2.999
+
+
+def test_time_gap_and_backwards_time_split():
+    time_us, motor = profile((6, 600))
+    time_us[2000:] += 5_000_000
+    time_us[4000:] -= 10_000_000
+    segments = segmentation.find_flight_segments(time_us, motor, RANGE)
+    assert spans(segments) == [(0, 2000, 'time_gap'), (2000, 4000, 'time_gap'), (4000, 6000, 'log_end')]
+
+
+def test_armed_mask_and_disarm_event():
+    time_us, motor = profile((6, 600))
+    flags = np.zeros(len(time_us), dtype=np.int64)
+    flags[500:4000] = segmentation.ARM_FLAG
+    known = np.arange(len(time_us)) >= 100
+    armed = segmentation.armed_mask(flags, known)
+    events = [{'type': 'DISARM', 'frame': 2500}, {'type': 'FLIGHT_MODE', 'frame': 3000}]
+    segments = segmentation.find_flight_segments(time_us, motor, RANGE, armed, events)
+    assert spans(segments) == [(500, 2500, 'disarm'), (2500, 4000, 'disarm')]
+
+
+def test_armed_mask_without_arm_bit_is_none():
+    assert segmentation.armed_mask(np.zeros(10, dtype=np.int64)) is None
+    assert segmentation.armed_mask(None) is None
+
+
+def test_fallback_to_whole_log_when_never_flying():
+    time_us, motor = profile((3, 0))
+    assert spans(segmentation.find_flight_segments(time_us, motor, RANGE)) == [(0, 3000, 'log_end')]
@@ -0,0 +1,44 @@
+"""uploads.UploadStore：偏移检查、分块校验和收完后只提交一次"""
+
+import hashlib
+
+import pytest
+
+import uploads
+
+
+@pytest.fixture
+def store(tmp_path):
+    return uploads.UploadStore(str(tmp_path))
+
+
+def test_offset_must_match(store):
+    record = store.create(6, {})
+    with store.writer(record['id'], 0) as write:
+        write(b'abc')
+    with pytest.raises(uploads.OffsetMismatchError) as e:
+        with store.writer(record['id'], 0) as write:
+            write(b'abc')
+    assert e.value.offset == 3
+    with pytest.raises(uploads.UploadError):
+        with store.writer(record['id'], 3) as write:
+            write(b'abcd')
+
+
+def test_chunk_checksum_mismatch_writes_nothing(store):
+    record = store.create(3, {})
+    bad = ('sha256', hashlib.sha256(b'xyz').digest())
+    with pytest.raises(uploads.ChecksumMismatchError):
+        with store.writer(record['id'], 0, bad) as write:
+            write(b'abc')
+    assert store.get(record['id'])['offset'] == 0
+
+
+def test_claim_is_exclusive_until_released(store):
+    record = store.create(3, {})
+    assert store.claim(record['id'])
+    assert not store.claim(record['id'])
+    store.release(record['id'])
+    assert store.claim(record['id'])
+    store.delete(record['id'])
+    assert store.claim(record['id'])  # 删除时标记一并清理